@@ -0,0 +1,219 @@
+"""
+SMS Messaging UX - Async Server
+
+Serves the same routes and templates as app.py on an aiohttp event loop:
+
+    gunicorn aio_app:app --worker-class aiohttp.GunicornWebWorker
+
+The Twilio webhooks (/twilio/incoming, /twilio/status) are handled natively
+on the loop with the async Firestore client and async Twilio transport, so
+one worker can hold hundreds of in-flight webhooks. Every other route is the
+Flask app, run through a WSGI bridge on a bounded thread pool
+(ASYNC_WSGI_THREADS), so the dashboard and API behave exactly as under
+`gunicorn app:app`.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from aiohttp import web
+
+from app import app as flask_app, start_server_services
+from routes.webhooks_async import routes as webhook_routes
+from services.dispatch import drain_async
+from services.firebase import close_async_db, get_async_db
+from services.startup import run_startup
+from services.metrics import observe_request
+from services.tracing import end_trace, is_tracing_enabled, log_trace, server_timing_header, start_trace
+from services.twilio_sms import close_async_twilio_client, get_async_twilio_client
+
+logger = logging.getLogger(__name__)
+
+# Response headers aiohttp manages itself
+_HOP_BY_HOP = frozenset(['connection', 'keep-alive', 'transfer-encoding'])
+
+
+class WSGIBridge:
+    """Runs a WSGI app for aiohttp requests on a thread pool.
+
+    Responses with a Content-Length are read in one pool call; streamed
+    responses (SSE, exports) are relayed a chunk at a time.
+    """
+
+    def __init__(self, wsgi_app, threads=32):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    def _environ(self, request, body):
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'SCRIPT_NAME': '',
+            # WSGI strings are bytes decoded as latin-1
+            'PATH_INFO': unquote(request.rel_url.raw_path, encoding='latin-1'),
+            'QUERY_STRING': request.rel_url.raw_query_string,
+            'SERVER_NAME': request.url.host or 'localhost',
+            'SERVER_PORT': str(request.url.port or (443 if request.secure else 80)),
+            'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+            'REMOTE_ADDR': request.remote or '',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': request.scheme,
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False
+        }
+        for name, value in request.headers.items():
+            key = name.upper().replace('-', '_')
+            if key == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+            elif key != 'CONTENT_LENGTH':
+                key = f"HTTP_{key}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _start(self, environ):
+        """Call the app; returns (status, headers, iterator, body or None if streamed)."""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = status
+            started['headers'] = headers
+
+        iterable = self.wsgi_app(environ, start_response)
+        headers = started['headers']
+        if any(name.lower() == 'content-length' for name, _ in headers):
+            try:
+                return started['status'], headers, None, b''.join(iterable)
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        return started['status'], headers, iterable, None
+
+    @staticmethod
+    def _next_chunk(iterator):
+        for chunk in iterator:
+            if chunk:
+                return chunk
+        return None
+
+    async def handle(self, request):
+        loop = asyncio.get_running_loop()
+        body = await request.read()
+        status, headers, iterable, content = await loop.run_in_executor(
+            self.executor, self._start, self._environ(request, body)
+        )
+
+        code, _, reason = status.partition(' ')
+        response_headers = [(name, value) for name, value in headers if name.lower() not in _HOP_BY_HOP]
+        if iterable is None:
+            response = web.Response(status=int(code), reason=reason, body=content)
+            for name, value in response_headers:
+                response.headers.add(name, value)
+            return response
+
+        response = web.StreamResponse(status=int(code), reason=reason)
+        for name, value in response_headers:
+            response.headers.add(name, value)
+        iterator = iter(iterable)
+        try:
+            await response.prepare(request)
+            while True:
+                chunk = await loop.run_in_executor(self.executor, self._next_chunk, iterator)
+                if chunk is None:
+                    break
+                await response.write(chunk)
+            await response.write_eof()
+        except (ConnectionResetError, asyncio.CancelledError):
+            logger.info(f"Client disconnected from streamed response {request.path}")
+            raise
+        finally:
+            if hasattr(iterable, 'close'):
+                await loop.run_in_executor(self.executor, iterable.close)
+        return response
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+WSGI_BRIDGE = web.AppKey('wsgi_bridge', WSGIBridge)
+
+
+@web.middleware
+async def _metrics_middleware(request, handler):
+    """Time the named native routes under their Flask endpoint names (Flask times the bridged ones)."""
+    if request.match_info.route.name is None:
+        return await handler(request)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        observe_request(request.match_info.route.name, request.method, status, time.perf_counter() - start)
+
+
+@web.middleware
+async def _tracing_middleware(request, handler):
+    """Trace the named native routes when TRACING_ENABLED (Flask traces the bridged ones)."""
+    if request.match_info.route.name is None or not is_tracing_enabled():
+        return await handler(request)
+    # Each request runs in its own task, so its trace context is its own
+    start_trace()
+    start = time.perf_counter()
+    response = await handler(request)
+    total = time.perf_counter() - start
+    spans = end_trace() or []
+    response.headers['Server-Timing'] = server_timing_header(spans, total)
+    log_trace(request.match_info.route.name, request.method, response.status, spans, total)
+    return response
+
+
+async def _on_startup(app):
+    # Async clients are bound to the loop they are created on
+    get_async_db()
+    get_async_twilio_client()
+    logger.info("Async server started")
+
+
+async def _on_cleanup(app):
+    await drain_async()
+    await close_async_twilio_client()
+    close_async_db()
+    app[WSGI_BRIDGE].shutdown()
+    logger.info("Async server stopped")
+
+
+def create_async_app():
+    """Async application factory."""
+    app = web.Application(middlewares=[_metrics_middleware, _tracing_middleware], client_max_size=int(os.environ.get('ASYNC_MAX_BODY_BYTES', 1024 ** 2)))
+    bridge = WSGIBridge(flask_app, threads=int(os.environ.get('ASYNC_WSGI_THREADS', 32)))
+    app[WSGI_BRIDGE] = bridge
+
+    app.add_routes(webhook_routes)
+    # Everything else is the Flask app
+    app.router.add_route('*', '/{tail:.*}', bridge.handle)
+
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+app = create_async_app()
+
+
+if __name__ == '__main__':
+    # Under gunicorn, gunicorn.conf.py's post_fork does this
+    run_startup(start_server_services)
+    web.run_app(app, port=int(os.environ.get('PORT', 5000)))
@@ -8,11 +8,18 @@ import os
 import sys
 import logging
 
+import click
 from flask import Flask
 
 from config import Config
-from services.firebase import init_firebase
+from services.firebase import configure_firebase, init_firebase, start_user_directory, warm_up_firestore
+from services.twilio_sms import init_twilio, ping_twilio
+from services.search import get_search_service
+from services.startup import run_startup
+from services.health import start_health_prober
+from services.metrics import instrument_app, start_metrics_sampler
 from routes import api_bp, dashboard_bp, webhooks_bp
+from routes.tracing import init_request_tracing
 
 
 def configure_logging():
@@ -45,20 +52,101 @@ configure_logging()
 logger = logging.getLogger(__name__)
 
 
+def register_commands(app):
+    """Register maintenance CLI commands (run with `flask --app app <command>`)."""
+
+    @app.cli.command('sweep-outgoing')
+    @click.option('--older-than', default=10, show_default=True,
+                  help='Minutes a record must have been queued before it is swept.')
+    def sweep_outgoing(older_than):
+        """Resolve outgoing messages stuck in 'queued' after a crash."""
+        from services.outgoing import sweep_stale_queued
+        result = sweep_stale_queued(older_than_minutes=older_than)
+        click.echo(f"Marked {result['sent']} sent, {result['failed']} failed")
+
+    @app.cli.command('rebuild-conversations')
+    @click.option('--simulated/--live', default=False, show_default=True,
+                  help='Rebuild simulated or live conversation summaries.')
+    def rebuild_conversations(simulated):
+        """Rebuild conversation summaries from the message collections."""
+        from services.conversations import rebuild_conversation_summaries
+        count = rebuild_conversation_summaries(simulated)
+        click.echo(f"Rebuilt {count} conversation summaries")
+
+
+def is_init_deferred():
+    """Check if service init is left to the server (gunicorn.conf.py's post_fork hook)."""
+    return os.environ.get('DEFER_SERVICE_INIT', 'false').lower() == 'true'
+
+
+def init_services(app):
+    """Initialize Firebase and Twilio and start the user directory.
+
+    Opens gRPC channels and starts threads, neither of which survive a fork,
+    so this must run in the process that serves requests.
+    """
+    with app.app_context():
+        init_firebase(app)
+        start_user_directory()
+        init_twilio()
+
+
+def warm_up():
+    """Open the Firestore and Twilio connections before taking traffic.
+
+    Failures are logged, not raised: a worker that cannot warm up still serves.
+    """
+    try:
+        warm_up_firestore()
+        logger.info("Warm-up: Firestore channel ready")
+    except Exception as e:
+        logger.warning(f"Warm-up: Firestore read failed: {e}")
+
+    try:
+        # Cheap authenticated GET that leaves a pooled TLS connection open
+        if ping_twilio():
+            logger.info("Warm-up: Twilio connection ready")
+    except Exception as e:
+        logger.warning(f"Warm-up: Twilio request failed: {e}")
+
+    # Starts the index build/load in the background
+    get_search_service()
+
+
+def start_server_services():
+    """What only a web server needs: warm-up (unless WARM_UP=false), health probing, metrics sampling."""
+    if os.environ.get('WARM_UP', 'true').lower() == 'true':
+        warm_up()
+    start_health_prober()
+    start_metrics_sampler()
+
+
+def start_services(app):
+    """init_services() followed by start_server_services() (gunicorn.conf.py's post_fork)."""
+    init_services(app)
+    start_server_services()
+
+
 def create_app():
     """Application factory."""
     app = Flask(__name__)
     app.config.from_object(Config)
 
-    # Initialize Firebase
-    with app.app_context():
-        init_firebase(app)
+    configure_firebase(app)
+    if not is_init_deferred():
+        # The queue worker and CLI commands need only these; web servers start the rest themselves
+        init_services(app)
+
+    instrument_app(app)
+    init_request_tracing(app)
 
     # Register blueprints
     app.register_blueprint(api_bp)
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(webhooks_bp)
 
+    register_commands(app)
+
     logger.info("Application initialized")
     return app
 
@@ -68,5 +156,7 @@ app = create_app()
 
 
 if __name__ == '__main__':
+    # Serve (and answer health checks) while the connections warm up
+    run_startup(start_server_services)
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,110 @@
+"""
+SMS Messaging UX - Startup Benchmark
+
+Measures cold-start cost in fresh interpreters: time to import the app, time
+to the first /health/live and /health responses, and the slowest imports.
+
+    python bench_startup.py --runs 5
+    python bench_startup.py --max-import-ms 400 --max-live-ms 450   # fail on regression
+
+Uses the current environment, so with real credentials /health includes the
+background Firebase startup; without them it measures imports and routing only.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# This repo's own top-level modules (their time is the sum of what they import)
+OWN_MODULES = frozenset(['app', 'config', 'routes', 'services'])
+
+# Runs in a fresh interpreter; prints one JSON line of timings in milliseconds
+_PROBE = """
+import json, os, time
+# As under gunicorn: services start after the app is imported, here in the background
+os.environ.setdefault('DEFER_SERVICE_INIT', 'true')
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.run_startup(app.start_services, app.app)
+client = app.app.test_client()
+live = client.get('/health/live')
+t2 = time.perf_counter()
+health = client.get('/health')
+t3 = time.perf_counter()
+print(json.dumps({
+    'importMs': (t1 - t0) * 1000,
+    'firstLiveMs': (t2 - t0) * 1000,
+    'firstHealthMs': (t3 - t0) * 1000,
+    'liveStatus': live.status_code,
+    'healthStatus': health.get_json().get('status') if health.is_json else health.status_code
+}))
+"""
+
+
+def _run_probe():
+    result = subprocess.run([sys.executable, '-c', _PROBE], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else 'probe failed')
+    # Background startup threads may log on the same stdout
+    return json.loads(re.search(r'\{"importMs".*?\}', result.stdout).group(0))
+
+
+def _slowest_imports(limit):
+    """Third-party top-level packages by cumulative import time (from -X importtime)."""
+    env = {**os.environ, 'DEFER_SERVICE_INIT': 'true'}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=ROOT, capture_output=True, text=True, env=env)
+    totals = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        package = name.strip().split('.')[0]
+        if package in OWN_MODULES:
+            continue
+        # Nested entries are included in their parent's cumulative time; keep the largest
+        totals[package] = max(totals.get(package, 0), int(cumulative) / 1000)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to time (median is reported).')
+    parser.add_argument('--top', type=int, default=10, help='Slowest top-level imports to list.')
+    parser.add_argument('--max-import-ms', type=float, help='Fail if the median app import exceeds this.')
+    parser.add_argument('--max-live-ms', type=float, help='Fail if the median first /health/live exceeds this.')
+    args = parser.parse_args()
+
+    runs = [_run_probe() for _ in range(args.runs)]
+    medians = {key: statistics.median(run[key] for run in runs)
+               for key in ('importMs', 'firstLiveMs', 'firstHealthMs')}
+
+    print(f"Startup over {args.runs} runs (median ms from the start of `import app`):")
+    print(f"  import app        {medians['importMs']:8.1f}")
+    print(f"  first /health/live {medians['firstLiveMs']:7.1f}  status={runs[-1]['liveStatus']}")
+    print(f"  first /health     {medians['firstHealthMs']:8.1f}  status={runs[-1]['healthStatus']}")
+    print("Slowest imports (cumulative ms):")
+    for package, ms in _slowest_imports(args.top):
+        print(f"  {package:<24}{ms:8.1f}")
+
+    failed = []
+    if args.max_import_ms is not None and medians['importMs'] > args.max_import_ms:
+        failed.append(f"import {medians['importMs']:.1f}ms > {args.max_import_ms}ms")
+    if args.max_live_ms is not None and medians['firstLiveMs'] > args.max_live_ms:
+        failed.append(f"first /health/live {medians['firstLiveMs']:.1f}ms > {args.max_live_ms}ms")
+    if failed:
+        print(f"REGRESSION: {'; '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
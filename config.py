@@ -13,11 +13,134 @@ class Config:
     # Simulation mode - when True, no Twilio API calls are made
     SIMULATION_MODE = os.environ.get('SIMULATION_MODE', 'false').lower() == 'true'
 
+    # Hard cap on page size for list endpoints
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 500))
+
+    # Background dispatch (acknowledgment SMS)
+    # DISPATCH_MODE: 'background' (default) or 'sync' (run inline, for tests)
+    DISPATCH_MODE = os.environ.get('DISPATCH_MODE', 'background').lower()
+    DISPATCH_WORKERS = int(os.environ.get('DISPATCH_WORKERS', 4))
+    DISPATCH_QUEUE_SIZE = int(os.environ.get('DISPATCH_QUEUE_SIZE', 100))
+    DISPATCH_DRAIN_TIMEOUT = float(os.environ.get('DISPATCH_DRAIN_TIMEOUT', 10))
+
+    # Acknowledgment delivery for registered senders
+    # ACK_MODE: 'dispatch' (default, Twilio API call in background) or 'twiml' (reply in webhook response)
+    ACK_MODE = os.environ.get('ACK_MODE', 'dispatch').lower()
+
+    # Write-behind group commit for incoming message logging
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+    WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 100))
+    WRITE_BEHIND_MAX_AGE = float(os.environ.get('WRITE_BEHIND_MAX_AGE', 0.5))
+    WRITE_BEHIND_QUEUE_SIZE = int(os.environ.get('WRITE_BEHIND_QUEUE_SIZE', 2000))
+    WRITE_BEHIND_DRAIN_TIMEOUT = float(os.environ.get('WRITE_BEHIND_DRAIN_TIMEOUT', 10))
+
+    # Outgoing record lifecycle: 'two_phase' (default), 'single' or 'deferred'
+    OUTGOING_WRITE_MODE = os.environ.get('OUTGOING_WRITE_MODE', 'two_phase').lower()
+
+    # Bulk send
+    BULK_SEND_CONCURRENCY = int(os.environ.get('BULK_SEND_CONCURRENCY', 4))
+    BULK_WRITE_BATCH_SIZE = int(os.environ.get('BULK_WRITE_BATCH_SIZE', 100))
+    BULK_MAX_RECIPIENTS = int(os.environ.get('BULK_MAX_RECIPIENTS', 5000))
+    BULK_COMMIT_RETRIES = int(os.environ.get('BULK_COMMIT_RETRIES', 3))
+    # A 'running' job with no progress for this long can be resumed; exits wait BULK_DRAIN_TIMEOUT
+    BULK_STALE_SECONDS = float(os.environ.get('BULK_STALE_SECONDS', 300))
+    BULK_DRAIN_TIMEOUT = float(os.environ.get('BULK_DRAIN_TIMEOUT', 10))
+
+    # Outbound queue (worker.py)
+    # OUTGOING_DELIVERY: 'inline' (default) or 'queue' (send-message returns 202, worker sends)
+    OUTGOING_DELIVERY = os.environ.get('OUTGOING_DELIVERY', 'inline').lower()
+    QUEUE_LEASE_SECONDS = int(os.environ.get('QUEUE_LEASE_SECONDS', 60))
+    QUEUE_MAX_ATTEMPTS = int(os.environ.get('QUEUE_MAX_ATTEMPTS', 5))
+    QUEUE_BACKOFF_BASE = float(os.environ.get('QUEUE_BACKOFF_BASE', 30))
+    QUEUE_POLL_INTERVAL = float(os.environ.get('QUEUE_POLL_INTERVAL', 5))
+    # Quiet hours as 'start-end' in local hours (e.g. '22-8'), empty (or start == end) to disable
+    QUIET_HOURS = os.environ.get('QUIET_HOURS', '')
+    QUIET_HOURS_TZ = os.environ.get('QUIET_HOURS_TZ', 'UTC')
+
     # Twilio
     TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
     TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
     TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
 
+    # Sender pool: comma-separated numbers (defaults to TWILIO_PHONE_NUMBER),
+    # or a Messaging Service SID to let Twilio pick the sender
+    TWILIO_SENDER_NUMBERS = os.environ.get('TWILIO_SENDER_NUMBERS', '')
+    TWILIO_MESSAGING_SERVICE_SID = os.environ.get('TWILIO_MESSAGING_SERVICE_SID')
+    MESSAGING_SERVICE_RATE_PER_SECOND = float(os.environ.get('MESSAGING_SERVICE_RATE_PER_SECOND', 0))
+    MESSAGING_SERVICE_RATE_BURST = int(os.environ.get('MESSAGING_SERVICE_RATE_BURST', 0))
+    SENDER_FAILURE_THRESHOLD = int(os.environ.get('SENDER_FAILURE_THRESHOLD', 3))
+    SENDER_COOLDOWN_SECONDS = float(os.environ.get('SENDER_COOLDOWN_SECONDS', 60))
+
+    # Delivery status callbacks (full public URL of /twilio/status, exactly as Twilio
+    # requests it: callbacks are checked against X-Twilio-Signature for this URL)
+    STATUS_CALLBACK_URL = os.environ.get('STATUS_CALLBACK_URL')
+    STATUS_COALESCE_WINDOW = float(os.environ.get('STATUS_COALESCE_WINDOW', 2.0))
+    STATUS_SID_CACHE_SIZE = int(os.environ.get('STATUS_SID_CACHE_SIZE', 10000))
+
+    # Live feed (/api/stream)
+    LIVE_FEED_WINDOW_MINUTES = float(os.environ.get('LIVE_FEED_WINDOW_MINUTES', 60))
+    LIVE_FEED_QUEUE_SIZE = int(os.environ.get('LIVE_FEED_QUEUE_SIZE', 200))
+    LIVE_FEED_REPLAY_SIZE = int(os.environ.get('LIVE_FEED_REPLAY_SIZE', 500))
+    LIVE_FEED_MAX_SECONDS = float(os.environ.get('LIVE_FEED_MAX_SECONDS', 25))
+    LIVE_FEED_MAX_STREAMS = int(os.environ.get('LIVE_FEED_MAX_STREAMS', 4))
+    LIVE_FEED_POLL_SECONDS = int(os.environ.get('LIVE_FEED_POLL_SECONDS', 15))
+
+    # Conditional GET / response cache for list APIs
+    VERSION_DIR = os.environ.get('VERSION_DIR', '')
+    ETAG_MAX_AGE = int(os.environ.get('ETAG_MAX_AGE', 30))
+    API_CACHE_TTL = float(os.environ.get('API_CACHE_TTL', 5))
+    API_CACHE_MAX_ENTRIES = int(os.environ.get('API_CACHE_MAX_ENTRIES', 256))
+
+    # Message log export (/api/export/*)
+    EXPORT_PAGE_SIZE = int(os.environ.get('EXPORT_PAGE_SIZE', 500))
+
+    # Message search index (/api/messages/search)
+    SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX_ENABLED', 'true').lower() == 'true'
+    SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH', '')
+    SEARCH_PERSIST_INTERVAL = float(os.environ.get('SEARCH_PERSIST_INTERVAL', 300))
+
+    # Server startup: gunicorn.conf.py defers service init to post_fork, then warms up
+    DEFER_SERVICE_INIT = os.environ.get('DEFER_SERVICE_INIT', 'false').lower() == 'true'
+    WARM_UP = os.environ.get('WARM_UP', 'true').lower() == 'true'
+
+    # Background health probing (/health, /health/live, /health/ready)
+    HEALTH_PROBE_INTERVAL = float(os.environ.get('HEALTH_PROBE_INTERVAL', 15))
+    HEALTH_TWILIO_PROBE_INTERVAL = float(os.environ.get('HEALTH_TWILIO_PROBE_INTERVAL', 60))
+    HEALTH_WINDOW_SIZE = int(os.environ.get('HEALTH_WINDOW_SIZE', 60))
+    HEALTH_PROBE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_TIMEOUT', 5))
+    HEALTH_FAILURE_THRESHOLD = int(os.environ.get('HEALTH_FAILURE_THRESHOLD', 2))
+
+    # Prometheus metrics (/metrics); PROMETHEUS_MULTIPROC_DIR is set by gunicorn.conf.py
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_SAMPLE_INTERVAL = float(os.environ.get('METRICS_SAMPLE_INTERVAL', 15))
+    # /metrics needs 'Authorization: Bearer <METRICS_TOKEN>' or an operator login,
+    # unless METRICS_PUBLIC=true (opt out, e.g. scraped over a private network)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', 'false').lower() == 'true'
+
+    # Per-request tracing (Server-Timing header + log line) and profiling (routes/tracing.py)
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'false').lower() == 'true'
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/sms-profiles')
+
+    # Async server (aio_app.py): threads running non-webhook Flask routes
+    ASYNC_WSGI_THREADS = int(os.environ.get('ASYNC_WSGI_THREADS', 32))
+    ASYNC_MAX_BODY_BYTES = int(os.environ.get('ASYNC_MAX_BODY_BYTES', 1024 ** 2))
+
+    # Twilio HTTP transport (pooled keep-alive session)
+    TWILIO_HTTP_POOL_SIZE = int(os.environ.get('TWILIO_HTTP_POOL_SIZE', 10))
+    TWILIO_HTTP_CONNECT_TIMEOUT = float(os.environ.get('TWILIO_HTTP_CONNECT_TIMEOUT', 5))
+    TWILIO_HTTP_READ_TIMEOUT = float(os.environ.get('TWILIO_HTTP_READ_TIMEOUT', 15))
+    TWILIO_HTTP_RETRIES = int(os.environ.get('TWILIO_HTTP_RETRIES', 2))
+
+    # Outbound SMS pacing (token bucket per sender number, shared across workers)
+    SMS_RATE_LIMIT_ENABLED = os.environ.get('SMS_RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    SMS_RATE_PER_SECOND = float(os.environ.get('SMS_RATE_PER_SECOND', 1.0))
+    SMS_RATE_BURST = int(os.environ.get('SMS_RATE_BURST', 1))
+    SMS_RATE_LIMIT_TIMEOUT = float(os.environ.get('SMS_RATE_LIMIT_TIMEOUT', 30))
+    RATE_LIMIT_DIR = os.environ.get('RATE_LIMIT_DIR', '')
+
     # Firebase
     FIREBASE_PROJECT_ID = os.environ.get('FIREBASE_PROJECT_ID')
     FIREBASE_PRIVATE_KEY_ID = os.environ.get('FIREBASE_PRIVATE_KEY_ID')
@@ -25,3 +148,10 @@ class Config:
     FIREBASE_CLIENT_EMAIL = os.environ.get('FIREBASE_CLIENT_EMAIL')
     FIREBASE_CLIENT_ID = os.environ.get('FIREBASE_CLIENT_ID')
     FIREBASE_CLIENT_CERT_URL = os.environ.get('FIREBASE_CLIENT_CERT_URL', '')
+
+    # In-memory user directory
+    # USER_DIRECTORY_MODE: 'listener' (default, on_snapshot), 'ttl' (periodic reload) or 'off'
+    USER_DIRECTORY_MODE = os.environ.get('USER_DIRECTORY_MODE', 'listener').lower()
+    USER_DIRECTORY_TTL = int(os.environ.get('USER_DIRECTORY_TTL', 300))
+    # Concurrent chunked 'in' queries when resolving users without the directory
+    USER_LOOKUP_CONCURRENCY = int(os.environ.get('USER_LOOKUP_CONCURRENCY', 8))
@@ -0,0 +1,87 @@
+"""Gunicorn configuration (loaded automatically from the working directory).
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (preload) and forked, so workers boot
+without re-importing it. Firebase's gRPC channels and the background threads
+are not fork-safe, so their setup is deferred out of create_app() and done in
+each worker by post_fork, followed by a warm-up Firestore read and Twilio
+request, before the worker accepts connections.
+
+Threaded (gthread) workers, sized from the CPUs this process may run on:
+WEB_CONCURRENCY workers (default CPUs + 1) with GUNICORN_THREADS threads
+each (default 4 per CPU, at least 8). Requests mostly wait on Firestore and
+Twilio, so threads, not processes, provide the concurrency.
+Each open /api/stream (dashboard live feed) holds a thread for up to
+LIVE_FEED_MAX_SECONDS, and at most LIVE_FEED_MAX_STREAMS of them per worker,
+so keep that well below GUNICORN_THREADS.
+
+Workers write Prometheus metrics to PROMETHEUS_MULTIPROC_DIR (a fresh
+directory per master by default), so /metrics aggregates every worker.
+"""
+
+import glob
+import logging
+import os
+import tempfile
+
+# Must be set before the preloaded app is imported
+os.environ.setdefault('DEFER_SERVICE_INIT', 'true')
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f"sms-metrics-{os.getpid()}"))
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+_cpus = _cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+preload_app = True
+
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', _cpus + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', max(8, 4 * _cpus)))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+# Long enough for the dispatch and write-behind drains on worker exit
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Logs go to stdout/stderr via app.configure_logging()
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+
+
+def on_starting(server):
+    """Clear metrics files left by a previous run (they would be summed in).
+
+    Only prometheus_client's *.db files are removed: PROMETHEUS_MULTIPROC_DIR
+    may be an operator-chosen directory that holds other files.
+    """
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def post_fork(server, worker):
+    """Initialize services in the worker and warm up connections before it serves."""
+    from app import app, start_services
+    from services.startup import run_startup
+
+    # In the foreground: the worker only accepts connections once this returns
+    run_startup(start_services, app, background=False)
+    logging.getLogger(__name__).info(f"Worker {worker.pid} ready ({threads} threads)")
+
+
+def child_exit(server, worker):
+    """Drop the exited worker's live gauges from /metrics."""
+    from services.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
@@ -1,20 +1,40 @@
 """API endpoints."""
 
 import re
+import json
 import logging
+import os
+import queue
+import threading
+import time
 import uuid
 from datetime import datetime, timezone
 
-from flask import Blueprint, request, jsonify, session
-from firebase_admin import firestore
-from google.cloud.firestore_v1.base_query import FieldFilter
+from flask import Blueprint, Response, request, jsonify, session, stream_with_context
 
 from services.firebase import (
     get_db, get_user_by_phone, get_user_by_uuid,
-    hash_phone_number, mask_phone_number, get_user_display_info
+    hash_phone_number, mask_phone_number, get_user_display_info, get_users_display_info,
+    get_user_directory
 )
-from services.twilio_sms import send_sms, is_simulation_mode, SimulatedFailure
+from services.twilio_sms import is_simulation_mode
+from services.inbound import handle_incoming_message
+from services.outgoing import send_outgoing_message
+from services.message_queue import (
+    QueueError, enqueue_message, cancel_message, list_queue, is_queue_delivery
+)
+from services.bulk import (
+    BulkSendError, start_bulk_job, get_bulk_job, resume_bulk_job, resolve_segment, resolve_user_ids
+)
+from services.stats import get_message_stats, recompute_message_stats, count_active_users
+from services.serializers import conversation_row, incoming_row, outgoing_row, serialize_rows
+from services.live_feed import get_live_feed
+from services.export import EXPORTS, FORMATS, export_messages
+from services.search import SOURCES as SEARCH_SOURCES, get_search_service
+from services.conversations import conversation_streams, summaries_query
 from routes.auth import login_required
+from routes.pagination import InvalidCursor, get_page_size, paginate, paginate_merged
+from routes.caching import conditional
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +47,23 @@ def is_valid_e164(phone_number):
     return bool(re.match(pattern, phone_number))
 
 
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp such as sendAt (naive times are UTC).
+
+    Returns:
+        datetime or None: Aware datetime, or None if value is empty.
+
+    Raises:
+        ValueError: If the value is not a valid timestamp.
+    """
+    if not value:
+        return None
+    timestamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
 def is_valid_uuid(value):
     """Check if value looks like a UUID."""
     try:
@@ -54,9 +91,12 @@ def send_message():
     """
     Send an SMS to a registered user.
     POST /api/send-message
-    Body: {"userId": "uuid-here", "messageContent": "...", "simulateStatus": "sent"}
+    Body: {"userId": "uuid-here", "messageContent": "...", "simulateStatus": "sent",
+           "deliver": "queue", "sendAt": "2025-01-15T10:30:00Z"}
 
     Note: userId is the user's UUID. Phone number is looked up internally.
+    With deliver=queue, a sendAt time or OUTGOING_DELIVERY=queue, the message is
+    added to the outbound queue and 202 is returned; worker.py sends it.
     """
     try:
         data = request.get_json()
@@ -72,6 +112,8 @@ def send_message():
         operator_id = data.get('operatorId', session.get('operator_id', 'unknown'))
         operator_name = session.get('operator_name', 'Unknown Operator')
         simulate_status = data.get('simulateStatus', 'sent')
+        send_at_value = data.get('sendAt')
+        use_queue = data.get('deliver') == 'queue' or bool(send_at_value) or is_queue_delivery()
 
         # Validate userId is a UUID
         if not is_valid_uuid(user_id):
@@ -87,7 +129,6 @@ def send_message():
                 'message': 'Message content cannot be empty'
             }), 400
 
-        db = get_db()
         simulated = is_simulation_mode()
 
         # Look up user by UUID to get phone number
@@ -105,66 +146,60 @@ def send_message():
                 'message': 'User status is not active'
             }), 403
 
-        # Create outgoing message record (UUID userId, no phone number)
-        queued_at = datetime.now(timezone.utc)
-        outgoing_message = {
-            'queuedAt': queued_at,
-            'sentAt': None,
-            'userId': user_id,  # UUID, not phone number
-            'messageContent': message_content,
-            'operatorId': operator_id,
-            'operatorName': operator_name,
-            'status': 'queued',
-            'twilio_SmsMessageSid': None,
-            'twilio_ErrorMessage': None,
-            'simulated': simulated
-        }
-
-        # Add to Firestore first
-        doc_ref = db.collection('outgoingMessages').add(outgoing_message)
-        message_id = doc_ref[1].id
-
-        # Send via Twilio (or simulate) - phone_number used in memory only
-        try:
-            twilio_message = send_sms(phone_number, message_content, simulate_status=simulate_status)
-
-            # Update record with sent status
-            sent_at = datetime.now(timezone.utc)
-            final_status = simulate_status if simulated else 'sent'
-            db.collection('outgoingMessages').document(message_id).update({
-                'status': final_status,
-                'sentAt': sent_at,
-                'twilio_SmsMessageSid': twilio_message.sid
-            })
+        if use_queue:
+            # Durable queue - a worker process sends it (scheduled, retried, quiet hours)
+            try:
+                send_at = parse_timestamp(send_at_value)
+            except ValueError:
+                return jsonify({
+                    'error': 'invalid_send_at',
+                    'message': 'sendAt must be an ISO 8601 timestamp'
+                }), 400
 
-            logger.info(f"POST /api/send-message 200 {operator_id} simulated={simulated}")
+            queue_id, send_at = enqueue_message(
+                user_id, message_content, operator_id, operator_name,
+                send_at=send_at, simulate_status=simulate_status
+            )
+            logger.info(f"POST /api/send-message 202 {operator_id} queued simulated={simulated}")
 
             return jsonify({
-                'status': final_status,
-                'messageId': message_id,
+                'status': 'pending',
+                'queueId': queue_id,
                 'userId': user_id,
                 'userName': user_data.get('name', ''),
                 'maskedPhone': mask_phone_number(phone_number),
-                'timestamp': sent_at.isoformat(),
-                'twilio_MessageSid': twilio_message.sid,
+                'sendAt': send_at.isoformat(),
                 'simulated': simulated
-            }), 200
+            }), 202
 
-        except (Exception, SimulatedFailure) as e:
-            # Update record with failed status
-            db.collection('outgoingMessages').document(message_id).update({
-                'status': 'failed',
-                'twilio_ErrorMessage': str(e)
-            })
+        # Send and record (UUID userId, no phone number stored)
+        result = send_outgoing_message(
+            phone_number, user_id, message_content, operator_id, operator_name,
+            simulate_status=simulate_status
+        )
 
-            logger.error(f"Send failed: {e} simulated={simulated}")
+        if result['error'] is not None:
+            logger.error(f"Send failed: {result['error']} simulated={simulated}")
             return jsonify({
                 'error': 'send_error',
                 'message': 'Failed to send SMS',
-                'details': str(e),
+                'details': result['error'],
                 'simulated': simulated
             }), 503
 
+        logger.info(f"POST /api/send-message 200 {operator_id} simulated={simulated}")
+
+        return jsonify({
+            'status': result['status'],
+            'messageId': result['messageId'],
+            'userId': user_id,
+            'userName': user_data.get('name', ''),
+            'maskedPhone': mask_phone_number(phone_number),
+            'timestamp': result['sentAt'].isoformat(),
+            'twilio_MessageSid': result['twilio_MessageSid'],
+            'simulated': simulated
+        }), 200
+
     except Exception as e:
         logger.error(f"Error sending message: {e}")
         return jsonify({
@@ -173,19 +208,251 @@ def send_message():
         }), 500
 
 
+@api_bp.route('/queue', methods=['GET'])
+@login_required
+def get_queue():
+    """
+    List queued outgoing messages.
+    GET /api/queue?status=pending&limit=100
+    Auto-filters by simulation mode.
+    """
+    try:
+        status_filter = request.args.get('status', 'pending')
+        limit = get_page_size(request.args.get('limit', 100, type=int))
+
+        rows = list_queue(status=status_filter, limit=limit)
+        user_infos = get_users_display_info(data.get('userId', '') for _, data in rows)
+
+        messages = []
+        for queue_id, data in rows:
+            user_info = user_infos.get(data.get('userId', '')) or {}
+            messages.append({
+                'id': queue_id,
+                'createdAt': data.get('createdAt').isoformat() if data.get('createdAt') else None,
+                'sendAt': data.get('sendAt').isoformat() if data.get('sendAt') else None,
+                'nextAttemptAt': data.get('nextAttemptAt').isoformat() if data.get('nextAttemptAt') else None,
+                'userId': data.get('userId', ''),
+                'userName': user_info.get('name', ''),
+                'maskedPhone': user_info.get('maskedPhone', '(unknown)'),
+                'messageContent': data.get('messageContent', ''),
+                'operatorName': data.get('operatorName', ''),
+                'status': data.get('status', ''),
+                'attempts': data.get('attempts', 0),
+                'lastError': data.get('lastError'),
+                'outgoingMessageId': data.get('outgoingMessageId')
+            })
+
+        return jsonify({
+            'status': 'success',
+            'count': len(messages),
+            'messages': messages,
+            'simulationMode': is_simulation_mode()
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching queue: {e}")
+        return jsonify({
+            'error': 'query_failed',
+            'message': 'Failed to fetch queue from database'
+        }), 500
+
+
+@api_bp.route('/queue/<queue_id>/cancel', methods=['POST'])
+@login_required
+def cancel_queued_message(queue_id):
+    """
+    Cancel a queued message before a worker sends it.
+    POST /api/queue/<queueId>/cancel
+    """
+    try:
+        cancel_message(queue_id)
+        logger.info(f"POST /api/queue/cancel 200 {session.get('operator_id', 'unknown')}")
+        return jsonify({'status': 'cancelled', 'queueId': queue_id}), 200
+
+    except QueueError as e:
+        if str(e) == 'not_found':
+            return jsonify({
+                'error': 'not_found',
+                'message': 'Queued message not found'
+            }), 404
+        return jsonify({
+            'error': 'not_cancellable',
+            'message': str(e)
+        }), 409
+
+    except Exception as e:
+        logger.error(f"Error cancelling queued message: {e}")
+        return jsonify({
+            'error': 'server_error',
+            'message': str(e)
+        }), 500
+
+
+@api_bp.route('/send-bulk', methods=['POST'])
+@login_required
+def send_bulk():
+    """
+    Send one SMS to many users as a background job.
+    POST /api/send-bulk
+    Body: {"userIds": ["uuid", ...], "messageContent": "..."}
+       or {"segment": {"status": "active", "tag": "beta"}, "messageContent": "..."}
+
+    Returns 202 with a jobId; poll GET /api/send-bulk/<jobId> for progress.
+    """
+    try:
+        data = request.get_json()
+
+        if not data:
+            return jsonify({'error': 'invalid_request', 'message': 'JSON body required'}), 400
+
+        message_content = data.get('messageContent', '')
+        user_ids = data.get('userIds')
+        segment = data.get('segment')
+        operator_id = session.get('operator_id', 'unknown')
+        operator_name = session.get('operator_name', 'Unknown Operator')
+        simulate_status = data.get('simulateStatus', 'sent')
+
+        # Validate message content
+        if not message_content or not message_content.strip():
+            return jsonify({
+                'error': 'invalid_message',
+                'message': 'Message content cannot be empty'
+            }), 400
+
+        if user_ids is not None:
+            if not isinstance(user_ids, list) or not all(is_valid_uuid(u) for u in user_ids):
+                return jsonify({
+                    'error': 'invalid_user_id',
+                    'message': 'userIds must be a list of valid UUIDs'
+                }), 400
+            recipients, skipped = resolve_user_ids(user_ids)
+        elif isinstance(segment, dict):
+            recipients = resolve_segment(status=segment.get('status', 'active'), tag=segment.get('tag'))
+            # Only active users can be messaged
+            recipients = [(phone, u) for phone, u in recipients if u.get('status') == 'active']
+            skipped = 0
+        else:
+            return jsonify({
+                'error': 'invalid_request',
+                'message': 'Either userIds or segment required'
+            }), 400
+
+        job_id = start_bulk_job(
+            recipients, message_content, operator_id, operator_name,
+            skipped=skipped, simulate_status=simulate_status
+        )
+
+        logger.info(f"POST /api/send-bulk 202 {operator_id} recipients={len(recipients)}")
+
+        return jsonify({
+            'status': 'accepted',
+            'jobId': job_id,
+            'total': len(recipients),
+            'skipped': skipped,
+            'simulated': is_simulation_mode()
+        }), 202
+
+    except BulkSendError as e:
+        return jsonify({
+            'error': 'invalid_recipients',
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        logger.error(f"Error starting bulk send: {e}")
+        return jsonify({
+            'error': 'server_error',
+            'message': str(e)
+        }), 500
+
+
+@api_bp.route('/send-bulk/<job_id>', methods=['GET'])
+@login_required
+def get_bulk_send(job_id):
+    """
+    Get bulk send job progress.
+    GET /api/send-bulk/<jobId>
+    """
+    try:
+        job = get_bulk_job(job_id)
+        if job is None:
+            return jsonify({
+                'error': 'job_not_found',
+                'message': 'Bulk job not found'
+            }), 404
+
+        return jsonify({
+            'status': 'success',
+            'jobId': job_id,
+            'jobStatus': job.get('status'),
+            'total': job.get('total', 0),
+            'sent': job.get('sent', 0),
+            'failed': job.get('failed', 0),
+            'skipped': job.get('skipped', 0),
+            'createdAt': job.get('createdAt').isoformat() if job.get('createdAt') else None,
+            'completedAt': job.get('completedAt').isoformat() if job.get('completedAt') else None,
+            'simulated': job.get('simulated', False)
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching bulk job: {e}")
+        return jsonify({
+            'error': 'query_failed',
+            'message': 'Failed to fetch bulk job from database'
+        }), 500
+
+
+@api_bp.route('/send-bulk/<job_id>/resume', methods=['POST'])
+@login_required
+def resume_bulk_send(job_id):
+    """
+    Resume an interrupted bulk job (its worker exited mid-send).
+    POST /api/send-bulk/<jobId>/resume
+
+    Returns 202 with the number of recipients still to send.
+    """
+    try:
+        remaining = resume_bulk_job(job_id)
+        if remaining is None:
+            return jsonify({
+                'error': 'job_not_found',
+                'message': 'Bulk job not found'
+            }), 404
+
+        logger.info(f"POST /api/send-bulk/{job_id}/resume 202 remaining={remaining}")
+        return jsonify({'status': 'accepted', 'jobId': job_id, 'remaining': remaining}), 202
+
+    except BulkSendError as e:
+        return jsonify({
+            'error': 'job_not_resumable',
+            'message': str(e)
+        }), 409
+
+    except Exception as e:
+        logger.error(f"Error resuming bulk job: {e}")
+        return jsonify({
+            'error': 'server_error',
+            'message': str(e)
+        }), 500
+
+
 @api_bp.route('/messages/incoming', methods=['GET'])
 @login_required
+@conditional('incomingMessages', 'users')
 def get_incoming_messages():
     """
-    Get all incoming messages.
-    GET /api/messages/incoming?limit=100&sort=desc&userId=...&isRegistered=true
-    Auto-filters by simulation mode.
+    Get a page of incoming messages.
+    GET /api/messages/incoming?limit=100&sort=desc&cursor=...&userId=...&isRegistered=true
+    Auto-filters by simulation mode. Pass nextCursor/prevCursor from a previous
+    response as cursor to page; limit is capped at MAX_PAGE_SIZE.
 
     Returns userId (UUID) and user display info (masked phone), not full phone numbers.
     """
+    from google.cloud.firestore_v1.base_query import FieldFilter
     try:
-        limit = request.args.get('limit', 100, type=int)
+        limit = get_page_size(request.args.get('limit', 100, type=int))
         sort_order = request.args.get('sort', 'desc')
+        cursor = request.args.get('cursor', '')
         user_filter = request.args.get('userId', '')
         registered_filter = request.args.get('isRegistered', '')
 
@@ -205,54 +472,29 @@ def get_incoming_messages():
             is_reg = registered_filter.lower() == 'true'
             query = query.where(filter=FieldFilter('isRegistered', '==', is_reg))
 
-        # Apply sorting
-        direction = firestore.Query.DESCENDING if sort_order == 'desc' else firestore.Query.ASCENDING
-        query = query.order_by('timestamp', direction=direction)
-
-        # Apply limit
-        query = query.limit(limit)
+        # Fetch one page
+        rows, next_cursor, prev_cursor = paginate(
+            query, 'timestamp', sort_order == 'desc', limit, cursor=cursor
+        )
 
-        # Execute query
-        docs = query.stream()
-
-        messages = []
-        user_cache = {}  # Cache user lookups
-
-        for doc in docs:
-            data = doc.to_dict()
-            user_id = data.get('userId', '')
-
-            # Get user display info (with caching)
-            if user_id not in user_cache:
-                user_cache[user_id] = get_user_display_info(user_id)
-
-            user_info = user_cache[user_id] or {
-                'userId': user_id,
-                'name': '',
-                'maskedPhone': '(unknown)',
-                'status': 'unknown'
-            }
-
-            messages.append({
-                'id': doc.id,
-                'timestamp': data.get('timestamp').isoformat() if data.get('timestamp') else None,
-                'userId': user_id,
-                'userName': user_info.get('name', ''),
-                'maskedPhone': user_info.get('maskedPhone', ''),
-                'messageContent': data.get('messageContent', ''),
-                'isRegistered': data.get('isRegistered', False),
-                'responseSent': data.get('responseSent', False),
-                'twilio_SmsMessageSid': data.get('twilio_SmsMessageSid', ''),
-                'simulated': data.get('simulated', False)
-            })
+        # Resolve every user on the page in one batch
+        messages = serialize_rows(incoming_row, rows)
 
         return jsonify({
             'status': 'success',
             'count': len(messages),
             'messages': messages,
+            'nextCursor': next_cursor,
+            'prevCursor': prev_cursor,
             'simulationMode': simulated
         }), 200
 
+    except InvalidCursor as e:
+        return jsonify({
+            'error': 'invalid_cursor',
+            'message': str(e)
+        }), 400
+
     except Exception as e:
         logger.error(f"Error fetching incoming messages: {e}")
         return jsonify({
@@ -263,17 +505,21 @@ def get_incoming_messages():
 
 @api_bp.route('/messages/outgoing', methods=['GET'])
 @login_required
+@conditional('outgoingMessages', 'users')
 def get_outgoing_messages():
     """
-    Get all outgoing messages.
-    GET /api/messages/outgoing?limit=100&sort=desc&userId=...&status=sent&operatorId=...
-    Auto-filters by simulation mode.
+    Get a page of outgoing messages.
+    GET /api/messages/outgoing?limit=100&sort=desc&cursor=...&userId=...&status=sent&operatorId=...
+    Auto-filters by simulation mode. Pass nextCursor/prevCursor from a previous
+    response as cursor to page; limit is capped at MAX_PAGE_SIZE.
 
     Returns userId (UUID) and user display info (masked phone), not full phone numbers.
     """
+    from google.cloud.firestore_v1.base_query import FieldFilter
     try:
-        limit = request.args.get('limit', 100, type=int)
+        limit = get_page_size(request.args.get('limit', 100, type=int))
         sort_order = request.args.get('sort', 'desc')
+        cursor = request.args.get('cursor', '')
         user_filter = request.args.get('userId', '')
         status_filter = request.args.get('status', '')
         operator_filter = request.args.get('operatorId', '')
@@ -296,67 +542,395 @@ def get_outgoing_messages():
         if operator_filter:
             query = query.where(filter=FieldFilter('operatorId', '==', operator_filter))
 
-        # Apply sorting (use queuedAt since sentAt may be null)
-        direction = firestore.Query.DESCENDING if sort_order == 'desc' else firestore.Query.ASCENDING
-        query = query.order_by('queuedAt', direction=direction)
+        # Fetch one page (order by queuedAt since sentAt may be null)
+        rows, next_cursor, prev_cursor = paginate(
+            query, 'queuedAt', sort_order == 'desc', limit, cursor=cursor
+        )
+
+        # Resolve every user on the page in one batch
+        messages = serialize_rows(outgoing_row, rows)
 
-        # Apply limit
-        query = query.limit(limit)
+        return jsonify({
+            'status': 'success',
+            'count': len(messages),
+            'messages': messages,
+            'nextCursor': next_cursor,
+            'prevCursor': prev_cursor,
+            'simulationMode': simulated
+        }), 200
 
-        # Execute query
-        docs = query.stream()
+    except InvalidCursor as e:
+        return jsonify({
+            'error': 'invalid_cursor',
+            'message': str(e)
+        }), 400
 
-        messages = []
-        user_cache = {}  # Cache user lookups
+    except Exception as e:
+        logger.error(f"Error fetching outgoing messages: {e}")
+        return jsonify({
+            'error': 'query_failed',
+            'message': 'Failed to fetch messages from database'
+        }), 500
 
-        for doc in docs:
-            data = doc.to_dict()
-            user_id = data.get('userId', '')
 
-            # Get user display info (with caching)
-            if user_id not in user_cache:
-                user_cache[user_id] = get_user_display_info(user_id)
+@api_bp.route('/messages/search', methods=['GET'])
+@login_required
+def search_messages():
+    """
+    Full-text search over incoming and outgoing message content.
+    GET /api/messages/search?q=...&direction=incoming&userId=...&from=...&to=...&limit=50
 
-            user_info = user_cache[user_id] or {
-                'userId': user_id,
-                'name': '',
-                'maskedPhone': '(unknown)',
-                'status': 'unknown'
+    Every word in q must appear. Results are ranked by relevance (newest first on
+    ties) and served from the in-process index, with no Firestore reads. Returns
+    503 while the index is still being built. Auto-filters by simulation mode.
+    """
+    query_text = request.args.get('q', '').strip()
+    direction = request.args.get('direction', '')
+    user_id = request.args.get('userId', '')
+    limit = get_page_size(request.args.get('limit', 50, type=int))
+
+    if not query_text:
+        return jsonify({'error': 'validation_error', 'message': 'q is required'}), 400
+    if direction and direction not in SEARCH_SOURCES:
+        return jsonify({
+            'error': 'validation_error',
+            'message': 'direction must be incoming or outgoing'
+        }), 400
+    try:
+        start = parse_timestamp(request.args.get('from'))
+        end = parse_timestamp(request.args.get('to'))
+    except ValueError:
+        return jsonify({
+            'error': 'validation_error',
+            'message': 'from and to must be ISO 8601 timestamps'
+        }), 400
+
+    service = get_search_service()
+    if service is None:
+        return jsonify({'error': 'search_disabled', 'message': 'Search is not enabled'}), 503
+    if not service.ready:
+        return jsonify({
+            'error': 'index_building',
+            'message': service.error or 'Search index is being built - try again shortly'
+        }), 503
+
+    try:
+        simulated = is_simulation_mode()
+        hits = service.index.search(query_text, simulated, direction=direction or None,
+                                    user_id=user_id or None, start=start, end=end, limit=limit)
+
+        # Resolve users for both directions in one batch
+        user_infos = get_users_display_info(stored.get('userId', '') for _, _, _, stored in hits)
+        row_serializers = {'incoming': incoming_row, 'outgoing': outgoing_row}
+        results = [
+            {
+                'direction': hit_direction,
+                'score': score,
+                'message': row_serializers[hit_direction](doc_id, stored, user_infos.get(stored.get('userId', '')))
             }
+            for score, hit_direction, doc_id, stored in hits
+        ]
 
-            messages.append({
-                'id': doc.id,
-                'queuedAt': data.get('queuedAt').isoformat() if data.get('queuedAt') else None,
-                'sentAt': data.get('sentAt').isoformat() if data.get('sentAt') else None,
-                'userId': user_id,
-                'userName': user_info.get('name', ''),
-                'maskedPhone': user_info.get('maskedPhone', ''),
-                'messageContent': data.get('messageContent', ''),
-                'operatorId': data.get('operatorId', ''),
-                'operatorName': data.get('operatorName', ''),
-                'status': data.get('status', ''),
-                'twilio_SmsMessageSid': data.get('twilio_SmsMessageSid', ''),
-                'twilio_ErrorMessage': data.get('twilio_ErrorMessage', ''),
-                'simulated': data.get('simulated', False)
-            })
+        return jsonify({
+            'status': 'success',
+            'count': len(results),
+            'results': results,
+            'simulationMode': simulated
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error searching messages: {e}")
+        return jsonify({
+            'error': 'search_failed',
+            'message': 'Failed to search messages'
+        }), 500
+
+
+@api_bp.route('/conversations', methods=['GET'])
+@login_required
+@conditional('conversations', 'users')
+def get_conversations():
+    """
+    Get a page of conversations, most recently active first.
+    GET /api/conversations?limit=50&cursor=...
+    Served from per-user summary documents (last message, counts), so a page
+    costs limit + 1 reads. Auto-filters by simulation mode.
+    """
+    try:
+        limit = get_page_size(request.args.get('limit', 50, type=int))
+        cursor = request.args.get('cursor', '')
+        simulated = is_simulation_mode()
+
+        rows, next_cursor, prev_cursor = paginate(
+            summaries_query(simulated), 'lastMessageAt', True, limit, cursor=cursor
+        )
+
+        conversations = serialize_rows(conversation_row, rows)
+
+        return jsonify({
+            'status': 'success',
+            'count': len(conversations),
+            'conversations': conversations,
+            'nextCursor': next_cursor,
+            'prevCursor': prev_cursor,
+            'simulationMode': simulated
+        }), 200
+
+    except InvalidCursor as e:
+        return jsonify({
+            'error': 'invalid_cursor',
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        logger.error(f"Error fetching conversations: {e}")
+        return jsonify({
+            'error': 'query_failed',
+            'message': 'Failed to fetch conversations from database'
+        }), 500
+
+
+@api_bp.route('/conversations/<user_id>', methods=['GET'])
+@login_required
+@conditional('incomingMessages', 'outgoingMessages', 'users')
+def get_conversation(user_id):
+    """
+    Get a page of one user's conversation: incoming and outgoing messages merged.
+    GET /api/conversations/<userId>?limit=100&sort=desc&cursor=...
+    Each page reads at most limit + 1 messages per direction. Each message has
+    a direction field plus the usual incoming/outgoing message fields.
+    """
+    try:
+        limit = get_page_size(request.args.get('limit', 100, type=int))
+        sort_order = request.args.get('sort', 'desc')
+        cursor = request.args.get('cursor', '')
+        simulated = is_simulation_mode()
+
+        rows, next_cursor, prev_cursor = paginate_merged(
+            conversation_streams(user_id, simulated), sort_order == 'desc', limit, cursor=cursor
+        )
+
+        user_info = get_users_display_info([user_id]).get(user_id)
+        row_serializers = {'incoming': incoming_row, 'outgoing': outgoing_row}
+        messages = [
+            {'direction': kind, **row_serializers[kind](doc_id, data, user_info)}
+            for kind, doc_id, data in rows
+        ]
 
         return jsonify({
             'status': 'success',
+            'userId': user_id,
             'count': len(messages),
             'messages': messages,
+            'nextCursor': next_cursor,
+            'prevCursor': prev_cursor,
             'simulationMode': simulated
         }), 200
 
+    except InvalidCursor as e:
+        return jsonify({
+            'error': 'invalid_cursor',
+            'message': str(e)
+        }), 400
+
     except Exception as e:
-        logger.error(f"Error fetching outgoing messages: {e}")
+        logger.error(f"Error fetching conversation: {e}")
         return jsonify({
             'error': 'query_failed',
-            'message': 'Failed to fetch messages from database'
+            'message': 'Failed to fetch conversation from database'
+        }), 500
+
+
+# Open /api/stream connections in this process (each holds a worker thread)
+_stream_slots = None
+_stream_slots_lock = threading.Lock()
+
+
+def _get_stream_slots():
+    """Get the per-process stream semaphore (LIVE_FEED_MAX_STREAMS slots)."""
+    global _stream_slots
+
+    with _stream_slots_lock:
+        if _stream_slots is None:
+            _stream_slots = threading.BoundedSemaphore(int(os.environ.get('LIVE_FEED_MAX_STREAMS', 4)))
+        return _stream_slots
+
+
+@api_bp.route('/stream', methods=['GET'])
+@login_required
+def stream():
+    """
+    Live feed of new and changed messages (Server-Sent Events).
+    GET /api/stream?types=incoming,outgoing
+
+    Events are named 'incoming' or 'outgoing' with data {change, message},
+    where message has the same shape as /api/messages/* rows. A 'reset' event
+    means the client fell behind and should reload. The stream ends after
+    LIVE_FEED_MAX_SECONDS (default 25, kept well under the worker timeout)
+    and the browser reconnects; Last-Event-ID resumes where it left off.
+
+    Each open stream holds a worker thread, so a process serves at most
+    LIVE_FEED_MAX_STREAMS at once. Above that it answers 503 with
+    fallback 'poll', and the dashboard polls /api/messages/* instead.
+    """
+    slots = _get_stream_slots()
+    if not slots.acquire(blocking=False):
+        poll_seconds = int(os.environ.get('LIVE_FEED_POLL_SECONDS', 15))
+        response = jsonify({
+            'error': 'stream_limit',
+            'message': 'Too many live streams on this server; poll for new messages instead',
+            'fallback': 'poll',
+            'pollSeconds': poll_seconds
+        })
+        response.headers['Retry-After'] = str(poll_seconds)
+        return response, 503
+
+    types = set(filter(None, request.args.get('types', 'incoming,outgoing').split(',')))
+    max_seconds = float(os.environ.get('LIVE_FEED_MAX_SECONDS', 25))
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+
+    def events():
+        feed = get_live_feed()
+        subscriber = feed.subscribe(last_event_id)
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield 'retry: 3000\n\n'
+            while time.monotonic() < deadline:
+                try:
+                    event = subscriber.get(timeout=min(15, max(deadline - time.monotonic(), 0.1)))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event['type'] == 'reset':
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+                if event['type'] in types:
+                    data = json.dumps({'change': event['change'], 'message': event['message']})
+                    yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+        finally:
+            feed.unsubscribe(subscriber)
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(slots.release)
+    return response
+
+
+@api_bp.route('/export/<kind>', methods=['GET'])
+@login_required
+def export(kind):
+    """
+    Stream a message log export.
+    GET /api/export/incoming?format=csv&from=2025-01-01&to=2025-02-01&userId=...&gzip=true
+
+    format is ndjson (default) or csv; from/to are ISO 8601 (naive times are UTC).
+    Rows have the same shape as /api/messages/* and are read and written a page
+    at a time. Auto-filters by simulation mode.
+    """
+    if kind not in EXPORTS:
+        return jsonify({'error': 'not_found', 'message': f'Unknown export: {kind}'}), 404
+
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in FORMATS:
+        return jsonify({
+            'error': 'validation_error',
+            'message': f"format must be one of: {', '.join(FORMATS)}"
+        }), 400
+
+    try:
+        start = parse_timestamp(request.args.get('from'))
+        end = parse_timestamp(request.args.get('to'))
+    except ValueError:
+        return jsonify({
+            'error': 'validation_error',
+            'message': 'from and to must be ISO 8601 timestamps'
+        }), 400
+
+    user_id = request.args.get('userId', '')
+    compress = request.args.get('gzip', 'false').lower() == 'true'
+    simulated = is_simulation_mode()
+
+    logger.info(f"GET /api/export/{kind} format={fmt} gzip={compress} simulated={simulated}")
+    chunks = export_messages(kind, fmt, simulated, start=start, end=end,
+                             user_id=user_id or None, compress=compress)
+
+    filename = f"{kind}-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+
+@api_bp.route('/stats', methods=['GET'])
+@login_required
+def get_stats():
+    """
+    Get dashboard summary statistics.
+    GET /api/stats?hours=24
+    Auto-filters by simulation mode.
+
+    Served from hourly counter documents (a handful of reads).
+    """
+    try:
+        hours = max(1, min(request.args.get('hours', 24, type=int), 24 * 7))
+        simulated = is_simulation_mode()
+
+        counts = get_message_stats(simulated, hours=hours)
+
+        return jsonify({
+            'status': 'success',
+            'windowHours': hours,
+            'activeUsers': count_active_users(),
+            'incoming': counts['incoming'],
+            'outgoing': counts['outgoing'],
+            'unknown': counts['unknown'],
+            'source': counts['source'],
+            'simulationMode': simulated
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching stats: {e}")
+        return jsonify({
+            'error': 'query_failed',
+            'message': 'Failed to fetch stats from database'
+        }), 500
+
+
+@api_bp.route('/stats/recompute', methods=['POST'])
+@login_required
+def recompute_stats():
+    """
+    Rebuild the hourly counters from Firestore count() aggregations.
+    POST /api/stats/recompute?hours=24
+    """
+    try:
+        hours = max(1, min(request.args.get('hours', 24, type=int), 24 * 7))
+        simulated = is_simulation_mode()
+
+        buckets = recompute_message_stats(simulated, hours=hours)
+        logger.info(f"POST /api/stats/recompute 200 buckets={buckets} simulated={simulated}")
+
+        return jsonify({
+            'status': 'success',
+            'buckets': buckets,
+            'simulationMode': simulated
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error recomputing stats: {e}")
+        return jsonify({
+            'error': 'server_error',
+            'message': str(e)
         }), 500
 
 
 @api_bp.route('/users', methods=['GET'])
 @login_required
+@conditional('users')
 def get_users():
     """
     Get all registered users.
@@ -364,23 +938,30 @@ def get_users():
 
     Returns userId (UUID) and masked phone, not full phone numbers.
     """
+    from google.cloud.firestore_v1.base_query import FieldFilter
     try:
         status_filter = request.args.get('status', 'active')
 
-        db = get_db()
-        query = db.collection('users')
+        directory = get_user_directory()
+        if directory is not None:
+            # Served from memory - no Firestore reads
+            rows = [
+                (phone, data) for phone, data in directory.all_users()
+                if status_filter == 'all' or data.get('status') == status_filter
+            ]
+        else:
+            db = get_db()
+            query = db.collection('users')
 
-        # Apply status filter (unless 'all')
-        if status_filter != 'all':
-            query = query.where(filter=FieldFilter('status', '==', status_filter))
+            # Apply status filter (unless 'all')
+            if status_filter != 'all':
+                query = query.where(filter=FieldFilter('status', '==', status_filter))
 
-        # Execute query
-        docs = query.stream()
+            # Execute query (phone number is the document ID)
+            rows = [(doc.id, doc.to_dict()) for doc in query.stream()]
 
         users = []
-        for doc in docs:
-            data = doc.to_dict()
-            phone_number = doc.id  # Phone number is the document ID
+        for phone_number, data in rows:
             user_id = data.get('userId', '')  # UUID
             users.append({
                 'userId': user_id,
@@ -435,9 +1016,7 @@ def simulate_incoming():
         phone_number = data.get('phoneNumber', '')
         message_content = data.get('messageContent', '')
 
-        db = get_db()
         is_registered = False
-        response_sent = False
         log_identifier = None
         phone_for_twilio = None
         user_data = None
@@ -466,44 +1045,12 @@ def simulate_incoming():
                 'message': 'Either userId (UUID) or phoneNumber required'
             }), 400
 
-        # If registered, simulate sending acknowledgment
-        if is_registered and phone_for_twilio:
-            try:
-                ack_message = send_sms(phone_for_twilio, "Your number is recognized. Message received.")
-                response_sent = True
-                logger.info(f"[SIMULATION] Acknowledgment logged for user")
-
-                # Log the outgoing acknowledgment (UUID userId, no phone number)
-                ack_record = {
-                    'queuedAt': datetime.now(timezone.utc),
-                    'sentAt': datetime.now(timezone.utc),
-                    'userId': user_id,  # UUID
-                    'messageContent': "Your number is recognized. Message received.",
-                    'operatorId': 'system',
-                    'operatorName': 'System (Auto-reply)',
-                    'status': 'sent',
-                    'twilio_SmsMessageSid': ack_message.sid,
-                    'twilio_ErrorMessage': None,
-                    'simulated': True
-                }
-                db.collection('outgoingMessages').add(ack_record)
-
-            except Exception as e:
-                logger.error(f"[SIMULATION] Failed to log acknowledgment: {e}")
-
-        # Log incoming message to Firestore (UUID or hash, no phone number)
-        incoming_message = {
-            'timestamp': datetime.now(timezone.utc),
-            'userId': log_identifier,  # UUID for registered, hash for unknown
-            'messageContent': message_content,
-            'isRegistered': is_registered,
-            'responseSent': response_sent,
-            'twilio_SmsMessageSid': f"SIM{uuid.uuid4().hex[:30]}",
-            'simulated': True
-        }
-
-        doc_ref = db.collection('incomingMessages').add(incoming_message)
-        message_id = doc_ref[1].id
+        # Log the message and acknowledge it through the same path as the webhook
+        result = handle_incoming_message(
+            phone_for_twilio, user_id if is_registered else None, is_registered, log_identifier,
+            message_content, f"SIM{uuid.uuid4().hex[:30]}", simulated=True
+        )
+        message_id = result['messageId']
 
         logger.info(f"[SIMULATION] Incoming message logged: registered={is_registered}")
 
@@ -525,7 +1072,9 @@ def simulate_incoming():
             'userName': display_info.get('name', '') if display_info else '',
             'maskedPhone': display_info.get('maskedPhone', '') if display_info else '(unknown)',
             'isRegistered': is_registered,
-            'responseSent': response_sent,
+            'responseSent': result['responseSent'],
+            'responsePending': result['responsePending'],
+            'twiml': result['twiml'],
             'simulated': True
         }), 200
 
@@ -0,0 +1,55 @@
+"""Conditional GET support for list APIs."""
+
+import hashlib
+import os
+import time
+from functools import wraps
+
+from flask import request, current_app
+
+from services.twilio_sms import is_simulation_mode
+from services.versions import get_version, get_response_cache
+
+
+def _etag(collections):
+    """ETag for the current request from collection versions and query parameters.
+
+    ETAG_MAX_AGE seconds of wall time are folded in, bounding staleness from
+    writers whose bumps this host does not see (e.g. a worker on another host).
+    """
+    max_age = int(os.environ.get('ETAG_MAX_AGE', 30))
+    epoch = int(time.time() // max_age) if max_age > 0 else 0
+    versions = [get_version(collection) for collection in collections]
+    params = sorted(request.args.items(multi=True))
+    key = repr((request.path, params, is_simulation_mode(), versions, epoch))
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def conditional(*collections):
+    """Decorator adding ETag / If-None-Match and a short-lived response cache.
+
+    Args:
+        collections: Collections whose versions the response depends on.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = _etag(collections)
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+            else:
+                cache = get_response_cache()
+                body = cache.get(etag)
+                if body is not None:
+                    response = current_app.response_class(body, mimetype='application/json')
+                else:
+                    response = current_app.make_response(f(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    cache.put(etag, response.get_data())
+            response.set_etag(etag)
+            # Browsers may keep the body but must revalidate each time
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
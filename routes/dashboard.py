@@ -1,14 +1,26 @@
 """Dashboard routes."""
 
+import hmac
 import logging
 from datetime import datetime, timezone
 import os
 
-from flask import Blueprint, render_template, request, session, redirect, url_for, jsonify, current_app
+from flask import Blueprint, Response, render_template, request, session, redirect, url_for, jsonify, current_app
 from werkzeug.security import check_password_hash
 
-from services.firebase import get_db, get_operator_password_hash
-from routes.auth import login_required
+from services.firebase import get_operator_password_hash, get_user_directory_stats
+from services.writebehind import get_write_buffer_stats
+from services.ratelimit import get_rate_limiter_stats
+from services.twilio_sms import get_twilio_http_stats
+from services.senders import get_sender_stats
+from services.delivery_status import get_status_tracker_stats
+from services.live_feed import get_live_feed_stats
+from services.versions import get_response_cache
+from services.search import get_search_stats
+from services.startup import get_startup_stats
+from services.health import get_health_state
+from services.metrics import render_metrics
+from routes.auth import is_session_expired, login_required
 
 logger = logging.getLogger(__name__)
 
@@ -52,29 +64,73 @@ def logout():
     return redirect(url_for('dashboard.login'))
 
 
+@dashboard_bp.route('/health/live')
+def health_live():
+    """Liveness: the process is serving requests. Touches no dependency."""
+    return jsonify({'status': 'alive'}), 200
+
+
+@dashboard_bp.route('/health/ready')
+def health_ready():
+    """Readiness: Firestore answered a recent background probe. Touches no dependency."""
+    state, ready, _ = get_health_state()
+    return jsonify({'status': 'ready' if ready else state}), 200 if ready else 503
+
+
+# Health probe state -> /health 'firebase' value
+FIREBASE_STATES = {'up': 'connected', 'down': 'disconnected', 'unknown': 'connecting'}
+
+
 @dashboard_bp.route('/health')
 def health():
-    """Health check endpoint for Railway."""
+    """Health check endpoint for Railway.
+
+    Answers from the background prober's cached results (no Firestore read),
+    with latency percentiles per dependency. 'starting' answers 200 so a cold
+    process passes its health check immediately.
+    """
+    state, _, dependencies = get_health_state()
     status = {
-        'status': 'healthy',
+        'status': state,
         'timestamp': datetime.now(timezone.utc).isoformat(),
-        'firebase': 'unknown',
-        'twilio': 'configured' if os.environ.get('TWILIO_ACCOUNT_SID') else 'not_configured'
+        'firebase': FIREBASE_STATES.get(dependencies['firestore']['state'], 'unknown'),
+        'twilio': 'configured' if os.environ.get('TWILIO_ACCOUNT_SID') else 'not_configured',
+        'dependencies': dependencies,
+        'userDirectory': get_user_directory_stats(),
+        'writeBehind': get_write_buffer_stats(),
+        'smsRateLimit': get_rate_limiter_stats(),
+        'twilioHttp': get_twilio_http_stats(),
+        'senders': get_sender_stats(),
+        'deliveryStatus': get_status_tracker_stats(),
+        'liveFeed': get_live_feed_stats(),
+        'responseCache': get_response_cache().stats(),
+        'search': get_search_stats(),
+        'startup': get_startup_stats()
     }
 
-    try:
-        db = get_db()
-        db.collection('users').limit(1).get()
-        status['firebase'] = 'connected'
-    except Exception as e:
-        status['firebase'] = 'disconnected'
-        status['status'] = 'unhealthy'
-        logger.error(f"Firebase health check failed: {e}")
-
-    status_code = 200 if status['status'] == 'healthy' else 503
+    status_code = 503 if state == 'unhealthy' else 200
     return jsonify(status), status_code
 
 
+@dashboard_bp.route('/metrics')
+def metrics():
+    """Prometheus metrics (aggregated across gunicorn workers).
+
+    Served to scrapers sending 'Authorization: Bearer <METRICS_TOKEN>' and to
+    logged-in operators. METRICS_PUBLIC=true serves them without auth (only
+    where the port is reachable from a private network alone).
+    """
+    if os.environ.get('METRICS_PUBLIC', 'false').lower() != 'true':
+        token = os.environ.get('METRICS_TOKEN')
+        authorization = request.headers.get('Authorization', '')
+        has_token = bool(token) and hmac.compare_digest(authorization, f"Bearer {token}")
+        if not has_token and ('operator_id' not in session or is_session_expired()):
+            return jsonify({'error': 'unauthorized', 'message': 'Metrics token or operator login required'}), 401
+
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
 @dashboard_bp.route('/')
 @login_required
 def index():
@@ -103,6 +159,13 @@ def send_message():
     return render_template('send.html', active_page='send')
 
 
+@dashboard_bp.route('/search')
+@login_required
+def search():
+    """Message search view."""
+    return render_template('search.html', active_page='search')
+
+
 @dashboard_bp.route('/users')
 @login_required
 def users():
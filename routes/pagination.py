@@ -0,0 +1,208 @@
+"""Cursor pagination utilities for list endpoints."""
+
+import base64
+import binascii
+import heapq
+import json
+import os
+from datetime import datetime
+
+# Hard server-side cap on page size
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 500))
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+    pass
+
+
+def get_page_size(requested, default=100):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE."""
+    if requested is None:
+        requested = default
+    return max(1, min(requested, MAX_PAGE_SIZE))
+
+
+def encode_cursor(direction, order_value, doc_id):
+    """Build an opaque cursor token.
+
+    Args:
+        direction: 'next' (continue after this row) or 'prev' (page before this row).
+        order_value: Value of the ordered field (datetime) for the boundary row.
+        doc_id: Document ID of the boundary row (tie-breaker).
+
+    Returns:
+        str: URL-safe token.
+    """
+    payload = {
+        'd': direction,
+        'v': order_value.isoformat(),
+        'id': doc_id
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor token.
+
+    Returns:
+        tuple: (direction, order_value, doc_id)
+
+    Raises:
+        InvalidCursor: If the token is malformed.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload['d']
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(payload['v']), str(payload['id'])
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+
+def paginate(query, order_field, descending, limit, cursor=None):
+    """Fetch one page of a query ordered by (order_field, document ID).
+
+    Reads at most limit + 1 documents regardless of collection size.
+
+    Args:
+        query: Firestore query with filters applied (no ordering or limit).
+        order_field: Timestamp field to order by (e.g. 'timestamp', 'queuedAt').
+        descending: True for newest first.
+        limit: Page size (already clamped).
+        cursor: Optional token from a previous page's nextCursor/prevCursor.
+
+    Returns:
+        tuple: (rows, next_cursor, prev_cursor) where rows is a list of
+               (doc_id, data) in display order and cursors may be None.
+    """
+    from firebase_admin import firestore
+    from google.cloud.firestore_v1.field_path import FieldPath
+    direction, boundary_value, boundary_id = (None, None, None)
+    if cursor:
+        direction, boundary_value, boundary_id = decode_cursor(cursor)
+
+    backwards = direction == 'prev'
+    # Walk the index in reverse to fetch the page before the boundary
+    reverse = descending != backwards
+    order = firestore.Query.DESCENDING if reverse else firestore.Query.ASCENDING
+
+    query = query.order_by(order_field, direction=order)
+    query = query.order_by(FieldPath.document_id(), direction=order)
+    if cursor:
+        query = query.start_after({order_field: boundary_value, FieldPath.document_id(): boundary_id})
+    query = query.limit(limit + 1)
+
+    rows = [(doc.id, doc.to_dict()) for doc in query.stream()]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if backwards:
+        rows.reverse()
+
+    def _cursor_for(direction, row):
+        doc_id, data = row
+        return encode_cursor(direction, data.get(order_field), doc_id)
+
+    next_cursor = None
+    prev_cursor = None
+    if rows:
+        # Moving forward, more rows means a next page; moving back, there is always one
+        if backwards or has_more:
+            next_cursor = _cursor_for('next', rows[-1])
+        # Any cursor means we came from somewhere; moving back, only if rows remain
+        if (cursor and not backwards) or (backwards and has_more):
+            prev_cursor = _cursor_for('prev', rows[0])
+
+    return rows, next_cursor, prev_cursor
+
+
+def _kind_cursor(direction, kind, order_value, doc_id):
+    """Cursor for a merged-stream row; the stream kind travels with the document ID."""
+    return encode_cursor(direction, order_value, f"{kind}:{doc_id}")
+
+
+def paginate_merged(streams, descending, limit, cursor=None):
+    """Fetch one page of several ordered queries merged into one timeline.
+
+    Rows are ordered by (time, stream position, document ID), so ties between
+    streams are stable. Each stream reads at most limit + 1 documents from the
+    cursor's boundary, and heapq.merge interleaves them.
+
+    Args:
+        streams: List of (kind, query, order_field) with filters applied (no
+            ordering or limit), e.g. [('incoming', q1, 'timestamp'), ('outgoing', q2, 'queuedAt')].
+        descending: True for newest first.
+        limit: Page size (already clamped).
+        cursor: Optional token from a previous page's nextCursor/prevCursor.
+
+    Returns:
+        tuple: (rows, next_cursor, prev_cursor) where rows is a list of
+               (kind, doc_id, data) in display order and cursors may be None.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or names an unknown stream.
+    """
+    from firebase_admin import firestore
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    from google.cloud.firestore_v1.field_path import FieldPath
+    ranks = {kind: rank for rank, (kind, _, _) in enumerate(streams)}
+    fields = {kind: order_field for kind, _, order_field in streams}
+
+    direction, boundary_value, boundary_kind, boundary_id = (None, None, None, None)
+    if cursor:
+        direction, boundary_value, boundary_ref = decode_cursor(cursor)
+        boundary_kind, _, boundary_id = boundary_ref.partition(':')
+        if boundary_kind not in ranks or not boundary_id:
+            raise InvalidCursor('Invalid cursor: unknown stream')
+
+    backwards = direction == 'prev'
+    reverse = descending != backwards
+    order = firestore.Query.DESCENDING if reverse else firestore.Query.ASCENDING
+
+    fetched = []
+    for kind, query, order_field in streams:
+        if cursor:
+            if kind == boundary_kind:
+                query = query.order_by(order_field, direction=order)
+                query = query.order_by(FieldPath.document_id(), direction=order)
+                query = query.start_after({order_field: boundary_value, FieldPath.document_id(): boundary_id})
+            else:
+                # At the boundary time, streams ordered after the boundary's stream still belong to this page
+                after = ranks[kind] < ranks[boundary_kind] if reverse else ranks[kind] > ranks[boundary_kind]
+                op = ('<' if reverse else '>') + ('=' if after else '')
+                query = query.where(filter=FieldFilter(order_field, op, boundary_value))
+                query = query.order_by(order_field, direction=order)
+                query = query.order_by(FieldPath.document_id(), direction=order)
+        else:
+            query = query.order_by(order_field, direction=order)
+            query = query.order_by(FieldPath.document_id(), direction=order)
+        rank = ranks[kind]
+        fetched.append([
+            ((doc.get(order_field), rank, doc.id), (kind, doc.id, doc.to_dict()))
+            for doc in query.limit(limit + 1).stream()
+        ])
+
+    merged = [row for _, row in heapq.merge(*fetched, key=lambda item: item[0], reverse=reverse)]
+    has_more = len(merged) > limit
+    rows = merged[:limit]
+
+    if backwards:
+        rows.reverse()
+
+    def _cursor_for(direction, row):
+        kind, doc_id, data = row
+        return _kind_cursor(direction, kind, data.get(fields[kind]), doc_id)
+
+    next_cursor = None
+    prev_cursor = None
+    if rows:
+        if backwards or has_more:
+            next_cursor = _cursor_for('next', rows[-1])
+        if (cursor and not backwards) or (backwards and has_more):
+            prev_cursor = _cursor_for('prev', rows[0])
+
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,87 @@
+"""Request tracing and profiling hooks.
+
+A request is profiled with cProfile when it carries
+'X-Debug-Profile: <PROFILE_TOKEN>', or 'X-Debug-Profile: 1' from a logged-in
+operator, or is picked by PROFILE_SAMPLE_RATE (0-1, default 0). The profile
+is written to PROFILE_DIR and named in the X-Profile-Dump response header
+(left out if it could not be written). One request per process is profiled at
+a time; others that ask meanwhile are only traced.
+
+Traced requests (all of them with TRACING_ENABLED=true, and every profiled
+one) get a Server-Timing header and a 'Trace {...}' log line.
+"""
+
+import hmac
+import logging
+import os
+import random
+import time
+
+from flask import g, request, session
+
+from routes.auth import is_session_expired
+from services.tracing import (
+    dump_profile, end_trace, is_tracing_enabled, log_trace, server_timing_header, start_profile, start_trace,
+    stop_profile
+)
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Debug-Profile'
+
+
+def _profile_requested():
+    """Check the operator switch (token or operator session) and the sampling rate."""
+    value = request.headers.get(PROFILE_HEADER)
+    if value:
+        token = os.environ.get('PROFILE_TOKEN')
+        if token and hmac.compare_digest(value, token):
+            return True
+        if 'operator_id' in session and not is_session_expired():
+            return True
+    rate = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    return rate > 0 and random.random() < rate
+
+
+def init_request_tracing(app):
+    """Register the tracing and profiling hooks on the Flask app."""
+
+    @app.before_request
+    def _start_tracing():
+        profiled = _profile_requested()
+        if not profiled and not is_tracing_enabled():
+            return
+        g.trace_start = time.perf_counter()
+        start_trace()
+        if profiled:
+            # None while another request is being profiled; that one is still traced
+            g.profiler = start_profile()
+
+    @app.after_request
+    def _finish_tracing(response):
+        start = g.pop('trace_start', None)
+        if start is None:
+            return response
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            try:
+                path = dump_profile(profiler, request.endpoint or 'unmatched')
+                response.headers['X-Profile-Dump'] = os.path.basename(path)
+            except Exception as e:
+                # A debugging aid must never fail the request it profiled
+                logger.error(f"Could not write profile: {e}")
+
+        total = time.perf_counter() - start
+        spans = end_trace() or []
+        response.headers['Server-Timing'] = server_timing_header(spans, total)
+        log_trace(request.endpoint or request.path, request.method, response.status_code, spans, total)
+        return response
+
+    @app.teardown_request
+    def _clear_trace(exc=None):
+        # The thread serves other requests next; never leave a trace (or profiler) behind
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            stop_profile(profiler)
+        end_trace()
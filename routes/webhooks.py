@@ -1,13 +1,12 @@
 """Twilio webhook endpoints."""
 
 import logging
-from datetime import datetime, timezone
 
 from flask import Blueprint, request
-from twilio.twiml.messaging_response import MessagingResponse
 
-from services.firebase import get_db, get_user_by_phone, hash_phone_number
-from services.twilio_sms import send_sms
+from services.firebase import get_user_by_phone, hash_phone_number
+from services.inbound import handle_incoming_message
+from services.delivery_status import is_valid_status_callback, record_status_callback
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +22,7 @@ def incoming():
     Logs messages using UUID userId (not phone number) for privacy.
     Unknown numbers are logged with a hashed identifier.
     """
+    from twilio.twiml.messaging_response import MessagingResponse
     try:
         # Parse Twilio webhook data
         phone_number = request.form.get('From', '')
@@ -31,42 +31,20 @@ def incoming():
 
         logger.info(f"POST /twilio/incoming received")
 
-        db = get_db()
-
         # Look up user by phone number to get UUID
         user_uuid, phone, user_data = get_user_by_phone(phone_number)
         is_registered = user_uuid is not None and user_data.get('status') == 'active'
-        response_sent = False
-
-        # If registered, send acknowledgment
-        if is_registered:
-            try:
-                send_sms(phone_number, "Your number is recognized. Message received.")
-                response_sent = True
-                logger.info(f"Acknowledgment sent to user")
-            except Exception as e:
-                logger.error(f"Failed to send acknowledgment: {e}")
 
         # Determine identifier for logging (UUID or hashed phone for unknown)
         log_identifier = user_uuid if is_registered else hash_phone_number(phone_number)
 
-        # Log incoming message to Firestore (NO phone number stored)
-        incoming_message = {
-            'timestamp': datetime.now(timezone.utc),
-            'userId': log_identifier,  # UUID for registered, hash for unknown
-            'messageContent': message_content,
-            'isRegistered': is_registered,
-            'responseSent': response_sent,
-            'twilio_SmsMessageSid': message_sid,
-            'simulated': False
-        }
-
-        db.collection('incomingMessages').add(incoming_message)
-        logger.info(f"Incoming message logged: registered={is_registered}")
-
-        # Return empty TwiML response
-        response = MessagingResponse()
-        return str(response), 200, {'Content-Type': 'application/xml'}
+        result = handle_incoming_message(
+            phone_number, user_uuid, is_registered, log_identifier,
+            message_content, message_sid, simulated=False
+        )
+
+        # TwiML response (contains the acknowledgment when ACK_MODE=twiml)
+        return result['twiml'], 200, {'Content-Type': 'application/xml'}
 
     except Exception as e:
         logger.error(f"Error processing incoming message: {e}")
@@ -77,6 +55,30 @@ def incoming():
 
 @webhooks_bp.route('/status', methods=['POST'])
 def status():
-    """Receive delivery status updates from Twilio (stub for future)."""
-    logger.info("Twilio status callback received")
+    """
+    Receive delivery status updates from Twilio.
+    POST /twilio/status?mid=<outgoingMessages document ID>
+
+    Updates are coalesced and written in the background; regressions are ignored.
+    Requests without a valid X-Twilio-Signature are rejected with 403, since
+    mid alone decides which message is updated.
+    """
+    signature = request.headers.get('X-Twilio-Signature', '')
+    if not is_valid_status_callback(request.query_string.decode(), request.form, signature):
+        logger.warning("Rejected status callback with an invalid signature")
+        return '', 403
+
+    try:
+        message_sid = request.form.get('MessageSid', '')
+        message_status = request.form.get('MessageStatus', '')
+        error_code = request.form.get('ErrorCode') or None
+
+        if message_sid and message_status:
+            record_status_callback(message_sid, message_status,
+                                   message_id=request.args.get('mid'), error_code=error_code)
+
+    except Exception as e:
+        logger.error(f"Error processing status callback: {e}")
+
+    # Always 200 so Twilio doesn't retry
     return '', 200
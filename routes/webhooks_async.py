@@ -0,0 +1,81 @@
+"""Twilio webhook endpoints for the async server (aio_app.py).
+
+Same paths, inputs and responses as routes/webhooks.py, but handled on the
+event loop: user lookups and Firestore writes are awaited, so a slow
+round trip holds a coroutine instead of a worker.
+"""
+
+import logging
+
+from aiohttp import web
+from twilio.twiml.messaging_response import MessagingResponse
+
+from services.firebase import get_user_by_phone_async, hash_phone_number
+from services.inbound import handle_incoming_message_async
+from services.delivery_status import is_valid_status_callback, record_status_callback_async
+
+logger = logging.getLogger(__name__)
+
+routes = web.RouteTableDef()
+
+
+@routes.post('/twilio/incoming', name='webhooks.incoming')
+async def incoming(request):
+    """
+    Receive incoming SMS messages from Twilio.
+    POST /twilio/incoming
+
+    Logs messages using UUID userId (not phone number) for privacy.
+    Unknown numbers are logged with a hashed identifier.
+    """
+    try:
+        form = await request.post()
+        phone_number = form.get('From', '')
+        message_content = form.get('Body', '')
+        message_sid = form.get('MessageSid', '')
+
+        logger.info(f"POST /twilio/incoming received")
+
+        user_uuid, phone, user_data = await get_user_by_phone_async(phone_number)
+        is_registered = user_uuid is not None and user_data.get('status') == 'active'
+        log_identifier = user_uuid if is_registered else hash_phone_number(phone_number)
+
+        result = await handle_incoming_message_async(
+            phone_number, is_registered, log_identifier, message_content, message_sid
+        )
+        return web.Response(text=result['twiml'], content_type='application/xml')
+
+    except Exception as e:
+        logger.error(f"Error processing incoming message: {e}")
+        # Still return 200 to Twilio to prevent retries
+        return web.Response(text=str(MessagingResponse()), content_type='application/xml')
+
+
+@routes.post('/twilio/status', name='webhooks.status')
+async def status(request):
+    """
+    Receive delivery status updates from Twilio.
+    POST /twilio/status?mid=<outgoingMessages document ID>
+
+    Requests without a valid X-Twilio-Signature are rejected with 403.
+    """
+    form = await request.post()
+    signature = request.headers.get('X-Twilio-Signature', '')
+    if not is_valid_status_callback(request.query_string, form, signature):
+        logger.warning("Rejected status callback with an invalid signature")
+        return web.Response(text='', status=403)
+
+    try:
+        message_sid = form.get('MessageSid', '')
+        message_status = form.get('MessageStatus', '')
+        error_code = form.get('ErrorCode') or None
+
+        if message_sid and message_status:
+            await record_status_callback_async(message_sid, message_status,
+                                               message_id=request.query.get('mid'), error_code=error_code)
+
+    except Exception as e:
+        logger.error(f"Error processing status callback: {e}")
+
+    # Always 200 so Twilio doesn't retry
+    return web.Response(text='')
@@ -0,0 +1,439 @@
+"""Bulk (broadcast) send service.
+
+A bulk job sends one message to many users. Sends run on a bounded thread
+pool (BULK_SEND_CONCURRENCY) and per-recipient results are written to
+outgoingMessages in batched writes together with the job's progress counters
+in bulkJobs/{jobId}, so any worker can report progress.
+
+Results that cannot be committed are retried, then written one at a time,
+and otherwise kept for the next commit. On worker exit a job stops taking
+new recipients, records what it sent and is marked 'interrupted'; it (or a
+'running' job whose worker died) can then be resumed from the recipients
+that have no outgoingMessages record yet.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from services.firebase import get_db, get_user_by_uuid, get_user_directory, transactional
+from services.twilio_sms import send_sms, is_simulation_mode
+from services.outgoing import build_outgoing_record
+from services.stats import record_message_stats
+from services.versions import bump_version
+from services.search import index_message
+from services.conversations import record_conversation_message
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = 'bulkJobs'
+
+# Firestore limit on writes per batch (one slot is kept for the job progress update)
+MAX_BATCH_WRITES = 500
+
+# Jobs running in this process, stopped and recorded on exit
+_active_jobs = set()
+_active_lock = threading.Lock()
+
+
+class BulkSendError(ValueError):
+    """Raised when a bulk send request cannot be started."""
+    pass
+
+
+def _get_settings():
+    """Read bulk send settings from the environment."""
+    return {
+        'concurrency': int(os.environ.get('BULK_SEND_CONCURRENCY', 4)),
+        'batch_size': min(int(os.environ.get('BULK_WRITE_BATCH_SIZE', 100)), MAX_BATCH_WRITES - 1),
+        'max_age': float(os.environ.get('BULK_WRITE_MAX_AGE', 2.0)),
+        'max_recipients': int(os.environ.get('BULK_MAX_RECIPIENTS', 5000)),
+        'commit_retries': int(os.environ.get('BULK_COMMIT_RETRIES', 3)),
+        'stale_seconds': float(os.environ.get('BULK_STALE_SECONDS', 300))
+    }
+
+
+def _user_tags(user_data):
+    """Get a user's tags (stored under metadata.tags)."""
+    return (user_data.get('metadata') or {}).get('tags') or []
+
+
+def resolve_segment(status='active', tag=None):
+    """Get the users in a status/tag segment.
+
+    Returns:
+        list: (phone_number, user_data) tuples.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    directory = get_user_directory()
+    if directory is not None:
+        return [
+            (phone, data) for phone, data in directory.all_users()
+            if data.get('status') == status and (not tag or tag in _user_tags(data))
+        ]
+
+    query = get_db().collection('users').where(filter=FieldFilter('status', '==', status))
+    if tag:
+        query = query.where(filter=FieldFilter('metadata.tags', 'array_contains', tag))
+    return [(doc.id, doc.to_dict()) for doc in query.stream()]
+
+
+def resolve_user_ids(user_ids):
+    """Resolve UUIDs to users, skipping unknown and inactive ones.
+
+    Returns:
+        tuple: (list of (phone_number, user_data), number skipped)
+    """
+    recipients = []
+    skipped = 0
+    for user_id in dict.fromkeys(user_ids):  # de-duplicate, keep order
+        phone_number, user_data = get_user_by_uuid(user_id)
+        if user_data and user_data.get('status') == 'active':
+            recipients.append((phone_number, user_data))
+        else:
+            skipped += 1
+    return recipients, skipped
+
+
+def start_bulk_job(recipients, message_content, operator_id, operator_name, skipped=0,
+                   simulate_status='sent'):
+    """Create a bulk job and start sending in the background.
+
+    Args:
+        recipients: List of (phone_number, user_data) tuples.
+        message_content: Message text.
+        operator_id: Operator attribution.
+        operator_name: Operator display name.
+        skipped: Number of requested recipients already skipped (inactive/unknown).
+        simulate_status: Status to simulate ('sent', 'failed') - simulation mode only.
+
+    Returns:
+        str: Job ID.
+
+    Raises:
+        BulkSendError: If there are no recipients or too many.
+    """
+    settings = _get_settings()
+    if not recipients:
+        raise BulkSendError('No active recipients')
+    if len(recipients) > settings['max_recipients']:
+        raise BulkSendError(f"Too many recipients (max {settings['max_recipients']})")
+
+    db = get_db()
+    simulated = is_simulation_mode()
+    now = datetime.now(timezone.utc)
+    job_ref = db.collection(JOBS_COLLECTION).document(uuid.uuid4().hex)
+    job_ref.set({
+        'createdAt': now,
+        'completedAt': None,
+        'heartbeatAt': now,
+        'status': 'running',
+        'operatorId': operator_id,
+        'operatorName': operator_name,
+        'messageContent': message_content,
+        'total': len(recipients),
+        'sent': 0,
+        'failed': 0,
+        'skipped': skipped,
+        'simulated': simulated,
+        # Kept so an interrupted job can be resumed as it was started
+        'simulateStatus': simulate_status,
+        'recipientIds': [user_data.get('userId') for _, user_data in recipients]
+    })
+
+    _BulkJob(job_ref, recipients, message_content, operator_id, operator_name,
+             simulated, simulate_status, settings).start()
+
+    logger.info(f"Bulk job {job_ref.id} started: {len(recipients)} recipients simulated={simulated}")
+    return job_ref.id
+
+
+def _is_resumable(job, stale_seconds):
+    """'interrupted', or 'running' without progress for stale_seconds (its worker died)."""
+    if job.get('status') == 'interrupted':
+        return True
+    heartbeat = job.get('heartbeatAt') or job.get('createdAt')
+    return (
+        job.get('status') == 'running' and heartbeat is not None
+        and (datetime.now(timezone.utc) - heartbeat).total_seconds() > stale_seconds
+    )
+
+
+@transactional
+def _claim_for_resume(transaction, job_ref, stale_seconds):
+    """Atomically move a resumable job back to 'running' (so it is resumed once)."""
+    snapshot = job_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    job = snapshot.to_dict()
+    if not _is_resumable(job, stale_seconds):
+        raise BulkSendError(f"Job is {job.get('status')}, not interrupted")
+    now = datetime.now(timezone.utc)
+    transaction.update(job_ref, {'status': 'running', 'heartbeatAt': now, 'resumedAt': now})
+    return job
+
+
+def resume_bulk_job(job_id):
+    """Resume an interrupted job, sending to the recipients not yet recorded.
+
+    Recipients that were sent to but whose result was never recorded (the
+    worker was killed before it could write them) are sent to again.
+
+    Returns:
+        int: Number of recipients still to send, or None if the job does not exist.
+
+    Raises:
+        BulkSendError: If the job is not resumable.
+    """
+    from firebase_admin import firestore
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    settings = _get_settings()
+    db = get_db()
+    job_ref = db.collection(JOBS_COLLECTION).document(job_id)
+    job = _claim_for_resume(db.transaction(), job_ref, settings['stale_seconds'])
+    if job is None:
+        return None
+
+    recorded = {
+        doc.to_dict().get('userId') for doc in
+        db.collection('outgoingMessages').where(filter=FieldFilter('bulkJobId', '==', job_id)).stream()
+    }
+    remaining = [user_id for user_id in job.get('recipientIds', []) if user_id not in recorded]
+    recipients, skipped = resolve_user_ids(remaining)
+    if skipped:
+        job_ref.update({'skipped': firestore.Increment(skipped)})
+
+    _BulkJob(job_ref, recipients, job['messageContent'], job['operatorId'], job['operatorName'],
+             job.get('simulated', False), job.get('simulateStatus', 'sent'), settings).start()
+
+    logger.info(f"Bulk job {job_id} resumed: {len(recipients)} recipients left, {skipped} skipped")
+    return len(recipients)
+
+
+def get_bulk_job(job_id):
+    """Get a bulk job's progress, or None if it does not exist."""
+    doc = get_db().collection(JOBS_COLLECTION).document(job_id).get()
+    if not doc.exists:
+        return None
+    return doc.to_dict()
+
+
+class _BulkJob:
+    """Sends one bulk job and commits its results in batches."""
+
+    def __init__(self, job_ref, recipients, message_content, operator_id, operator_name,
+                 simulated, simulate_status, settings):
+        self.job_ref = job_ref
+        self.recipients = recipients
+        self.message_content = message_content
+        self.operator_id = operator_id
+        self.operator_name = operator_name
+        self.simulated = simulated
+        self.simulate_status = simulate_status
+        self.settings = settings
+        self._pending = []
+        self._oldest = None
+        self._stop = threading.Event()
+        self._unsent = False
+        self._thread = None
+
+    def start(self):
+        """Run the job in a background thread."""
+        with _active_lock:
+            _active_jobs.add(self)
+        self._thread = threading.Thread(target=self.run, name=f'bulk-{self.job_ref.id[:8]}', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout):
+        """Stop taking new recipients and wait for the job to record what it sent."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _send_one(self, phone_number, user_data):
+        """Send to one recipient and build its outgoing record (phone number in memory only).
+
+        Returns:
+            tuple: (pre-allocated outgoingMessages reference, record)
+        """
+        ref = get_db().collection('outgoingMessages').document()
+        record = build_outgoing_record(
+            user_data.get('userId'), self.message_content, self.operator_id,
+            self.operator_name, self.simulated
+        )
+        record['bulkJobId'] = self.job_ref.id
+        try:
+            message = send_sms(phone_number, self.message_content, simulate_status=self.simulate_status,
+                               message_id=ref.id)
+            record.update({
+                'status': self.simulate_status if self.simulated else 'sent',
+                'sentAt': datetime.now(timezone.utc),
+                'twilio_SmsMessageSid': message.sid
+            })
+        except Exception as e:
+            record.update({
+                'status': 'failed',
+                'twilio_ErrorMessage': str(e)
+            })
+        return ref, record
+
+    def _commit_batch(self, records):
+        """Write records and the job's progress in one batch, retrying with backoff."""
+        from firebase_admin import firestore
+        db = get_db()
+        sent = sum(1 for _, record in records if record['status'] != 'failed')
+        attempts = self.settings['commit_retries'] + 1
+        for attempt in range(attempts):
+            batch = db.batch()
+            for ref, record in records:
+                batch.set(ref, record)
+            batch.update(self.job_ref, {
+                'sent': firestore.Increment(sent),
+                'failed': firestore.Increment(len(records) - sent),
+                'heartbeatAt': datetime.now(timezone.utc)
+            })
+            try:
+                batch.commit()
+                return True
+            except Exception as e:
+                logger.warning(f"Bulk job {self.job_ref.id} commit attempt {attempt + 1}/{attempts} failed: {e}")
+                if attempt + 1 < attempts:
+                    time.sleep(0.5 * 2 ** attempt)
+        return False
+
+    def _commit_each(self, records):
+        """Write records one at a time; returns (written, unwritten)."""
+        from firebase_admin import firestore
+        written, unwritten = [], []
+        for ref, record in records:
+            try:
+                ref.set(record)
+                written.append((ref, record))
+            except Exception as e:
+                logger.error(f"Bulk job {self.job_ref.id} failed to record {ref.id}: {e}")
+                unwritten.append((ref, record))
+        if written:
+            sent = sum(1 for _, record in written if record['status'] != 'failed')
+            try:
+                self.job_ref.update({
+                    'sent': firestore.Increment(sent),
+                    'failed': firestore.Increment(len(written) - sent),
+                    'heartbeatAt': datetime.now(timezone.utc)
+                })
+            except Exception as e:
+                logger.error(f"Bulk job {self.job_ref.id} failed to update progress: {e}")
+        return written, unwritten
+
+    def _commit(self):
+        """Write pending records and the job's progress.
+
+        One batch (retried), else one write per record; records that still
+        cannot be written stay pending for the next commit.
+        """
+        if not self._pending:
+            return
+        records = self._pending
+        self._pending = []
+        self._oldest = None
+
+        if self._commit_batch(records):
+            written = records
+        else:
+            written, unwritten = self._commit_each(records)
+            if unwritten:
+                logger.error(f"Bulk job {self.job_ref.id}: {len(unwritten)} results kept for the next commit")
+                self._pending = unwritten + self._pending
+                self._oldest = time.monotonic()
+        if not written:
+            return
+
+        bump_version('outgoingMessages')
+        for ref, record in written:
+            index_message('outgoing', ref.id, record)
+            record_conversation_message(record['userId'], 'outgoing', ref.id, record['messageContent'],
+                                        self.simulated, at=record.get('sentAt'))
+        record_message_stats(self.simulated, outgoing=len(written))
+
+    def _submit_next(self, executor, recipients, in_flight):
+        """Keep up to `concurrency` sends in flight, unless stopping."""
+        while len(in_flight) < self.settings['concurrency'] and not self._stop.is_set():
+            recipient = next(recipients, None)
+            if recipient is None:
+                return
+            try:
+                in_flight.add(executor.submit(self._send_one, *recipient))
+            except RuntimeError:
+                # Interpreter shutting down: no new work can be scheduled
+                self._stop.set()
+                self._unsent = True
+
+    def run(self):
+        """Send to every recipient with bounded concurrency."""
+        start = time.monotonic()
+        recipients = iter(self.recipients)
+        in_flight = set()
+        try:
+            with ThreadPoolExecutor(max_workers=self.settings['concurrency'],
+                                    thread_name_prefix='bulk-send') as executor:
+                # Recipients are submitted as slots free up, so stopping never waits on a long queue
+                while True:
+                    self._submit_next(executor, recipients, in_flight)
+                    if not in_flight:
+                        break
+                    done, in_flight = wait(in_flight, timeout=self.settings['max_age'],
+                                           return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._pending.append(future.result())
+                        if self._oldest is None:
+                            self._oldest = time.monotonic()
+                    if self._pending and (len(self._pending) >= self.settings['batch_size']
+                                          or time.monotonic() - self._oldest >= self.settings['max_age']):
+                        self._commit()
+            self._commit()
+            unsent = self._unsent or next(recipients, None) is not None
+            status = 'interrupted' if unsent else 'completed'
+        except Exception as e:
+            logger.error(f"Bulk job {self.job_ref.id} aborted: {e}")
+            self._commit()
+            status = 'aborted'
+        finally:
+            with _active_lock:
+                _active_jobs.discard(self)
+
+        if self._pending:
+            # Sent but never recorded; a resume would send to these recipients again
+            user_ids = [record['userId'] for _, record in self._pending]
+            logger.error(f"Bulk job {self.job_ref.id}: {len(user_ids)} sent messages could not be recorded: {user_ids}")
+        try:
+            self.job_ref.update({
+                'status': status,
+                'completedAt': datetime.now(timezone.utc) if status != 'interrupted' else None,
+                'heartbeatAt': datetime.now(timezone.utc)
+            })
+        except Exception as e:
+            logger.error(f"Bulk job {self.job_ref.id} failed to record status {status}: {e}")
+        logger.info(f"Bulk job {self.job_ref.id} {status} in {time.monotonic() - start:.1f}s")
+
+
+def shutdown(timeout=None):
+    """Stop running jobs and record their results (called on worker exit)."""
+    with _active_lock:
+        jobs = list(_active_jobs)
+    if not jobs:
+        return
+    if timeout is None:
+        timeout = float(os.environ.get('BULK_DRAIN_TIMEOUT', 10))
+    deadline = time.monotonic() + timeout
+    for job in jobs:
+        job._stop.set()
+    for job in jobs:
+        job.stop(max(0.0, deadline - time.monotonic()))
+    logger.info(f"Stopped {len(jobs)} bulk jobs")
+
+
+atexit.register(shutdown)
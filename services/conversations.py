@@ -0,0 +1,220 @@
+"""Per-user conversation threads and summaries.
+
+A conversation is one user's incoming and outgoing messages merged into one
+timeline. The conversation list is served from summary documents in the
+`conversations` collection (one per user and mode, e.g. 'live_<userId>'),
+updated by the write paths with the user's last message and message counts,
+so listing conversations never scans the message collections.
+
+Counts are buffered increments. The last-message fields are set in a
+background transaction that only moves them forward in time, so a message
+recorded late (e.g. a scheduled send) never replaces a newer one.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from services.dispatch import submit
+from services.firebase import get_db, transactional
+from services.versions import bump_version
+from services.writebehind import write, write_async
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_COLLECTION = 'conversations'
+
+# Characters of the last message kept in the summary
+PREVIEW_LENGTH = 100
+
+# kind -> (collection, time field)
+STREAMS = {
+    'incoming': ('incomingMessages', 'timestamp'),
+    'outgoing': ('outgoingMessages', 'queuedAt'),
+}
+
+
+def _summary_id(user_id, simulated):
+    """Summary document ID, e.g. 'live_<userId>'."""
+    prefix = 'sim' if simulated else 'live'
+    return f"{prefix}_{user_id}"
+
+
+def _summary_counts(user_id, direction, simulated, count=1):
+    from firebase_admin import firestore
+    return {
+        'userId': user_id,
+        'simulated': simulated,
+        f'{direction}Count': firestore.Increment(count)
+    }
+
+
+def _last_message(direction, message_id, message_content, at):
+    return {
+        'lastMessageAt': at,
+        'lastDirection': direction,
+        'lastMessageId': message_id,
+        'lastMessagePreview': (message_content or '')[:PREVIEW_LENGTH]
+    }
+
+
+@transactional
+def _advance_last_message(transaction, ref, fields, direction):
+    """Set the last-message fields only where this message is newer."""
+    snapshot = ref.get(transaction=transaction)
+    current = (snapshot.to_dict() or {}) if snapshot.exists else {}
+    at = fields['lastMessageAt']
+    update = {}
+    if current.get('lastMessageAt') is None or at >= current['lastMessageAt']:
+        update.update(fields)
+    if direction == 'incoming' and (current.get('lastIncomingAt') is None or at > current['lastIncomingAt']):
+        update['lastIncomingAt'] = at
+    if update:
+        transaction.set(ref, update, merge=True)
+    return bool(update)
+
+
+def _record_last_message(ref, direction, message_id, message_content, at):
+    fields = _last_message(direction, message_id, message_content, at)
+    try:
+        if _advance_last_message(get_db().transaction(), ref, fields, direction):
+            bump_version(SUMMARY_COLLECTION)
+    except Exception as e:
+        logger.error(f"Failed to update conversation last message: {e}")
+
+
+def _summary_update(user_id, direction, simulated):
+    """Summary ref and the buffered count increment for a new message."""
+    ref = get_db().collection(SUMMARY_COLLECTION).document(_summary_id(user_id, simulated))
+    return ref, _summary_counts(user_id, direction, simulated)
+
+
+def _summary_written(ref, direction, message_id, message_content, at):
+    """Publish the count change and queue the last-message update once the counts are written."""
+    # Counts changed even if the last message does not advance, so cached lists must revalidate
+    bump_version(SUMMARY_COLLECTION)
+    # The transaction is sync; it runs on the dispatch pool, off any event loop
+    submit(_record_last_message, ref, direction, message_id, message_content,
+           at or datetime.now(timezone.utc))
+
+
+def record_conversation_message(user_id, direction, message_id, message_content, simulated, at=None):
+    """Update a user's conversation summary with a new message.
+
+    Failures are logged, never raised, so summaries cannot break message flow.
+
+    Args:
+        user_id: User UUID (or unknown_ hash).
+        direction: 'incoming' or 'outgoing'.
+        message_id: Document ID of the message.
+        message_content: Message text (a preview is stored).
+        simulated: Whether the message was simulated.
+        at: When the message was received or sent (defaults to now); for
+            outgoing messages the send time, not when it was queued.
+    """
+    if not user_id:
+        return
+    try:
+        ref, counts = _summary_update(user_id, direction, simulated)
+        write(ref, counts, merge=True)
+        _summary_written(ref, direction, message_id, message_content, at)
+    except Exception as e:
+        logger.error(f"Failed to update conversation summary: {e}")
+
+
+async def record_conversation_message_async(user_id, direction, message_id, message_content,
+                                            simulated, at=None):
+    """Async record_conversation_message() for the async server."""
+    if not user_id:
+        return
+    try:
+        ref, counts = _summary_update(user_id, direction, simulated)
+        await write_async(ref, counts, merge=True)
+        _summary_written(ref, direction, message_id, message_content, at)
+    except Exception as e:
+        logger.error(f"Failed to update conversation summary: {e}")
+
+
+def conversation_streams(user_id, simulated):
+    """Queries for a user's incoming and outgoing messages, for paginate_merged().
+
+    Returns:
+        list: (kind, query, order_field) tuples.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    db = get_db()
+    streams = []
+    for kind, (collection, order_field) in STREAMS.items():
+        query = db.collection(collection)
+        query = query.where(filter=FieldFilter('userId', '==', user_id))
+        query = query.where(filter=FieldFilter('simulated', '==', simulated))
+        streams.append((kind, query, order_field))
+    return streams
+
+
+def summaries_query(simulated):
+    """Query for conversation summaries (filters only, for paginate())."""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    query = get_db().collection(SUMMARY_COLLECTION)
+    return query.where(filter=FieldFilter('simulated', '==', simulated))
+
+
+def rebuild_conversation_summaries(simulated, page_size=500):
+    """Rebuild every summary from the message collections (one paged scan each).
+
+    Used to backfill summaries for messages logged before they existed, or to
+    correct drift.
+
+    Returns:
+        int: Number of summaries written.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    from google.cloud.firestore_v1.field_path import FieldPath
+    db = get_db()
+    summaries = {}
+    for kind, (collection, order_field) in STREAMS.items():
+        query = db.collection(collection).where(filter=FieldFilter('simulated', '==', simulated))
+        query = query.order_by(FieldPath.document_id()).limit(page_size)
+        last = None
+        while True:
+            page = query.start_after({FieldPath.document_id(): last}) if last else query
+            docs = list(page.stream())
+            for doc in docs:
+                data = doc.to_dict()
+                user_id = data.get('userId')
+                # Outgoing messages count from when they were sent, as in record_conversation_message()
+                at = data.get('sentAt') or data.get(order_field)
+                if not user_id or at is None:
+                    continue
+                summary = summaries.setdefault(user_id, {
+                    'userId': user_id, 'simulated': simulated,
+                    'incomingCount': 0, 'outgoingCount': 0, 'lastMessageAt': None
+                })
+                summary[f'{kind}Count'] += 1
+                if summary['lastMessageAt'] is None or at > summary['lastMessageAt']:
+                    summary.update({
+                        'lastMessageAt': at,
+                        'lastDirection': kind,
+                        'lastMessageId': doc.id,
+                        'lastMessagePreview': (data.get('messageContent') or '')[:PREVIEW_LENGTH]
+                    })
+                if kind == 'incoming' and (summary.get('lastIncomingAt') is None or at > summary['lastIncomingAt']):
+                    summary['lastIncomingAt'] = at
+            if len(docs) < page_size:
+                break
+            last = docs[-1].id
+
+    batch = db.batch()
+    pending = 0
+    for user_id, summary in summaries.items():
+        batch.set(db.collection(SUMMARY_COLLECTION).document(_summary_id(user_id, simulated)), summary)
+        pending += 1
+        if pending == 500:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    bump_version(SUMMARY_COLLECTION)
+
+    logger.info(f"Conversation summaries rebuilt: {len(summaries)} users simulated={simulated}")
+    return len(summaries)
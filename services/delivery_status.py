@@ -0,0 +1,338 @@
+"""Delivery-status tracking for outgoing messages.
+
+Twilio posts several status callbacks per message (queued, sent, delivered...).
+The send paths already record 'sent' (or 'failed'), so only later statuses are
+written here. Callbacks are resolved to their outgoingMessages document
+without a query when possible:
+
+1. The document ID travels in the status callback URL (?mid=<id>), set by
+   send_sms() when STATUS_CALLBACK_URL is configured.
+2. A bounded in-process LRU cache of SID -> document ID, filled at send time.
+3. A twilio_SmsMessageSid query, as a last resort.
+
+Transitions for the same message within STATUS_COALESCE_WINDOW seconds are
+collapsed into one update, and statuses that rank below what was already
+applied (out-of-order callbacks) are ignored. In steady state a message's
+delivery tracking costs one write.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from services.firebase import get_async_db, get_db
+from services.versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+# Twilio message statuses by progress; terminal statuses share the top rank
+STATUS_RANK = {
+    'accepted': 0,
+    'scheduled': 0,
+    'queued': 0,
+    'sending': 1,
+    'sent': 2,
+    'delivered': 3,
+    'undelivered': 3,
+    'failed': 3,
+    'canceled': 3,
+    'read': 4
+}
+
+# Statuses at or below this rank are already recorded by the send path
+SENT_RANK = STATUS_RANK['sent']
+
+# Times a write for a not-yet-created document is retried (e.g. bulk results still batching)
+MAX_NOT_FOUND_RETRIES = 3
+
+
+def get_status_callback_url(message_id):
+    """Status callback URL carrying the outgoing document ID, or None if not configured."""
+    base_url = os.environ.get('STATUS_CALLBACK_URL')
+    if not base_url or not message_id:
+        return None
+    return f"{base_url}?mid={message_id}"
+
+
+def is_valid_status_callback(query_string, params, signature):
+    """Check a status callback's X-Twilio-Signature.
+
+    Twilio signs the URL it was given, STATUS_CALLBACK_URL plus the query
+    string (which carries mid), so the URL is rebuilt from those rather than
+    from the request, whose host and scheme a proxy may have rewritten.
+
+    Args:
+        query_string: The request's query string.
+        params: The POSTed form fields.
+        signature: The X-Twilio-Signature header.
+
+    Returns:
+        bool: True only for a correctly signed request.
+    """
+    from twilio.request_validator import RequestValidator  # Only needed for callbacks
+
+    base_url = os.environ.get('STATUS_CALLBACK_URL')
+    auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
+    if not (base_url and auth_token and signature):
+        return False
+    url = f"{base_url}?{query_string}" if query_string else base_url
+    return RequestValidator(auth_token).validate(url, params, signature)
+
+
+class _LRU:
+    """Small thread-safe LRU mapping."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class StatusTracker:
+    """Resolves status callbacks and coalesces them into one write per message."""
+
+    def __init__(self, window=2.0, cache_size=10000):
+        self.window = window
+        self._sids = _LRU(cache_size)     # SID -> document ID
+        self._applied = _LRU(cache_size)  # document ID -> highest rank written
+        self._pending = {}                # document ID -> [first_seen, rank, update, retries]
+        self._cond = threading.Condition()
+        self._thread = None
+        self.callbacks = 0
+        self.ignored = 0
+        self.coalesced = 0
+        self.writes = 0
+        self.lookups = 0
+        self.unresolved = 0
+
+    def start(self):
+        """Start the flusher thread."""
+        self._thread = threading.Thread(target=self._run, name='status-flusher', daemon=True)
+        self._thread.start()
+
+    def remember(self, sid, message_id):
+        """Record a SID -> document ID mapping at send time."""
+        if sid and message_id:
+            self._sids.put(sid, message_id)
+
+    def _known_id(self, sid, message_id):
+        """Document ID from the callback URL or the SID cache, if known."""
+        return message_id or self._sids.get(sid)
+
+    def _sid_query(self, db, sid):
+        """Query for the outgoing document with this SID (the fallback lookup)."""
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        self.lookups += 1
+        query = db.collection('outgoingMessages')
+        return query.where(filter=FieldFilter('twilio_SmsMessageSid', '==', sid)).limit(1)
+
+    def _found(self, sid, doc):
+        self._sids.put(sid, doc.id)
+        return doc.id
+
+    def _resolve(self, sid, message_id):
+        """Find the outgoing document ID for a callback."""
+        known = self._known_id(sid, message_id)
+        if known:
+            return known
+        for doc in self._sid_query(get_db(), sid).stream():
+            return self._found(sid, doc)
+        return None
+
+    async def _resolve_async(self, sid, message_id):
+        """Async _resolve(): the query fallback is awaited instead of blocking."""
+        known = self._known_id(sid, message_id)
+        if known:
+            return known
+        async for doc in self._sid_query(get_async_db(), sid).stream():
+            return self._found(sid, doc)
+        return None
+
+    def _accept(self, status):
+        """Count a callback; returns its status rank, or None if it is ignored."""
+        self.callbacks += 1
+        rank = STATUS_RANK.get(status)
+        if rank is None or rank <= SENT_RANK:
+            self.ignored += 1
+            return None
+        return rank
+
+    def record(self, sid, status, message_id=None, error_code=None):
+        """Handle one status callback.
+
+        Args:
+            sid: Twilio MessageSid.
+            status: Twilio MessageStatus.
+            message_id: outgoingMessages document ID from the callback URL, if present.
+            error_code: Twilio ErrorCode, if any.
+
+        Returns:
+            bool: Whether the status was queued for writing.
+        """
+        rank = self._accept(status)
+        if rank is None:
+            return False
+        return self._queue(sid, self._resolve(sid, message_id), rank, status, error_code)
+
+    async def record_async(self, sid, status, message_id=None, error_code=None):
+        """Async record(): the SID lookup (when needed) is awaited."""
+        rank = self._accept(status)
+        if rank is None:
+            return False
+        return self._queue(sid, await self._resolve_async(sid, message_id), rank, status, error_code)
+
+    def _queue(self, sid, message_id, rank, status, error_code):
+        """Queue a resolved status update for the coalesced write."""
+        if message_id is None:
+            self.unresolved += 1
+            logger.warning(f"Status callback for unknown message SID {sid}")
+            return False
+
+        applied = self._applied.get(message_id)
+        if applied is not None and rank <= applied:
+            self.ignored += 1
+            return False
+
+        update = {'status': status, 'statusUpdatedAt': datetime.now(timezone.utc)}
+        if status == 'delivered':
+            update['deliveredAt'] = update['statusUpdatedAt']
+        if error_code:
+            update['twilio_ErrorCode'] = error_code
+
+        with self._cond:
+            pending = self._pending.get(message_id)
+            if pending is None:
+                self._pending[message_id] = [time.monotonic(), rank, update, 0]
+                self._cond.notify()
+            elif rank > pending[1]:
+                pending[1] = rank
+                pending[2] = {**pending[2], **update}
+                self.coalesced += 1
+            else:
+                self.coalesced += 1
+        return True
+
+    def _take_due(self, force=False):
+        """Remove and return pending updates whose window has elapsed."""
+        now = time.monotonic()
+        with self._cond:
+            due = [(mid, entry) for mid, entry in self._pending.items()
+                   if force or now - entry[0] >= self.window]
+            for mid, _ in due:
+                del self._pending[mid]
+        return due
+
+    def _write(self, due):
+        """Apply coalesced updates."""
+        from google.api_core.exceptions import NotFound
+        db = get_db()
+        written = self.writes
+        for message_id, (first_seen, rank, update, retries) in due:
+            try:
+                db.collection('outgoingMessages').document(message_id).update(update)
+                self._applied.put(message_id, rank)
+                self.writes += 1
+            except NotFound:
+                if retries < MAX_NOT_FOUND_RETRIES:
+                    with self._cond:
+                        self._pending.setdefault(message_id, [time.monotonic(), rank, update, retries + 1])
+                else:
+                    logger.warning(f"Dropping status '{update['status']}' for missing message {message_id}")
+            except Exception as e:
+                logger.error(f"Failed to write status for message {message_id}: {e}")
+        if self.writes != written:
+            bump_version('outgoingMessages')
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                oldest = min(entry[0] for entry in self._pending.values())
+                delay = self.window - (time.monotonic() - oldest)
+                if delay > 0:
+                    self._cond.wait(delay)
+            self._write(self._take_due())
+
+    def flush(self):
+        """Write every pending update now."""
+        self._write(self._take_due(force=True))
+
+    def stats(self):
+        """Get callback and write counters."""
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            'callbacks': self.callbacks,
+            'ignored': self.ignored,
+            'coalesced': self.coalesced,
+            'writes': self.writes,
+            'pending': pending,
+            'queryLookups': self.lookups,
+            'unresolved': self.unresolved,
+            'cachedSids': len(self._sids)
+        }
+
+
+# Global tracker
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_status_tracker():
+    """Get the status tracker (started on first use)."""
+    global _tracker
+
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = StatusTracker(
+                window=float(os.environ.get('STATUS_COALESCE_WINDOW', 2.0)),
+                cache_size=int(os.environ.get('STATUS_SID_CACHE_SIZE', 10000))
+            )
+            _tracker.start()
+            atexit.register(_tracker.flush)
+        return _tracker
+
+
+def remember_sid(sid, message_id):
+    """Remember which outgoing document a Twilio SID belongs to."""
+    get_status_tracker().remember(sid, message_id)
+
+
+def record_status_callback(sid, status, message_id=None, error_code=None):
+    """Handle a Twilio status callback (see StatusTracker.record)."""
+    return get_status_tracker().record(sid, status, message_id, error_code)
+
+
+async def record_status_callback_async(sid, status, message_id=None, error_code=None):
+    """Async record_status_callback() for the async server."""
+    return await get_status_tracker().record_async(sid, status, message_id, error_code)
+
+
+def get_status_tracker_stats():
+    """Get status tracker stats, or None if it is not in use."""
+    if _tracker is None:
+        return None
+    return _tracker.stats()
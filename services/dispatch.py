@@ -0,0 +1,190 @@
+"""Background dispatch service.
+
+Runs short side-effect tasks (e.g. acknowledgment SMS) off the request path
+on a bounded in-process thread pool that is drained when the worker exits.
+Under the async server, coroutines are scheduled as event-loop tasks instead
+(submit_async), tracked the same way and drained on shutdown.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Global executor state
+_executor = None
+_slots = None
+_pending = set()
+_lock = threading.Lock()
+
+# Event-loop tasks scheduled by submit_async()
+_tasks = set()
+
+
+def get_dispatch_mode():
+    """Get the dispatch mode.
+
+    Returns:
+        str: 'background' (default) runs tasks on the executor,
+             'sync' runs them inline on the calling thread (deterministic, for tests).
+    """
+    return os.environ.get('DISPATCH_MODE', 'background').lower()
+
+
+def _get_executor():
+    """Create the executor on first use."""
+    global _executor, _slots
+
+    with _lock:
+        if _executor is None:
+            workers = int(os.environ.get('DISPATCH_WORKERS', 4))
+            queue_size = int(os.environ.get('DISPATCH_QUEUE_SIZE', 100))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dispatch')
+            # Bound running + waiting tasks so a Twilio outage cannot grow memory without limit
+            _slots = threading.BoundedSemaphore(workers + queue_size)
+            logger.info(f"Dispatch executor started: workers={workers} queue={queue_size}")
+        return _executor
+
+
+def _run(fn, args, kwargs):
+    """Run a task, logging failures before re-raising them into its Future."""
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        logger.error(f"Dispatch task {getattr(fn, '__name__', fn)} failed: {e}")
+        raise
+
+
+def _run_inline(fn, args, kwargs):
+    """Run a task on the calling thread and wrap the outcome in a Future."""
+    future = Future()
+    try:
+        future.set_result(_run(fn, args, kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def submit(fn, *args, **kwargs):
+    """Schedule fn(*args, **kwargs) to run in the background.
+
+    When the queue is full the task runs inline, so work is slowed down
+    rather than dropped.
+
+    Returns:
+        concurrent.futures.Future: Completes when the task finishes.
+    """
+    if get_dispatch_mode() == 'sync':
+        return _run_inline(fn, args, kwargs)
+
+    executor = _get_executor()
+
+    if not _slots.acquire(blocking=False):
+        logger.warning("Dispatch queue full - running task inline")
+        return _run_inline(fn, args, kwargs)
+
+    try:
+        future = executor.submit(_run, fn, args, kwargs)
+    except RuntimeError:
+        # Executor already shut down (worker exiting)
+        _slots.release()
+        return _run_inline(fn, args, kwargs)
+
+    with _lock:
+        _pending.add(future)
+
+    def _done(f):
+        with _lock:
+            _pending.discard(f)
+        _slots.release()
+
+    future.add_done_callback(_done)
+    return future
+
+
+async def _run_async(coro, name):
+    try:
+        return await coro
+    except Exception as e:
+        logger.error(f"Dispatch task {name} failed: {e}")
+        raise
+
+
+def submit_async(coro):
+    """Schedule a coroutine as a background task on the running event loop.
+
+    Returns:
+        asyncio.Task: Completes when the coroutine finishes.
+    """
+    task = asyncio.get_running_loop().create_task(_run_async(coro, coro.__qualname__))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def drain_async(timeout=None):
+    """Wait for tasks scheduled with submit_async() (on async server shutdown)."""
+    if not _tasks:
+        return True
+    if timeout is None:
+        timeout = float(os.environ.get('DISPATCH_DRAIN_TIMEOUT', 10))
+    _, not_done = await asyncio.wait(list(_tasks), timeout=timeout)
+    if not_done:
+        logger.warning(f"Async dispatch drain timed out with {len(not_done)} tasks pending")
+    return not not_done
+
+
+def get_dispatch_stats():
+    """Get the number of unfinished background tasks and event-loop tasks."""
+    with _lock:
+        pending = len(_pending)
+    return {'pending': pending, 'asyncPending': len(_tasks)}
+
+
+def flush(timeout=None):
+    """Block until every task submitted so far has finished.
+
+    Args:
+        timeout: Maximum seconds to wait, or None to wait indefinitely.
+
+    Returns:
+        bool: True if all tasks finished, False if the timeout expired.
+    """
+    with _lock:
+        pending = list(_pending)
+    if not pending:
+        return True
+    _, not_done = wait(pending, timeout=timeout)
+    return not not_done
+
+
+def shutdown(timeout=None):
+    """Drain pending tasks and stop the executor (called on worker exit).
+
+    Args:
+        timeout: Maximum seconds to wait for pending tasks.
+    """
+    global _executor
+
+    with _lock:
+        executor = _executor
+    if executor is None:
+        return
+
+    if timeout is None:
+        timeout = float(os.environ.get('DISPATCH_DRAIN_TIMEOUT', 10))
+
+    if not flush(timeout=timeout):
+        logger.warning("Dispatch drain timed out with tasks still pending")
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    with _lock:
+        _executor = None
+    logger.info("Dispatch executor stopped")
+
+
+atexit.register(shutdown)
@@ -1,56 +1,340 @@
-"""Firebase Firestore service."""
+"""Firebase Firestore service.
 
+The Firebase Admin and Firestore SDKs take most of the app's import time, so
+they are imported on first use (get_db(), or the function building a query)
+rather than at module level; importing the app to serve /health stays fast.
+"""
+
+import functools
 import hashlib
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import firebase_admin
-from firebase_admin import credentials, firestore
 from flask import current_app
-from google.cloud.firestore_v1.base_query import FieldFilter
+
+from services.metrics import instrument_firestore
+from services.tracing import traced
+from services.versions import bump_version
 
 logger = logging.getLogger(__name__)
 
 # Global db instance
 _db = None
+_db_lock = threading.Lock()
 
+# App config recorded by init_firebase(); credentials are parsed from it once, on first use
+_config = None
 
-def init_firebase(app):
-    """Initialize Firebase Admin SDK using app config."""
-    global _db
+# Set once a Firestore read has succeeded (channel connected, token fetched)
+_firestore_ready = threading.Event()
+
+# Async client for the async server (bound to its event loop)
+_async_db = None
+
+# Firestore allows at most 30 values in an 'in' filter
+USER_LOOKUP_CHUNK_SIZE = 30
+
+# Shared pool for concurrent chunked user lookups
+_lookup_executor = None
+_lookup_executor_lock = threading.Lock()
+
+
+def configure_firebase(app):
+    """Record the app config so get_db() can initialize Firebase on first use."""
+    global _config
+    _config = app.config
+
+
+def _initialize(config):
+    """Parse the service account credentials and create the client (once)."""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
 
     if firebase_admin._apps:
-        _db = firestore.client()
-        return _db
+        return firestore.client()
 
     cred_dict = {
         "type": "service_account",
-        "project_id": app.config.get('FIREBASE_PROJECT_ID'),
-        "private_key_id": app.config.get('FIREBASE_PRIVATE_KEY_ID'),
-        "private_key": app.config.get('FIREBASE_PRIVATE_KEY'),
-        "client_email": app.config.get('FIREBASE_CLIENT_EMAIL'),
-        "client_id": app.config.get('FIREBASE_CLIENT_ID'),
+        "project_id": config.get('FIREBASE_PROJECT_ID'),
+        "private_key_id": config.get('FIREBASE_PRIVATE_KEY_ID'),
+        "private_key": config.get('FIREBASE_PRIVATE_KEY'),
+        "client_email": config.get('FIREBASE_CLIENT_EMAIL'),
+        "client_id": config.get('FIREBASE_CLIENT_ID'),
         "auth_uri": "https://accounts.google.com/o/oauth2/auth",
         "token_uri": "https://oauth2.googleapis.com/token",
         "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-        "client_x509_cert_url": app.config.get('FIREBASE_CLIENT_CERT_URL', '')
+        "client_x509_cert_url": config.get('FIREBASE_CLIENT_CERT_URL', '')
     }
 
     cred = credentials.Certificate(cred_dict)
     firebase_admin.initialize_app(cred)
-    _db = firestore.client()
-
     logger.info("Firebase initialized successfully")
-    return _db
+    return firestore.client()
+
+
+def transactional(fn):
+    """firestore.transactional, applied on first call so the SDK is imported lazily.
+
+    Use like @firestore.transactional: the function takes the transaction as
+    its first argument and is retried by Firestore on contention.
+    """
+    wrapped = None
+
+    @functools.wraps(fn)
+    def wrapper(transaction, *args, **kwargs):
+        nonlocal wrapped
+        if wrapped is None:
+            from firebase_admin import firestore
+            wrapped = firestore.transactional(fn)
+        return wrapped(transaction, *args, **kwargs)
+    return wrapper
+
+
+def init_firebase(app):
+    """Initialize Firebase Admin SDK using app config (idempotent)."""
+    configure_firebase(app)
+    return get_db()
 
 
 def get_db():
-    """Get Firestore database client."""
+    """Get Firestore database client, initializing Firebase on first use."""
     global _db
     if _db is None:
-        raise RuntimeError("Firebase not initialized. Call init_firebase first.")
+        with _db_lock:
+            if _db is None:
+                if _config is None:
+                    raise RuntimeError("Firebase not initialized. Call init_firebase first.")
+                _db = instrument_firestore(_initialize(_config))
     return _db
 
 
+def warm_up_firestore(timeout=None):
+    """Issue a read so the gRPC channel is connected and the auth token fetched.
+
+    Also the health prober's Firestore check.
+    """
+    get_db().collection('users').limit(1).get(timeout=timeout)
+    _firestore_ready.set()
+
+
+def is_firestore_ready():
+    """Check if a Firestore read has succeeded in this process."""
+    return _firestore_ready.is_set()
+
+
+def get_async_db():
+    """Get the async Firestore client, creating it on first use.
+
+    Call from the event loop that will use it (the async server's loop).
+    """
+    global _async_db
+    if _async_db is None:
+        from firebase_admin import firestore_async  # Only the async server needs it
+
+        get_db()  # Initializes Firebase if needed
+        _async_db = instrument_firestore(firestore_async.client())
+    return _async_db
+
+
+def close_async_db():
+    """Close the async Firestore client (on async server shutdown)."""
+    global _async_db
+    if _async_db is not None:
+        _async_db.close()
+        _async_db = None
+
+
+class UserDirectory:
+    """In-memory index of the users collection by phone number and by UUID.
+
+    The whole collection (~2,000 users) is loaded once and kept current by a
+    Firestore on_snapshot listener, or by reloading it every TTL seconds when
+    listeners are disabled. Until the first load completes, lookups fall back
+    to Firestore.
+    """
+
+    def __init__(self):
+        self._by_phone = {}  # phone number -> user data
+        self._by_uuid = {}  # userId -> phone number
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self._db = None
+        self._mode = 'off'
+        self._ttl = 300
+        self._watch = None
+        self._loaded_at = None
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    def start(self, db, mode='listener', ttl=300):
+        """Warm the directory and keep it current.
+
+        Args:
+            db: Firestore client.
+            mode: 'listener' (on_snapshot), 'ttl' (periodic reload) or 'off'.
+            ttl: Seconds before a reload in 'ttl' mode.
+        """
+        self._db = db
+        self._mode = mode
+        self._ttl = ttl
+
+        if mode == 'off':
+            logger.info("User directory disabled")
+            return
+
+        if mode == 'listener':
+            # First snapshot delivers every user as ADDED
+            self._watch = db.collection('users').on_snapshot(self._on_snapshot)
+        else:
+            self.refresh()
+
+    def stop(self):
+        """Stop the snapshot listener."""
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def refresh(self):
+        """Reload the whole users collection (one paged read)."""
+        with self._refresh_lock:
+            by_phone = {doc.id: doc.to_dict() for doc in self._db.collection('users').stream()}
+            with self._lock:
+                self._by_phone = by_phone
+                self._by_uuid = {data.get('userId'): phone for phone, data in by_phone.items()}
+                self._loaded_at = time.monotonic()
+        bump_version('users')
+        logger.info(f"User directory loaded: {len(by_phone)} users")
+
+    def _on_snapshot(self, docs, changes, read_time):
+        """Apply listener changes to the indexes."""
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                old = self._by_phone.pop(doc.id, None)
+                if old is not None:
+                    self._by_uuid.pop(old.get('userId'), None)
+                if change.type.name != 'REMOVED':
+                    data = doc.to_dict()
+                    self._by_phone[doc.id] = data
+                    self._by_uuid[data.get('userId')] = doc.id
+            self._loaded_at = time.monotonic()
+        bump_version('users')
+
+    def is_ready(self):
+        """Check whether lookups can be answered from memory."""
+        if self._loaded_at is None:
+            return False
+        if self._mode == 'listener':
+            if self._watch is not None and self._watch.is_active:
+                return True
+            # Listener died - serve from memory only while within TTL
+        if time.monotonic() - self._loaded_at < self._ttl:
+            return True
+        with self._lock:
+            start_refresh = not self._refreshing
+            self._refreshing = True
+        if start_refresh:
+            # Stale: reload in the background and keep serving the current data
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+        return True
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"User directory refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def get_by_phone(self, phone_number):
+        """Look up a user by phone number.
+
+        Returns:
+            dict or None: User data, or None if no such user.
+        """
+        with self._lock:
+            data = self._by_phone.get(phone_number)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(data)
+
+    def get_by_uuid(self, user_uuid):
+        """Look up a user by UUID.
+
+        Returns:
+            tuple: (phone_number, user_data), or (None, None) if no such user.
+        """
+        with self._lock:
+            phone_number = self._by_uuid.get(user_uuid)
+            if phone_number is None:
+                self.misses += 1
+                return None, None
+            self.hits += 1
+            return phone_number, dict(self._by_phone[phone_number])
+
+    def all_users(self):
+        """Get every user.
+
+        Returns:
+            list: (phone_number, user_data) tuples.
+        """
+        with self._lock:
+            return [(phone, dict(data)) for phone, data in self._by_phone.items()]
+
+    def record_fallback(self):
+        """Count a lookup that had to go to Firestore."""
+        with self._lock:
+            self.fallbacks += 1
+
+    def stats(self):
+        """Get directory size and hit/miss counters."""
+        with self._lock:
+            return {
+                'mode': self._mode,
+                'ready': self._loaded_at is not None,
+                'users': len(self._by_phone),
+                'hits': self.hits,
+                'misses': self.misses,
+                'fallbacks': self.fallbacks
+            }
+
+
+# Global user directory
+_user_directory = UserDirectory()
+
+
+def start_user_directory():
+    """Warm the user directory using USER_DIRECTORY_MODE / USER_DIRECTORY_TTL."""
+    mode = os.environ.get('USER_DIRECTORY_MODE', 'listener').lower()
+    ttl = int(os.environ.get('USER_DIRECTORY_TTL', 300))
+    try:
+        _user_directory.start(get_db(), mode=mode, ttl=ttl)
+    except Exception as e:
+        # Lookups fall back to Firestore
+        logger.error(f"Failed to start user directory: {e}")
+
+
+def get_user_directory():
+    """Get the user directory, or None if it cannot answer lookups yet."""
+    if _user_directory.is_ready():
+        return _user_directory
+    _user_directory.record_fallback()
+    return None
+
+
+def get_user_directory_stats():
+    """Get user directory hit/miss counters."""
+    return _user_directory.stats()
+
+
+@traced('firestore.get_operator_password_hash')
 def get_operator_password_hash():
     """Get the hashed operator password from Firestore.
 
@@ -65,12 +349,14 @@ def get_operator_password_hash():
     return None
 
 
+@traced('firestore.set_operator_password_hash')
 def set_operator_password_hash(password_hash):
     """Set the hashed operator password in Firestore.
 
     Args:
         password_hash: The hashed password to store.
     """
+    from firebase_admin import firestore
     db = get_db()
     db.collection('config').document('operator_auth').set({
         'password_hash': password_hash,
@@ -94,6 +380,7 @@ def hash_phone_number(phone_number):
     return f"unknown_{hash_value}"
 
 
+@traced('firestore.get_user_by_phone')
 def get_user_by_phone(phone_number):
     """Look up a user by phone number (document ID).
 
@@ -103,6 +390,13 @@ def get_user_by_phone(phone_number):
     Returns:
         tuple: (user_id (UUID), phone_number, user_data) if found, (None, None, None) if not found.
     """
+    directory = get_user_directory()
+    if directory is not None:
+        data = directory.get_by_phone(phone_number)
+        if data:
+            return data.get('userId'), phone_number, data
+        return None, None, None
+
     db = get_db()
     doc = db.collection('users').document(phone_number).get()
     if doc.exists:
@@ -111,6 +405,21 @@ def get_user_by_phone(phone_number):
     return None, None, None
 
 
+@traced('firestore.get_user_by_phone')
+async def get_user_by_phone_async(phone_number):
+    """Async get_user_by_phone(): the directory, or one non-blocking document read."""
+    directory = get_user_directory()
+    if directory is not None:
+        return get_user_by_phone(phone_number)
+
+    doc = await get_async_db().collection('users').document(phone_number).get()
+    if doc.exists:
+        data = doc.to_dict()
+        return data.get('userId'), doc.id, data
+    return None, None, None
+
+
+@traced('firestore.get_user_by_uuid')
 def get_user_by_uuid(user_uuid):
     """Look up a user by their UUID userId field.
 
@@ -120,6 +429,11 @@ def get_user_by_uuid(user_uuid):
     Returns:
         tuple: (phone_number, user_data) if found, (None, None) if not found.
     """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    directory = get_user_directory()
+    if directory is not None:
+        return directory.get_by_uuid(user_uuid)
+
     db = get_db()
     # Query for user with matching userId
     query = db.collection('users').where(filter=FieldFilter('userId', '==', user_uuid)).limit(1)
@@ -144,6 +458,25 @@ def mask_phone_number(phone_number):
     return f"***-***-{phone_number[-4:]}"
 
 
+def _display_info(user_uuid, phone_number, user_data):
+    """Build display-safe info for a user (no full phone number)."""
+    if user_uuid and user_uuid.startswith('unknown_'):
+        # Unknown/hashed number
+        return {
+            'userId': user_uuid,
+            'name': '',
+            'maskedPhone': '(unknown)',
+            'status': 'unknown'
+        }
+    return {
+        'userId': user_uuid,
+        'name': user_data.get('name', ''),
+        'maskedPhone': mask_phone_number(phone_number),
+        'status': user_data.get('status', '')
+    }
+
+
+@traced('firestore.get_user_display_info')
 def get_user_display_info(user_uuid):
     """Get display-safe user information by UUID (no full phone number).
 
@@ -154,20 +487,81 @@ def get_user_display_info(user_uuid):
         dict: Display-safe user info with masked phone, or None if not found.
     """
     if user_uuid and user_uuid.startswith('unknown_'):
-        # Unknown/hashed number
-        return {
-            'userId': user_uuid,
-            'name': '',
-            'maskedPhone': '(unknown)',
-            'status': 'unknown'
-        }
+        return _display_info(user_uuid, None, None)
 
     phone_number, user_data = get_user_by_uuid(user_uuid)
     if user_data:
-        return {
-            'userId': user_uuid,
-            'name': user_data.get('name', ''),
-            'maskedPhone': mask_phone_number(phone_number),
-            'status': user_data.get('status', '')
-        }
+        return _display_info(user_uuid, phone_number, user_data)
     return None
+
+
+def _get_lookup_executor():
+    """Create the lookup pool on first use."""
+    global _lookup_executor
+    with _lookup_executor_lock:
+        if _lookup_executor is None:
+            workers = int(os.environ.get('USER_LOOKUP_CONCURRENCY', 8))
+            _lookup_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='user-lookup')
+        return _lookup_executor
+
+
+def _fetch_users_chunk(user_uuids):
+    """Fetch one chunk of users with a single 'in' query.
+
+    Returns:
+        list: (phone_number, user_data) tuples.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    db = get_db()
+    query = db.collection('users').where(filter=FieldFilter('userId', 'in', user_uuids))
+    return [(doc.id, doc.to_dict()) for doc in query.stream()]
+
+
+@traced('firestore.get_users_display_info')
+def get_users_display_info(user_uuids):
+    """Get display-safe info for many users at once.
+
+    Unknown (hashed) identifiers are resolved locally. The rest come from the
+    user directory, or from Firestore in chunked 'in' queries issued
+    concurrently, so cost scales with the number of chunks, not users.
+
+    Args:
+        user_uuids: Iterable of user UUIDs (duplicates and unknown_ hashes allowed).
+
+    Returns:
+        dict: userId -> display info, or None for users that were not found.
+    """
+    result = {}
+    to_fetch = []
+    for user_uuid in set(user_uuids):
+        if not user_uuid:
+            continue
+        if user_uuid.startswith('unknown_'):
+            result[user_uuid] = _display_info(user_uuid, None, None)
+        else:
+            result[user_uuid] = None
+            to_fetch.append(user_uuid)
+
+    if not to_fetch:
+        return result
+
+    directory = get_user_directory()
+    if directory is not None:
+        for user_uuid in to_fetch:
+            phone_number, user_data = directory.get_by_uuid(user_uuid)
+            if user_data:
+                result[user_uuid] = _display_info(user_uuid, phone_number, user_data)
+        return result
+
+    chunks = [to_fetch[i:i + USER_LOOKUP_CHUNK_SIZE]
+              for i in range(0, len(to_fetch), USER_LOOKUP_CHUNK_SIZE)]
+    if len(chunks) == 1:
+        chunk_results = [_fetch_users_chunk(chunks[0])]
+    else:
+        chunk_results = _get_lookup_executor().map(_fetch_users_chunk, chunks)
+
+    for users in chunk_results:
+        for phone_number, user_data in users:
+            user_uuid = user_data.get('userId')
+            result[user_uuid] = _display_info(user_uuid, phone_number, user_data)
+    return result
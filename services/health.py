@@ -0,0 +1,194 @@
+"""Background dependency health probing.
+
+A prober thread checks Firestore (a one-document read) every
+HEALTH_PROBE_INTERVAL seconds and Twilio (an account fetch) every
+HEALTH_TWILIO_PROBE_INTERVAL seconds, keeping a rolling window of the last
+HEALTH_WINDOW_SIZE results per dependency. Health endpoints answer from that
+cached state, so platform probes cost no Firestore reads and stay fast when a
+dependency is slow.
+
+Readiness needs a recent successful Firestore probe: without Firestore
+nothing can be logged. A failing Twilio only degrades health, since incoming
+messages are still logged and acknowledgments are retried by their callers.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from services.firebase import warm_up_firestore
+from services.startup import is_startup_pending
+from services.twilio_sms import ping_twilio
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+class _DependencyWindow:
+    """Rolling window of probe results for one dependency."""
+
+    def __init__(self, size):
+        self._results = deque(maxlen=size)  # (ok, latency ms, monotonic time)
+        self._lock = threading.Lock()
+        self.state = 'unknown'
+        self.last_error = None
+        self.last_success = None
+        self.consecutive_failures = 0
+
+    def record(self, ok, latency_ms, error=None):
+        now = time.monotonic()
+        with self._lock:
+            self._results.append((ok, latency_ms, now))
+            if ok:
+                self.state = 'up'
+                self.last_success = now
+                self.consecutive_failures = 0
+            else:
+                self.state = 'down'
+                self.last_error = error
+                self.consecutive_failures += 1
+
+    def skip(self, state):
+        """Record that the dependency is not in use (e.g. 'not_configured')."""
+        with self._lock:
+            self.state = state
+
+    def snapshot(self):
+        with self._lock:
+            results = list(self._results)
+            state = self.state
+            last_error = self.last_error
+            last_success = self.last_success
+            failures = self.consecutive_failures
+
+        latencies = sorted(latency for ok, latency, _ in results if ok)
+        errors = sum(1 for ok, _, _ in results if not ok)
+        return {
+            'state': state,
+            'probes': len(results),
+            'errorRate': round(errors / len(results), 3) if results else None,
+            'consecutiveFailures': failures,
+            'lastSuccessAgoSeconds': round(time.monotonic() - last_success, 1) if last_success else None,
+            'lastError': last_error,
+            'latencyMs': {
+                'p50': _percentile(latencies, 0.50),
+                'p90': _percentile(latencies, 0.90),
+                'p99': _percentile(latencies, 0.99),
+                'max': latencies[-1] if latencies else None
+            }
+        }
+
+
+class HealthProber:
+    """Probes Firestore and Twilio in the background and caches the results."""
+
+    def __init__(self, interval=15.0, twilio_interval=60.0, window_size=60, timeout=5.0,
+                 failure_threshold=2):
+        self.interval = interval
+        self.twilio_interval = twilio_interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.firestore = _DependencyWindow(window_size)
+        self.twilio = _DependencyWindow(window_size)
+        self._next_twilio = 0.0
+        self._thread = None
+
+    def start(self):
+        """Start the prober thread (first probes run immediately)."""
+        self._thread = threading.Thread(target=self._run, name='health-prober', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _timed(check):
+        start = time.monotonic()
+        try:
+            result = check()
+            return True, round((time.monotonic() - start) * 1000, 1), None, result
+        except Exception as e:
+            return False, round((time.monotonic() - start) * 1000, 1), str(e), None
+
+    def probe_firestore(self):
+        ok, latency, error, _ = self._timed(lambda: warm_up_firestore(timeout=self.timeout))
+        self.firestore.record(ok, latency, error)
+        if not ok:
+            logger.warning(f"Health probe: Firestore failed after {latency}ms: {error}")
+
+    def probe_twilio(self):
+        ok, latency, error, pinged = self._timed(ping_twilio)
+        if ok and not pinged:
+            self.twilio.skip('not_configured')
+            return
+        self.twilio.record(ok, latency, error)
+        if not ok:
+            logger.warning(f"Health probe: Twilio failed after {latency}ms: {error}")
+
+    def _run(self):
+        while True:
+            self.probe_firestore()
+            if time.monotonic() >= self._next_twilio:
+                self.probe_twilio()
+                self._next_twilio = time.monotonic() + self.twilio_interval
+            time.sleep(self.interval)
+
+    def is_ready(self):
+        """Firestore answered recently and is not failing repeatedly."""
+        snapshot = self.firestore.snapshot()
+        age = snapshot['lastSuccessAgoSeconds']
+        return (
+            age is not None
+            and age <= max(3 * self.interval, self.timeout)
+            and snapshot['consecutiveFailures'] < self.failure_threshold
+        )
+
+    def stats(self):
+        return {'firestore': self.firestore.snapshot(), 'twilio': self.twilio.snapshot()}
+
+
+# Global prober
+_prober = None
+_prober_lock = threading.Lock()
+
+
+def start_health_prober():
+    """Start the prober (once per process)."""
+    global _prober
+
+    with _prober_lock:
+        if _prober is None:
+            _prober = HealthProber(
+                interval=float(os.environ.get('HEALTH_PROBE_INTERVAL', 15)),
+                twilio_interval=float(os.environ.get('HEALTH_TWILIO_PROBE_INTERVAL', 60)),
+                window_size=int(os.environ.get('HEALTH_WINDOW_SIZE', 60)),
+                timeout=float(os.environ.get('HEALTH_PROBE_TIMEOUT', 5)),
+                failure_threshold=int(os.environ.get('HEALTH_FAILURE_THRESHOLD', 2))
+            )
+            _prober.start()
+        return _prober
+
+
+def get_health_state():
+    """Overall state from cached probe results, without touching any dependency.
+
+    Returns:
+        tuple: (status, ready, dependency stats) where status is 'starting',
+               'healthy', 'degraded' or 'unhealthy'.
+    """
+    prober = start_health_prober()
+    dependencies = prober.stats()
+    firestore_state = dependencies['firestore']['state']
+
+    if prober.is_ready():
+        status = 'degraded' if dependencies['twilio']['state'] == 'down' else 'healthy'
+        return status, True, dependencies
+    if firestore_state == 'unknown' or is_startup_pending():
+        return 'starting', False, dependencies
+    return 'unhealthy', False, dependencies
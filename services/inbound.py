@@ -0,0 +1,201 @@
+"""Incoming message handling shared by the Twilio webhook and the simulator."""
+
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+
+from services.firebase import get_db
+from services.twilio_sms import send_sms, send_sms_async
+from services.dispatch import submit, submit_async
+from services.stats import record_message_stats, record_message_stats_async
+from services.writebehind import write, write_async
+from services.search import index_message
+from services.conversations import record_conversation_message, record_conversation_message_async
+
+logger = logging.getLogger(__name__)
+
+ACK_MESSAGE = "Your number is recognized. Message received."
+
+
+def get_ack_mode():
+    """Get how registered senders are acknowledged.
+
+    Returns:
+        str: 'dispatch' (default) sends the ack via the Twilio API from the background
+             dispatcher, 'twiml' returns it as a <Message> in the webhook's TwiML response.
+    """
+    return os.environ.get('ACK_MODE', 'dispatch').lower()
+
+
+def _log_simulated_ack(user_id, message_sid):
+    """Log the acknowledgment as an outgoing message (simulation mode only)."""
+    now = datetime.now(timezone.utc)
+    ack_record = {
+        'queuedAt': now,
+        'sentAt': now,
+        'userId': user_id,  # UUID
+        'messageContent': ACK_MESSAGE,
+        'operatorId': 'system',
+        'operatorName': 'System (Auto-reply)',
+        'status': 'sent',
+        'twilio_SmsMessageSid': message_sid,
+        'twilio_ErrorMessage': None,
+        'simulated': True
+    }
+    ack_ref = get_db().collection('outgoingMessages').document()
+    write(ack_ref, ack_record)
+    record_message_stats(True, outgoing=1)
+    record_conversation_message(user_id, 'outgoing', ack_ref.id, ACK_MESSAGE, True, at=now)
+
+
+def _responded(message_id):
+    """Ref and update marking an incoming message as responded."""
+    return get_db().collection('incomingMessages').document(message_id), {'responseSent': True}
+
+
+def send_acknowledgment(phone_number, message_id, user_id, simulated):
+    """Send the acknowledgment SMS and mark the incoming message as responded.
+
+    Runs on the dispatch executor, after the webhook has returned.
+
+    Args:
+        phone_number: Recipient phone number (E.164, held in memory only).
+        message_id: Document ID of the logged incoming message.
+        user_id: The sender's UUID.
+        simulated: Whether the incoming message was simulated.
+    """
+    try:
+        ack_message = send_sms(phone_number, ACK_MESSAGE)
+        logger.info(f"Acknowledgment sent to user")
+    except Exception as e:
+        logger.error(f"Failed to send acknowledgment: {e}")
+        return
+
+    # Goes through the write-behind buffer (when enabled) after the message itself
+    ref, update = _responded(message_id)
+    write(ref, update, merge=True)
+
+    if simulated:
+        _log_simulated_ack(user_id, ack_message.sid)
+
+
+async def send_acknowledgment_async(phone_number, message_id):
+    """Async send_acknowledgment() for live messages, run as an event-loop task."""
+    try:
+        await send_sms_async(phone_number, ACK_MESSAGE)
+        logger.info(f"Acknowledgment sent to user")
+    except Exception as e:
+        logger.error(f"Failed to send acknowledgment: {e}")
+        return
+
+    ref, update = _responded(message_id)
+    await write_async(ref, update, merge=True)
+
+
+def _incoming_record(log_identifier, message_content, is_registered, inline_ack, message_sid, simulated):
+    """Build an incomingMessages document (NO phone number stored)."""
+    return {
+        'timestamp': datetime.now(timezone.utc),
+        'userId': log_identifier,  # UUID for registered, hash for unknown
+        'messageContent': message_content,
+        'isRegistered': is_registered,
+        # TwiML replies go out with our response; dispatched acks set this when sent
+        'responseSent': inline_ack,
+        'twilio_SmsMessageSid': message_sid,
+        'simulated': simulated
+    }
+
+
+def _new_incoming(log_identifier, message_content, is_registered, message_sid, simulated):
+    """Prepare an incoming message for logging.
+
+    Returns:
+        tuple: (document ref, record, whether the ack goes inline in the TwiML reply).
+    """
+    inline_ack = is_registered and get_ack_mode() == 'twiml'
+    # Log incoming message to Firestore (NO phone number stored)
+    record = _incoming_record(log_identifier, message_content, is_registered, inline_ack, message_sid, simulated)
+    # Pre-allocate the document ID so it is known before a buffered write commits
+    return get_db().collection('incomingMessages').document(), record, inline_ack
+
+
+def _incoming_logged(message_id, record):
+    """Side effects once an incoming message is written."""
+    index_message('incoming', message_id, record)
+    logger.info(f"Incoming message logged: registered={record['isRegistered']} simulated={record['simulated']}")
+
+
+def _incoming_result(message_id, inline_ack, response_pending):
+    """The handler's result, with the TwiML reply (carrying the ack when inline)."""
+    from twilio.twiml.messaging_response import MessagingResponse
+
+    response = MessagingResponse()
+    if inline_ack:
+        # Twilio delivers the reply itself - no outbound API call
+        response.message(ACK_MESSAGE)
+    return {
+        'messageId': message_id,
+        'responseSent': inline_ack,
+        'responsePending': response_pending,
+        'twiml': str(response)
+    }
+
+
+def handle_incoming_message(phone_number, user_id, is_registered, log_identifier,
+                            message_content, message_sid, simulated=False):
+    """Log an incoming message and acknowledge it if the sender is registered.
+
+    Args:
+        phone_number: Sender phone number (E.164, used in memory only, never stored).
+        user_id: Sender UUID, or None if unknown.
+        is_registered: Whether the sender is an active registered user.
+        log_identifier: UUID for registered senders, hashed phone for unknown.
+        message_content: Message text.
+        message_sid: Twilio MessageSid.
+        simulated: Whether this message comes from the simulator.
+
+    Returns:
+        dict: messageId, responseSent, responsePending and the TwiML response body.
+    """
+    doc_ref, record, inline_ack = _new_incoming(log_identifier, message_content, is_registered,
+                                                message_sid, simulated)
+    write(doc_ref, record)
+    record_conversation_message(log_identifier, 'incoming', doc_ref.id, message_content, simulated,
+                                at=record['timestamp'])
+    record_message_stats(simulated, incoming=1, unknown=0 if is_registered else 1)
+    _incoming_logged(doc_ref.id, record)
+
+    response_pending = False
+    if inline_ack and simulated:
+        _log_simulated_ack(user_id, f"SIM{uuid.uuid4().hex[:30]}")
+    elif is_registered and not inline_ack:
+        # Queue acknowledgment (sent after we return)
+        submit(send_acknowledgment, phone_number, doc_ref.id, user_id, simulated)
+        response_pending = True
+    return _incoming_result(doc_ref.id, inline_ack, response_pending)
+
+
+async def handle_incoming_message_async(phone_number, is_registered, log_identifier,
+                                        message_content, message_sid):
+    """Async handle_incoming_message() for live webhooks on the async server.
+
+    Firestore writes are awaited (or buffered) and the dispatched acknowledgment
+    runs as an event-loop task, so the webhook never blocks a thread.
+
+    Returns:
+        dict: messageId, responseSent, responsePending and the TwiML response body.
+    """
+    doc_ref, record, inline_ack = _new_incoming(log_identifier, message_content, is_registered,
+                                                message_sid, simulated=False)
+    await write_async(doc_ref, record)
+    await record_conversation_message_async(log_identifier, 'incoming', doc_ref.id, message_content, False,
+                                            at=record['timestamp'])
+    await record_message_stats_async(False, incoming=1, unknown=0 if is_registered else 1)
+    _incoming_logged(doc_ref.id, record)
+
+    response_pending = False
+    if is_registered and not inline_ack:
+        submit_async(send_acknowledgment_async(phone_number, doc_ref.id))
+        response_pending = True
+    return _incoming_result(doc_ref.id, inline_ack, response_pending)
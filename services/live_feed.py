@@ -0,0 +1,233 @@
+"""Live message feed for the operator dashboard.
+
+One process-wide pair of Firestore on_snapshot listeners (incomingMessages and
+outgoingMessages) fans new and changed rows out to every connected operator
+tab, with users already resolved, instead of each tab re-reading the lists.
+
+Listeners only watch messages from the last LIVE_FEED_WINDOW_MINUTES and are
+re-subscribed with a fresh window as it ages, so the listener's cached result
+set stays small. The initial snapshot of each subscription is not broadcast.
+Each subscriber has a bounded queue; a subscriber that falls behind is sent
+a 'reset' event and dropped, and its page reloads. Events are numbered and
+the most recent ones kept, so a reconnecting stream (Last-Event-ID) resumes
+without gaps. In-process consumers (e.g. the search index) can register for
+the raw changes with add_listener().
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from services.firebase import get_db
+from services.serializers import incoming_row, outgoing_row, serialize_rows
+from services.twilio_sms import is_simulation_mode
+from services.versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+# collection -> (event type, order field, row serializer)
+FEEDS = {
+    'incomingMessages': ('incoming', 'timestamp', incoming_row),
+    'outgoingMessages': ('outgoing', 'queuedAt', outgoing_row),
+}
+
+# Sentinel event telling a stream that its subscriber was dropped
+RESET = {'type': 'reset'}
+
+
+def _get_settings():
+    """Read live feed settings from the environment."""
+    return {
+        'window': float(os.environ.get('LIVE_FEED_WINDOW_MINUTES', 60)),
+        'queue_size': int(os.environ.get('LIVE_FEED_QUEUE_SIZE', 200)),
+        'replay_size': int(os.environ.get('LIVE_FEED_REPLAY_SIZE', 500))
+    }
+
+
+class _Subscription:
+    """One collection listener over a recent time window."""
+
+    def __init__(self, feed, collection):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+        self.feed = feed
+        self.collection = collection
+        self.started_at = time.monotonic()
+        self._initial = True
+        event_type, order_field, _ = FEEDS[collection]
+        since = datetime.now(timezone.utc) - timedelta(minutes=feed.window)
+        query = get_db().collection(collection)
+        query = query.where(filter=FieldFilter('simulated', '==', feed.simulated))
+        query = query.where(filter=FieldFilter(order_field, '>=', since))
+        self._watch = query.on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        if self._initial:
+            # Initial snapshot is the current window, which pages already load
+            self._initial = False
+            return
+        self.feed.publish(self.collection, changes)
+
+    def unsubscribe(self):
+        self._watch.unsubscribe()
+
+
+class LiveFeed:
+    """Shared listeners with fan-out to subscriber queues."""
+
+    def __init__(self, window=60.0, queue_size=200, replay_size=500):
+        self.window = window
+        self.queue_size = queue_size
+        self._recent = deque(maxlen=replay_size)
+        self._seq = 0
+        self.simulated = is_simulation_mode()
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._listeners = []
+        self._rotator = None
+        self.published = 0
+        self.dropped = 0
+
+    def _ensure_started(self):
+        """Start the listeners (on first subscriber) and the window rotator."""
+        if self._subscriptions:
+            return
+        for collection in FEEDS:
+            self._subscriptions[collection] = _Subscription(self, collection)
+        self._rotator = threading.Thread(target=self._rotate, name='live-feed-rotate', daemon=True)
+        self._rotator.start()
+        logger.info(f"Live feed listeners started (window {self.window:.0f} min)")
+
+    def _rotate(self):
+        """Re-subscribe each listener with a fresh window once half of it has passed."""
+        interval = self.window * 60 / 2
+        while True:
+            time.sleep(interval)
+            for collection in FEEDS:
+                # Subscribe the new window before dropping the old one; clients upsert by id
+                new = _Subscription(self, collection)
+                with self._lock:
+                    old = self._subscriptions[collection]
+                    self._subscriptions[collection] = new
+                old.unsubscribe()
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber.
+
+        Args:
+            last_event_id: ID of the last event a reconnecting client saw; newer
+                retained events are replayed.
+
+        Returns:
+            queue.Queue: Receives event dicts ({'id', 'type', 'change', 'message'}).
+        """
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._ensure_started()
+            if last_event_id is not None and self._recent and self._recent[0]['id'] > last_event_id + 1:
+                # Missed events are no longer retained
+                subscriber.put_nowait(RESET)
+            elif last_event_id is not None:
+                for event in self._recent:
+                    if event['id'] > last_event_id and not subscriber.full():
+                        subscriber.put_nowait(event)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def add_listener(self, callback):
+        """Register an in-process consumer of raw changes.
+
+        Args:
+            callback: Called as callback(collection, changes) for each snapshot
+                after the initial one, on the listener thread.
+        """
+        with self._lock:
+            self._ensure_started()
+            self._listeners.append(callback)
+
+    def unsubscribe(self, subscriber):
+        """Remove a subscriber."""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, collection, changes):
+        """Serialize changed documents once and fan them out."""
+        for callback in list(self._listeners):
+            try:
+                callback(collection, changes)
+            except Exception as e:
+                logger.error(f"Live feed listener failed on {collection} changes: {e}")
+
+        changed = [(change.type.name.lower(), change.document) for change in changes
+                   if change.type.name != 'REMOVED']
+        if not changed:
+            return
+
+        # Changes may come from other hosts, whose bumps this host doesn't see
+        bump_version(collection)
+
+        event_type, _, row_serializer = FEEDS[collection]
+        try:
+            rows = serialize_rows(row_serializer, [(doc.id, doc.to_dict()) for _, doc in changed])
+        except Exception as e:
+            logger.error(f"Live feed could not serialize {collection} changes: {e}")
+            return
+        with self._lock:
+            events = []
+            for (kind, _), row in zip(changed, rows):
+                self._seq += 1
+                events.append({'id': self._seq, 'type': event_type, 'change': kind, 'message': row})
+            self._recent.extend(events)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                for event in events:
+                    subscriber.put_nowait(event)
+            except queue.Full:
+                # Too slow to keep up - tell it to reload and drop it
+                self.unsubscribe(subscriber)
+                self.dropped += 1
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(RESET)
+        self.published += len(events)
+
+    def stats(self):
+        """Get subscriber and event counters."""
+        with self._lock:
+            subscribers = len(self._subscribers)
+        return {
+            'subscribers': subscribers,
+            'listening': bool(self._subscriptions),
+            'published': self.published,
+            'dropped': self.dropped
+        }
+
+
+# Global feed
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_live_feed():
+    """Get the process-wide live feed."""
+    global _feed
+
+    with _feed_lock:
+        if _feed is None:
+            settings = _get_settings()
+            _feed = LiveFeed(**settings)
+        return _feed
+
+
+def get_live_feed_stats():
+    """Get live feed stats, or None if it is not in use."""
+    if _feed is None:
+        return None
+    return _feed.stats()
@@ -0,0 +1,366 @@
+"""Durable outbound message queue.
+
+Messages are enqueued in the outGoingMessageQueue collection and delivered by
+one or more worker processes (worker.py). Workers lease a message in a
+Firestore transaction before sending, so two workers never send the same
+message. Failed sends are retried with exponential backoff. Messages can be
+scheduled (sendAt), are deferred out of quiet hours, and can be cancelled
+until a worker leases them.
+
+Queue document lifecycle:
+    pending -> leased -> sent | failed
+    pending -> cancelled
+    leased -> pending (retry after backoff)
+"""
+
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from services.firebase import get_db, get_user_by_uuid, transactional
+from services.twilio_sms import send_sms, is_simulation_mode
+from services.outgoing import build_outgoing_record, find_twilio_message, sweep_stale_queued
+from services.stats import record_message_stats
+from services.versions import bump_version
+from services.conversations import record_conversation_message
+
+logger = logging.getLogger(__name__)
+
+QUEUE_COLLECTION = 'outGoingMessageQueue'
+
+
+class QueueError(ValueError):
+    """Raised when a queue operation is not allowed."""
+    pass
+
+
+def _get_settings():
+    """Read queue settings from the environment."""
+    return {
+        'lease_seconds': int(os.environ.get('QUEUE_LEASE_SECONDS', 60)),
+        'max_attempts': int(os.environ.get('QUEUE_MAX_ATTEMPTS', 5)),
+        'backoff_base': float(os.environ.get('QUEUE_BACKOFF_BASE', 30)),
+        'backoff_max': float(os.environ.get('QUEUE_BACKOFF_MAX', 3600)),
+        'poll_interval': float(os.environ.get('QUEUE_POLL_INTERVAL', 5)),
+        'batch_size': int(os.environ.get('QUEUE_BATCH_SIZE', 20)),
+        'sweep_interval': float(os.environ.get('QUEUE_SWEEP_INTERVAL', 600))
+    }
+
+
+def is_queue_delivery():
+    """Check if /api/send-message should enqueue instead of sending inline."""
+    return os.environ.get('OUTGOING_DELIVERY', 'inline').lower() == 'queue'
+
+
+def get_quiet_hours():
+    """Get the quiet hours window.
+
+    Returns:
+        tuple: (start_hour, end_hour, ZoneInfo) or None if quiet hours are disabled
+               (unset, or an empty window such as '8-8').
+    """
+    window = os.environ.get('QUIET_HOURS', '')
+    if not window:
+        return None
+    start, end = (int(h) for h in window.split('-'))
+    if start == end:
+        # Empty window; read as wrapping around it would be quiet all day
+        return None
+    return start, end, ZoneInfo(os.environ.get('QUIET_HOURS_TZ', 'UTC'))
+
+
+def quiet_hours_end(now):
+    """Get when the current quiet period ends, or None if now is outside quiet hours.
+
+    Args:
+        now: Aware datetime.
+    """
+    quiet = get_quiet_hours()
+    if quiet is None:
+        return None
+    start, end, tz = quiet
+    local = now.astimezone(tz)
+    hour = local.hour
+    in_quiet = (start <= hour < end) if start < end else (hour >= start or hour < end)
+    if not in_quiet:
+        return None
+    end_local = local.replace(hour=end, minute=0, second=0, microsecond=0)
+    if end_local <= local:
+        end_local += timedelta(days=1)
+    return end_local.astimezone(timezone.utc)
+
+
+def enqueue_message(user_id, message_content, operator_id, operator_name, send_at=None,
+                    simulate_status='sent'):
+    """Add a message to the queue.
+
+    Args:
+        user_id: Recipient UUID.
+        message_content: Message text.
+        operator_id: Operator attribution.
+        operator_name: Operator display name.
+        send_at: Optional aware datetime to deliver at (default: as soon as possible).
+        simulate_status: Status to simulate - simulation mode only.
+
+    Returns:
+        tuple: (queue document ID, scheduled send time)
+    """
+    now = datetime.now(timezone.utc)
+    send_at = max(send_at or now, now)
+    doc_ref = get_db().collection(QUEUE_COLLECTION).document()
+    doc_ref.set({
+        'createdAt': now,
+        'sendAt': send_at,
+        'nextAttemptAt': send_at,
+        'userId': user_id,  # UUID, not phone number
+        'messageContent': message_content,
+        'operatorId': operator_id,
+        'operatorName': operator_name,
+        'status': 'pending',
+        'attempts': 0,
+        'lastError': None,
+        'leasedBy': None,
+        'leasedAt': None,
+        'leaseExpiresAt': None,
+        'outgoingMessageId': None,
+        'simulateStatus': simulate_status,
+        'simulated': is_simulation_mode()
+    })
+    logger.info(f"Message queued: {doc_ref.id} sendAt={send_at.isoformat()}")
+    return doc_ref.id, send_at
+
+
+@transactional
+def _cancel(transaction, ref):
+    snapshot = ref.get(transaction=transaction)
+    if not snapshot.exists:
+        raise QueueError('not_found')
+    status = snapshot.get('status')
+    if status != 'pending':
+        raise QueueError(f"Message is {status}")
+    transaction.update(ref, {'status': 'cancelled', 'cancelledAt': datetime.now(timezone.utc)})
+
+
+def cancel_message(queue_id):
+    """Cancel a pending message.
+
+    Raises:
+        QueueError: If the message does not exist ('not_found') or is no longer pending.
+    """
+    db = get_db()
+    _cancel(db.transaction(), db.collection(QUEUE_COLLECTION).document(queue_id))
+    logger.info(f"Queued message cancelled: {queue_id}")
+
+
+def list_queue(status='pending', limit=100):
+    """List queued messages by status, soonest first.
+
+    Returns:
+        list: (queue_id, data) tuples.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    simulated = is_simulation_mode()
+    query = get_db().collection(QUEUE_COLLECTION)
+    query = query.where(filter=FieldFilter('simulated', '==', simulated))
+    query = query.where(filter=FieldFilter('status', '==', status))
+    query = query.order_by('nextAttemptAt').limit(limit)
+    return [(doc.id, doc.to_dict()) for doc in query.stream()]
+
+
+def _backoff(attempts, settings):
+    """Delay before retry number `attempts`, with jitter."""
+    delay = min(settings['backoff_base'] * 2 ** (attempts - 1), settings['backoff_max'])
+    return delay * random.uniform(0.8, 1.2)
+
+
+@transactional
+def _lease(transaction, ref, worker_id, settings):
+    """Lease a message if it is still claimable.
+
+    Returns:
+        dict or None: The message data (with 'reclaimed' set if a previous lease
+        expired mid-send), or None if another worker has it or it was deferred.
+    """
+    snapshot = ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    data = snapshot.to_dict()
+    now = datetime.now(timezone.utc)
+
+    if data['status'] == 'pending':
+        if data['nextAttemptAt'] > now:
+            return None
+        reclaimed = False
+    elif data['status'] == 'leased':
+        if data['leaseExpiresAt'] > now:
+            return None
+        reclaimed = True
+    else:
+        return None
+
+    quiet_end = quiet_hours_end(now)
+    if quiet_end is not None:
+        # Defer without counting an attempt
+        transaction.update(ref, {'status': 'pending', 'nextAttemptAt': quiet_end, 'leasedBy': None})
+        return None
+
+    # A reclaimed lease counts as an attempt, so a message that crashes workers is bounded
+    attempts = data.get('attempts', 0) + 1
+    transaction.update(ref, {
+        'status': 'leased',
+        'leasedBy': worker_id,
+        'leasedAt': now,
+        'leaseExpiresAt': now + timedelta(seconds=settings['lease_seconds']),
+        'attempts': attempts
+    })
+    data.update({'attempts': attempts, 'reclaimed': reclaimed})
+    return data
+
+
+def _claimable(db, simulated, settings):
+    """Find messages that are due or whose lease expired."""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    now = datetime.now(timezone.utc)
+    base = db.collection(QUEUE_COLLECTION).where(filter=FieldFilter('simulated', '==', simulated))
+
+    due = base.where(filter=FieldFilter('status', '==', 'pending'))
+    due = due.where(filter=FieldFilter('nextAttemptAt', '<=', now))
+    due = due.order_by('nextAttemptAt').limit(settings['batch_size'])
+
+    expired = base.where(filter=FieldFilter('status', '==', 'leased'))
+    expired = expired.where(filter=FieldFilter('leaseExpiresAt', '<=', now))
+    expired = expired.limit(settings['batch_size'])
+
+    return [doc.reference for doc in due.stream()] + [doc.reference for doc in expired.stream()]
+
+
+def _finish(ref, queue_update, outgoing_record=None, outgoing_ref=None):
+    """Write the queue outcome, plus the outgoingMessages record, in one batch."""
+    db = get_db()
+    batch = db.batch()
+    if outgoing_record is not None:
+        outgoing_ref = outgoing_ref or db.collection('outgoingMessages').document()
+        outgoing_record['queueId'] = ref.id
+        batch.set(outgoing_ref, outgoing_record)
+        queue_update['outgoingMessageId'] = outgoing_ref.id
+    batch.update(ref, queue_update)
+    batch.commit()
+    if outgoing_record is not None:
+        bump_version('outgoingMessages')
+        record_message_stats(outgoing_record['simulated'], outgoing=1)
+        record_conversation_message(outgoing_record['userId'], 'outgoing', outgoing_ref.id,
+                                    outgoing_record['messageContent'], outgoing_record['simulated'],
+                                    at=outgoing_record.get('sentAt'))
+
+
+def _deliver(ref, data, settings):
+    """Send one leased message and record the outcome."""
+    simulated = data.get('simulated', False)
+    record = build_outgoing_record(
+        data['userId'], data['messageContent'], data.get('operatorId'),
+        data.get('operatorName'), simulated, queued_at=data.get('createdAt')
+    )
+    now = datetime.now(timezone.utc)
+
+    phone_number, user_data = get_user_by_uuid(data['userId'])
+    if not user_data or user_data.get('status') != 'active':
+        error = 'User not found' if not user_data else 'User status is not active'
+        record.update({'status': 'failed', 'twilio_ErrorMessage': error})
+        _finish(ref, {'status': 'failed', 'lastError': error, 'completedAt': now}, record)
+        return 'failed'
+
+    if data.get('reclaimed') and not simulated:
+        # A previous worker died mid-send - don't send twice if Twilio already accepted it
+        message = find_twilio_message(phone_number, data['messageContent'], data.get('leasedAt') or now)
+        if message is not None:
+            record.update({'status': 'sent', 'sentAt': message.date_sent or now,
+                           'twilio_SmsMessageSid': message.sid})
+            _finish(ref, {'status': 'sent', 'sentAt': record['sentAt'], 'completedAt': now}, record)
+            return 'sent'
+
+    outgoing_ref = get_db().collection('outgoingMessages').document()
+    try:
+        message = send_sms(phone_number, data['messageContent'],
+                           simulate_status=data.get('simulateStatus', 'sent'),
+                           message_id=outgoing_ref.id)
+    except Exception as e:
+        error = str(e)
+        if data['attempts'] < settings['max_attempts']:
+            retry_at = now + timedelta(seconds=_backoff(data['attempts'], settings))
+            _finish(ref, {'status': 'pending', 'nextAttemptAt': retry_at, 'lastError': error,
+                          'leasedBy': None, 'leaseExpiresAt': None})
+            logger.warning(f"Queued send failed (attempt {data['attempts']}), retrying at "
+                           f"{retry_at.isoformat()}: {e}")
+            return 'retry'
+        record.update({'status': 'failed', 'twilio_ErrorMessage': error})
+        _finish(ref, {'status': 'failed', 'lastError': error, 'completedAt': now}, record)
+        logger.error(f"Queued send failed permanently after {data['attempts']} attempts: {e}")
+        return 'failed'
+
+    sent_at = datetime.now(timezone.utc)
+    record.update({
+        'status': data.get('simulateStatus', 'sent') if simulated else 'sent',
+        'sentAt': sent_at,
+        'twilio_SmsMessageSid': message.sid
+    })
+    _finish(ref, {'status': 'sent', 'sentAt': sent_at, 'completedAt': sent_at}, record, outgoing_ref)
+    return 'sent'
+
+
+def process_due_messages(worker_id, settings=None):
+    """Lease and deliver the messages that are currently due.
+
+    Returns:
+        int: Number of messages processed.
+    """
+    settings = settings or _get_settings()
+    db = get_db()
+    processed = 0
+    for ref in _claimable(db, is_simulation_mode(), settings):
+        try:
+            data = _lease(db.transaction(), ref, worker_id, settings)
+        except Exception as e:
+            logger.error(f"Failed to lease {ref.id}: {e}")
+            continue
+        if data is None:
+            continue
+        try:
+            _deliver(ref, data, settings)
+        except Exception as e:
+            # Lease expires and the message is retried
+            logger.error(f"Failed to deliver {ref.id}: {e}")
+        processed += 1
+    return processed
+
+
+def run_worker(should_stop=lambda: False):
+    """Poll the queue and deliver messages until should_stop() returns True."""
+    settings = _get_settings()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    logger.info(f"Queue worker {worker_id} started")
+
+    last_sweep = 0.0
+    while not should_stop():
+        try:
+            processed = process_due_messages(worker_id, settings)
+        except Exception as e:
+            logger.error(f"Queue poll failed: {e}")
+            processed = 0
+
+        if time.monotonic() - last_sweep >= settings['sweep_interval']:
+            try:
+                sweep_stale_queued()
+            except Exception as e:
+                logger.error(f"Outgoing sweep failed: {e}")
+            last_sweep = time.monotonic()
+
+        # A full batch means more is probably due - poll again right away
+        if processed < settings['batch_size']:
+            time.sleep(settings['poll_interval'])
+
+    logger.info(f"Queue worker {worker_id} stopped")
@@ -0,0 +1,354 @@
+"""Prometheus metrics.
+
+Served at /metrics:
+- http_request_duration_seconds: per route (Flask endpoint), method and status
+- firestore_operation_duration_seconds / firestore_operation_errors_total: per
+  collection and operation, recorded by the client get_db() returns
+- twilio_create_duration_seconds: Twilio messages.create() calls alone
+- sms_send_token_wait_seconds: time sends waited for a rate-limit token
+- twilio_send_errors_total: failed send_sms() calls by Twilio error code
+- queue depths and cache sizes, sampled every METRICS_SAMPLE_INTERVAL seconds
+
+Under gunicorn every worker writes its metrics to PROMETHEUS_MULTIPROC_DIR
+(set up by gunicorn.conf.py) and /metrics, whichever worker serves it,
+aggregates all of them. Without that directory metrics are per process.
+"""
+
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+from services.tracing import record_span
+
+logger = logging.getLogger(__name__)
+
+TWILIO_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HTTP_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by route.',
+    ['route', 'method', 'status']
+)
+FIRESTORE_DURATION = Histogram(
+    'firestore_operation_duration_seconds', 'Firestore call latency (streams: until fully read).',
+    ['collection', 'op']
+)
+FIRESTORE_ERRORS = Counter(
+    'firestore_operation_errors_total', 'Firestore calls that raised.',
+    ['collection', 'op']
+)
+TWILIO_DURATION = Histogram(
+    'twilio_create_duration_seconds', 'Twilio messages.create() latency (the API call only).',
+    ['outcome'], buckets=TWILIO_BUCKETS
+)
+TOKEN_WAIT = Histogram(
+    'sms_send_token_wait_seconds', 'Time a send waited for a rate-limit token.',
+    ['path'], buckets=(0.0, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+TWILIO_ERRORS = Counter(
+    'twilio_send_errors_total', 'Failed sends by Twilio error code (or exception type).',
+    ['mode', 'code']
+)
+QUEUE_DEPTH = Gauge(
+    'queue_depth', 'Work waiting in an in-process queue.',
+    ['queue'], multiprocess_mode='livesum'
+)
+CACHE_ENTRIES = Gauge(
+    'cache_entries', 'Entries held by an in-process cache.',
+    ['cache'], multiprocess_mode='livesum'
+)
+
+# Calls on Firestore objects that reach the server, by metric op name
+_FIRESTORE_OPS = frozenset(['get', 'stream', 'set', 'update', 'delete', 'create', 'add', 'commit', 'get_all'])
+
+# Calls that build another reference or query on the same collection
+_FIRESTORE_CHAINED = frozenset([
+    'document', 'where', 'order_by', 'limit', 'limit_to_last', 'offset',
+    'start_at', 'start_after', 'end_at', 'end_before', 'select', 'count', 'sum', 'avg'
+])
+
+
+def is_metrics_enabled():
+    """Check if metrics are collected (METRICS_ENABLED, default true)."""
+    return os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+
+def _unwrap(value):
+    return value._target if isinstance(value, InstrumentedFirestore) else value
+
+
+def _observe_firestore(collection, op, start, failed):
+    seconds = time.perf_counter() - start
+    FIRESTORE_DURATION.labels(collection, op).observe(seconds)
+    record_span(f"firestore.{op}.{collection}", seconds)
+    if failed:
+        FIRESTORE_ERRORS.labels(collection, op).inc()
+
+
+def _timed_iter(iterator, collection, op, start):
+    failed = False
+    try:
+        yield from iterator
+    except Exception:
+        failed = True
+        raise
+    finally:
+        _observe_firestore(collection, op, start, failed)
+
+
+async def _timed_aiter(iterator, collection, op, start):
+    failed = False
+    try:
+        async for item in iterator:
+            yield item
+    except Exception:
+        failed = True
+        raise
+    finally:
+        _observe_firestore(collection, op, start, failed)
+
+
+async def _timed_await(awaitable, collection, op, start):
+    failed = False
+    try:
+        return await awaitable
+    except Exception:
+        failed = True
+        raise
+    finally:
+        _observe_firestore(collection, op, start, failed)
+
+
+class InstrumentedFirestore:
+    """Wraps a Firestore client, reference, query or batch and times its server calls.
+
+    References and queries built from it are wrapped too, labelled with the
+    collection they came from; everything else passes straight through, so
+    it can be used (and handed to batches and transactions) like the object
+    it wraps. Works for the sync and async clients.
+    """
+
+    __slots__ = ('_target', '_collection')
+
+    def __init__(self, target, collection=None):
+        self._target = target
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in _FIRESTORE_OPS:
+            return functools.partial(self._call, attr, name)
+        if name == 'collection':
+            return lambda *args, **kwargs: InstrumentedFirestore(attr(*args, **kwargs), args[0] if args else None)
+        if name == 'batch':
+            return lambda *args, **kwargs: _InstrumentedBatch(attr(*args, **kwargs), 'batch')
+        if name in _FIRESTORE_CHAINED:
+            return lambda *args, **kwargs: InstrumentedFirestore(
+                attr(*[_unwrap(arg) for arg in args], **kwargs), self._collection
+            )
+        return attr
+
+    def _call(self, method, op, *args, **kwargs):
+        if op == 'get_all':
+            args = ([_unwrap(ref) for ref in args[0]],) + args[1:] if args else args
+        else:
+            args = [_unwrap(arg) for arg in args]
+        collection = self._collection or 'unknown'
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception:
+            _observe_firestore(collection, op, start, True)
+            raise
+
+        # Streams are timed until fully read; async calls until awaited
+        if hasattr(result, '__anext__'):
+            return _timed_aiter(result, collection, op, start)
+        if hasattr(result, '__next__'):
+            return _timed_iter(result, collection, op, start)
+        if hasattr(result, '__await__'):
+            return _timed_await(result, collection, op, start)
+        _observe_firestore(collection, op, start, False)
+        return result
+
+    def __repr__(self):
+        return f"InstrumentedFirestore({self._target!r})"
+
+
+class _InstrumentedBatch(InstrumentedFirestore):
+    """A write batch: only commit() reaches Firestore; writes are queued locally."""
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name == 'commit':
+            return functools.partial(self._call, attr, name)
+        if name in ('set', 'update', 'delete', 'create'):
+            return lambda *args, **kwargs: attr(*[_unwrap(arg) for arg in args], **kwargs)
+        return attr
+
+
+def instrument_firestore(client):
+    """Wrap a Firestore client for metrics, unless METRICS_ENABLED is false."""
+    return InstrumentedFirestore(client) if is_metrics_enabled() else client
+
+
+def _error_code(error):
+    code = getattr(error, 'code', None)
+    return str(code) if code is not None else type(error).__name__
+
+
+def instrument_send(is_simulated):
+    """Decorator counting failed send_sms()/send_sms_async() calls by error code."""
+    def decorator(fn):
+        if not is_metrics_enabled():
+            return fn
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as e:
+                    TWILIO_ERRORS.labels('simulated' if is_simulated() else 'live', _error_code(e)).inc()
+                    raise
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                TWILIO_ERRORS.labels('simulated' if is_simulated() else 'live', _error_code(e)).inc()
+                raise
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def timed_twilio_create():
+    """Time a messages.create() (or create_async()) call, and nothing around it."""
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        seconds = time.perf_counter() - start
+        record_span('twilio.messages.create', seconds)
+        if is_metrics_enabled():
+            TWILIO_DURATION.labels('failed' if failed else 'sent').observe(seconds)
+
+
+def observe_token_wait(path, seconds):
+    """Record how long a send waits for its rate-limit token ('pool' or 'service')."""
+    if is_metrics_enabled():
+        TOKEN_WAIT.labels(path).observe(seconds)
+
+
+def instrument_app(app):
+    """Time every Flask request by endpoint (e.g. 'api.get_messages')."""
+    if not is_metrics_enabled():
+        return
+
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.endpoint or 'unmatched'
+            HTTP_DURATION.labels(route, request.method, str(response.status_code)).observe(
+                time.perf_counter() - start
+            )
+        return response
+
+
+def observe_request(route, method, status, seconds):
+    """Record a request served outside Flask (the async server's native routes)."""
+    if is_metrics_enabled():
+        HTTP_DURATION.labels(route, method, str(status)).observe(seconds)
+
+
+def sample_gauges():
+    """Record this process's queue depths and cache sizes."""
+    # Imported here: these services import firebase, which imports this module
+    from services.delivery_status import get_status_tracker_stats
+    from services.dispatch import get_dispatch_stats
+    from services.firebase import get_user_directory_stats
+    from services.search import get_search_stats
+    from services.versions import get_response_cache
+    from services.writebehind import get_write_buffer_stats
+
+    write_behind = get_write_buffer_stats() or {}
+    delivery = get_status_tracker_stats() or {}
+    dispatch = get_dispatch_stats()
+    QUEUE_DEPTH.labels('write_behind').set(write_behind.get('pending', 0))
+    QUEUE_DEPTH.labels('delivery_status').set(delivery.get('pending', 0))
+    QUEUE_DEPTH.labels('dispatch').set(dispatch['pending'] + dispatch['asyncPending'])
+
+    CACHE_ENTRIES.labels('response').set(get_response_cache().stats()['entries'])
+    CACHE_ENTRIES.labels('user_directory').set(get_user_directory_stats()['users'])
+    CACHE_ENTRIES.labels('delivery_sids').set(delivery.get('cachedSids', 0))
+    CACHE_ENTRIES.labels('search_index').set((get_search_stats() or {}).get('messages', 0))
+
+
+# Global sampler thread
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def start_metrics_sampler():
+    """Sample gauges every METRICS_SAMPLE_INTERVAL seconds (once per process)."""
+    global _sampler
+
+    if not is_metrics_enabled():
+        return
+
+    interval = float(os.environ.get('METRICS_SAMPLE_INTERVAL', 15))
+
+    def _run():
+        while True:
+            try:
+                sample_gauges()
+            except Exception as e:
+                logger.warning(f"Metrics sampling failed: {e}")
+            time.sleep(interval)
+
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_run, name='metrics-sampler', daemon=True)
+            _sampler.start()
+
+
+def render_metrics():
+    """Render metrics in the Prometheus text format, across workers in multiprocess mode.
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    sample_gauges()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges (gunicorn child_exit)."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
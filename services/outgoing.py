@@ -0,0 +1,196 @@
+"""Outgoing message service.
+
+Sends an SMS and records it in outgoingMessages. OUTGOING_WRITE_MODE picks
+how many writes sit on the caller's path:
+
+- 'two_phase' (default): add a 'queued' record, send, update it with the result.
+- 'single': pre-generate the document ID, send, write the final record once.
+- 'deferred': write the 'queued' record, send, then hand the status update to
+  the background dispatcher (and write-behind buffer, when enabled).
+
+sweep_stale_queued() resolves records left in 'queued' by a crash between the
+send and the status update.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from services.firebase import get_db, get_user_by_uuid
+from services.twilio_sms import send_sms, is_simulation_mode, get_twilio_client
+from services.dispatch import submit
+from services.stats import record_message_stats
+from services.writebehind import write
+from services.versions import bump_version
+from services.search import index_message
+from services.conversations import record_conversation_message
+
+logger = logging.getLogger(__name__)
+
+WRITE_MODES = ('two_phase', 'single', 'deferred')
+
+
+def get_outgoing_write_mode():
+    """Get the outgoing record lifecycle mode ('two_phase', 'single' or 'deferred')."""
+    mode = os.environ.get('OUTGOING_WRITE_MODE', 'two_phase').lower()
+    return mode if mode in WRITE_MODES else 'two_phase'
+
+
+def build_outgoing_record(user_id, message_content, operator_id, operator_name, simulated, queued_at=None):
+    """Build an outgoingMessages record in the 'queued' state (UUID userId, no phone number)."""
+    return {
+        'queuedAt': queued_at or datetime.now(timezone.utc),
+        'sentAt': None,
+        'userId': user_id,  # UUID, not phone number
+        'messageContent': message_content,
+        'operatorId': operator_id,
+        'operatorName': operator_name,
+        'status': 'queued',
+        'twilio_SmsMessageSid': None,
+        'twilio_ErrorMessage': None,
+        'simulated': simulated
+    }
+
+
+def send_outgoing_message(phone_number, user_id, message_content, operator_id, operator_name,
+                          simulate_status='sent'):
+    """Send an SMS and record it in outgoingMessages.
+
+    Args:
+        phone_number: Recipient phone number (E.164, used in memory only).
+        user_id: Recipient UUID (stored instead of the phone number).
+        message_content: Message text.
+        operator_id: Operator attribution.
+        operator_name: Operator display name.
+        simulate_status: Status to simulate ('sent', 'failed', 'queued') - simulation mode only.
+
+    Returns:
+        dict: messageId, status, sentAt, twilio_MessageSid and error (None on success).
+    """
+    db = get_db()
+    simulated = is_simulation_mode()
+    mode = get_outgoing_write_mode()
+
+    record = build_outgoing_record(user_id, message_content, operator_id, operator_name, simulated)
+    doc_ref = db.collection('outgoingMessages').document()
+
+    if mode != 'single':
+        # Durable 'queued' record before sending
+        doc_ref.set(record)
+        bump_version('outgoingMessages')
+    record_message_stats(simulated, outgoing=1)
+
+    # Send via Twilio (or simulate) - phone_number used in memory only
+    try:
+        twilio_message = send_sms(phone_number, message_content, simulate_status=simulate_status,
+                                  message_id=doc_ref.id)
+        sent_at = datetime.now(timezone.utc)
+        update = {
+            'status': simulate_status if simulated else 'sent',
+            'sentAt': sent_at,
+            'twilio_SmsMessageSid': twilio_message.sid
+        }
+        error = None
+    except Exception as e:
+        sent_at = None
+        update = {
+            'status': 'failed',
+            'twilio_ErrorMessage': str(e)
+        }
+        error = str(e)
+
+    if mode == 'single':
+        doc_ref.set({**record, **update})
+        bump_version('outgoingMessages')
+    elif mode == 'deferred':
+        submit(write, doc_ref, update, merge=True)
+    else:
+        doc_ref.update(update)
+        bump_version('outgoingMessages')
+    index_message('outgoing', doc_ref.id, {**record, **update})
+    record_conversation_message(user_id, 'outgoing', doc_ref.id, message_content, simulated,
+                                at=update.get('sentAt'))
+
+    return {
+        'messageId': doc_ref.id,
+        'status': update['status'],
+        'sentAt': sent_at,
+        'twilio_MessageSid': update.get('twilio_SmsMessageSid'),
+        'error': error
+    }
+
+
+def find_twilio_message(phone_number, message_content, since):
+    """Look for a message Twilio accepted for this recipient and body since a given time.
+
+    Returns:
+        Twilio message, or None if there is none (or no Twilio client, e.g. simulation mode).
+    """
+    client = get_twilio_client()
+    if client is None:
+        return None
+    # Allow for clock skew between us and Twilio
+    since = since - timedelta(minutes=1)
+    for message in client.messages.list(to=phone_number, date_sent_after=since, limit=50):
+        if message.body == message_content:
+            return message
+    return None
+
+
+def sweep_stale_queued(older_than_minutes=10, limit=200):
+    """Resolve non-simulated outgoing records stuck in 'queued'.
+
+    Each stale record is reconciled against Twilio's message log: if Twilio
+    accepted a matching message it is marked 'sent' with that SID, otherwise
+    'failed'.
+
+    Args:
+        older_than_minutes: Only records queued longer ago than this are swept.
+        limit: Maximum records to resolve in one sweep.
+
+    Returns:
+        dict: Counts of records marked sent and failed.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    db = get_db()
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=older_than_minutes)
+
+    query = db.collection('outgoingMessages')
+    query = query.where(filter=FieldFilter('simulated', '==', False))
+    query = query.where(filter=FieldFilter('status', '==', 'queued'))
+    query = query.where(filter=FieldFilter('queuedAt', '<', cutoff))
+    query = query.limit(limit)
+
+    result = {'sent': 0, 'failed': 0}
+    for doc in query.stream():
+        data = doc.to_dict()
+        phone_number, _ = get_user_by_uuid(data.get('userId'))
+
+        twilio_message = None
+        if phone_number:
+            try:
+                twilio_message = find_twilio_message(
+                    phone_number, data.get('messageContent'), data.get('queuedAt')
+                )
+            except Exception as e:
+                logger.error(f"Sweep could not check Twilio for {doc.id}: {e}")
+                continue
+
+        if twilio_message is not None:
+            doc.reference.update({
+                'status': 'sent',
+                'sentAt': twilio_message.date_sent or twilio_message.date_created,
+                'twilio_SmsMessageSid': twilio_message.sid
+            })
+            result['sent'] += 1
+        else:
+            doc.reference.update({
+                'status': 'failed',
+                'twilio_ErrorMessage': 'Send was interrupted before it was confirmed (recovered by sweep)'
+            })
+            result['failed'] += 1
+
+    if result['sent'] or result['failed']:
+        bump_version('outgoingMessages')
+    logger.info(f"Outgoing sweep: {result['sent']} sent, {result['failed']} failed")
+    return result
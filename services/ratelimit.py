@@ -0,0 +1,176 @@
+"""Cross-process token-bucket rate limiter for outbound SMS.
+
+Each sender number (or Messaging Service, at its own rate) gets a bucket
+stored in a small file under RATE_LIMIT_DIR.
+Every gunicorn worker (and queue worker) on the host updates the same file
+under an exclusive flock, so the pace holds across processes without an
+external service.
+
+Blocking acquires reserve a token immediately (the bucket may go negative)
+and sleep for the deficit outside the lock, so waiters are served in arrival
+order without spinning on the lock.
+"""
+
+import fcntl
+import logging
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bucket file layout: tokens (double), last refill wall-clock time (double)
+_STATE = struct.Struct('dd')
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a token is not available within the allowed wait."""
+    pass
+
+
+def is_rate_limit_enabled():
+    """Check if outbound rate limiting is enabled."""
+    return os.environ.get('SMS_RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by sender, shared across processes through lock files."""
+
+    def __init__(self, rate=1.0, burst=1, directory=None):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'sms-ratelimit')
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _path(self, key):
+        safe = re.sub(r'[^A-Za-z0-9_-]', '_', key or 'default')
+        return os.path.join(self.directory, f"{safe}.bucket")
+
+    def _reserve(self, key, max_wait, rate, burst):
+        """Take a token from the bucket, allowing a deficit of up to max_wait seconds.
+
+        Returns:
+            float or None: Seconds to wait before sending, or None if the wait would exceed max_wait.
+        """
+        fd = os.open(self._path(key), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.pread(fd, _STATE.size, 0)
+            now = time.time()
+            if len(raw) == _STATE.size:
+                tokens, last = _STATE.unpack(raw)
+                elapsed = max(now - last, 0.0)
+                tokens = min(burst, tokens + elapsed * rate)
+            else:
+                tokens = float(burst)
+
+            wait = max(0.0, (1.0 - tokens) / rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+
+            os.pwrite(fd, _STATE.pack(tokens - 1.0, now), 0)
+            return wait
+        finally:
+            os.close(fd)  # Releases the flock
+
+    def reserve(self, key, blocking=True, timeout=None, rate=None, burst=None):
+        """Reserve a send token without sleeping.
+
+        The caller must wait the returned delay before sending (the async
+        send path awaits it instead of blocking a thread).
+
+        Args:
+            key: Bucket key (sender phone number or Messaging Service SID).
+            blocking: Accept a delay if no token is available now.
+            timeout: Maximum delay to accept when blocking (None accepts any).
+            rate: Tokens per second for this key (default: the limiter's rate).
+            burst: Bucket size for this key (default: the limiter's burst).
+
+        Returns:
+            float: Seconds to wait before sending.
+
+        Raises:
+            RateLimitExceeded: If no token is available (non-blocking) or within timeout.
+        """
+        wait = self._reserve(key, timeout if blocking else 0.0, rate or self.rate, max(burst or self.burst, 1))
+        if wait is None:
+            with self._lock:
+                self.rejected += 1
+            raise RateLimitExceeded(f"Send rate limit reached for {key}")
+
+        with self._lock:
+            self.acquired += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return wait
+
+    def acquire(self, key, blocking=True, timeout=None, rate=None, burst=None):
+        """Acquire a send token for a sender, sleeping until it is due.
+
+        Args:
+            key: Bucket key (sender phone number or Messaging Service SID).
+            blocking: Wait for a token if none is available now.
+            timeout: Maximum seconds to wait when blocking (None waits as long as needed).
+            rate: Tokens per second for this key (default: the limiter's rate).
+            burst: Bucket size for this key (default: the limiter's burst).
+
+        Returns:
+            float: Seconds spent waiting.
+
+        Raises:
+            RateLimitExceeded: If no token is available (non-blocking) or within timeout.
+        """
+        wait = self.reserve(key, blocking=blocking, timeout=timeout, rate=rate, burst=burst)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def stats(self):
+        """Get this process's wait-time metrics."""
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'acquired': self.acquired,
+                'rejected': self.rejected,
+                'avgWaitSeconds': round(self.total_wait / self.acquired, 4) if self.acquired else 0.0,
+                'maxWaitSeconds': round(self.max_wait, 4)
+            }
+
+
+# Global limiter
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Get the shared limiter, or None if rate limiting is disabled."""
+    global _limiter
+
+    if not is_rate_limit_enabled():
+        return None
+
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = TokenBucketLimiter(
+                rate=float(os.environ.get('SMS_RATE_PER_SECOND', 1.0)),
+                burst=int(os.environ.get('SMS_RATE_BURST', 1)),
+                directory=os.environ.get('RATE_LIMIT_DIR') or None
+            )
+            logger.info(f"SMS rate limiter: {_limiter.rate}/s burst={_limiter.burst} dir={_limiter.directory}")
+        return _limiter
+
+
+def get_rate_limiter_stats():
+    """Get rate limiter metrics, or None if it is not in use."""
+    if _limiter is None:
+        return None
+    return _limiter.stats()
@@ -0,0 +1,372 @@
+"""Full-text search over message content.
+
+An in-process inverted index over incomingMessages and outgoingMessages,
+ranked with BM25 and filtered by direction, userId, date and simulation mode.
+Searches cost no Firestore reads.
+
+The index is built once from a paged scan and saved to SEARCH_INDEX_PATH; a
+file lock makes the first worker on a host build it while the others wait and
+load the saved copy. After loading, messages newer than the saved copy are
+caught up with one query, then the index is kept current by the write paths
+in this process and by the live feed's snapshot listeners for everything
+else. It is saved again every SEARCH_PERSIST_INTERVAL seconds when changed.
+"""
+
+import atexit
+import fcntl
+import gzip
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from services.firebase import get_db
+from services.live_feed import get_live_feed
+
+logger = logging.getLogger(__name__)
+
+# direction -> (collection, time field, fields kept for result rows)
+SOURCES = {
+    'incoming': ('incomingMessages', 'timestamp', (
+        'timestamp', 'userId', 'messageContent', 'isRegistered', 'responseSent',
+        'twilio_SmsMessageSid', 'simulated'
+    )),
+    'outgoing': ('outgoingMessages', 'queuedAt', (
+        'queuedAt', 'sentAt', 'userId', 'messageContent', 'operatorId', 'operatorName',
+        'status', 'twilio_SmsMessageSid', 'twilio_ErrorMessage', 'simulated'
+    )),
+}
+COLLECTION_DIRECTIONS = {collection: direction for direction, (collection, _, _) in SOURCES.items()}
+
+DATETIME_FIELDS = frozenset(['timestamp', 'queuedAt', 'sentAt'])
+
+# Saved index format version
+FORMAT_VERSION = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens."""
+    return _TOKEN.findall((text or '').lower())
+
+
+def is_search_enabled():
+    """Check if the search index is enabled."""
+    return os.environ.get('SEARCH_INDEX_ENABLED', 'true').lower() == 'true'
+
+
+def _get_index_path():
+    return os.environ.get('SEARCH_INDEX_PATH') or os.path.join(tempfile.gettempdir(), 'sms-search-index.json.gz')
+
+
+def _to_epoch(value):
+    return value.timestamp() if isinstance(value, datetime) else None
+
+
+def _stored(direction, data):
+    """Keep only the fields result rows need."""
+    fields = SOURCES[direction][2]
+    return {field: data.get(field) for field in fields}
+
+
+class SearchIndex:
+    """Inverted index of message content with BM25 ranking."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = {}      # (direction, doc_id) -> docnum
+        self._docs = []      # docnum -> (direction, doc_id, stored data, time epoch, length)
+        self._postings = {}  # term -> {docnum: term frequency}
+        self._total_length = 0
+        self.dirty = False
+        self.searches = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, direction, doc_id, data):
+        """Index or re-index one message."""
+        stored = _stored(direction, data)
+        terms = {}
+        for term in tokenize(stored.get('messageContent')):
+            terms[term] = terms.get(term, 0) + 1
+        length = sum(terms.values())
+        epoch = _to_epoch(stored.get(SOURCES[direction][1]))
+
+        with self._lock:
+            key = (direction, doc_id)
+            docnum = self._keys.get(key)
+            if docnum is None:
+                docnum = len(self._docs)
+                self._keys[key] = docnum
+                self._docs.append(None)
+            else:
+                self._remove_postings(docnum)
+            self._docs[docnum] = (direction, doc_id, stored, epoch, length)
+            self._total_length += length
+            for term, count in terms.items():
+                self._postings.setdefault(term, {})[docnum] = count
+            self.dirty = True
+
+    def _remove_postings(self, docnum):
+        _, _, stored, _, length = self._docs[docnum]
+        for term in set(tokenize(stored.get('messageContent'))):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(docnum, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= length
+
+    def latest(self, direction):
+        """Newest message time indexed for a direction (epoch seconds), or None."""
+        with self._lock:
+            times = [doc[3] for doc in self._docs if doc[0] == direction and doc[3] is not None]
+        return max(times) if times else None
+
+    def search(self, query, simulated, direction=None, user_id=None, start=None, end=None, limit=50):
+        """Find messages containing every query term.
+
+        Args:
+            query: Search text.
+            simulated: Search simulated or live messages.
+            direction: 'incoming', 'outgoing' or None for both.
+            user_id: Only messages for this user UUID.
+            start: Only messages at or after this datetime.
+            end: Only messages before this datetime.
+            limit: Maximum results.
+
+        Returns:
+            list: (score, direction, doc_id, stored data), best first (newest first on ties).
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        start_epoch = _to_epoch(start)
+        end_epoch = _to_epoch(end)
+
+        with self._lock:
+            self.searches += 1
+            postings = [self._postings.get(term) for term in terms]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for other in postings[1:]:
+                candidates.intersection_update(other)
+                if not candidates:
+                    return []
+
+            total = len(self._docs)
+            average_length = self._total_length / total if total else 0
+            idf = [math.log(1 + (total - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+
+            results = []
+            for docnum in candidates:
+                doc_direction, doc_id, stored, epoch, length = self._docs[docnum]
+                if stored.get('simulated', False) != simulated:
+                    continue
+                if direction and doc_direction != direction:
+                    continue
+                if user_id and stored.get('userId') != user_id:
+                    continue
+                if start_epoch is not None and (epoch is None or epoch < start_epoch):
+                    continue
+                if end_epoch is not None and (epoch is None or epoch >= end_epoch):
+                    continue
+
+                norm = K1 * (1 - B + B * length / average_length) if average_length else K1
+                score = sum(
+                    weight * p[docnum] * (K1 + 1) / (p[docnum] + norm)
+                    for weight, p in zip(idf, postings)
+                )
+                results.append((score, epoch or 0, doc_direction, doc_id, stored))
+
+        results.sort(key=lambda r: (r[0], r[1]), reverse=True)
+        return [(round(score, 4), d, doc_id, stored) for score, _, d, doc_id, stored in results[:limit]]
+
+    def save(self, path):
+        """Write the index's documents to disk (postings are rebuilt on load)."""
+        with self._lock:
+            docs = [
+                [direction, doc_id, {k: v.isoformat() if isinstance(v, datetime) else v
+                                     for k, v in stored.items()}]
+                for direction, doc_id, stored, _, _ in self._docs
+            ]
+            self.dirty = False
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({'version': FORMAT_VERSION, 'docs': docs}, f)
+        os.replace(tmp_path, path)
+        logger.info(f"Search index saved: {len(docs)} messages")
+
+    def load(self, path):
+        """Load a saved index. Returns False if there is none (or it is unreadable)."""
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Ignoring unreadable search index {path}: {e}")
+            return False
+        if saved.get('version') != FORMAT_VERSION:
+            return False
+
+        for direction, doc_id, stored in saved['docs']:
+            for field in DATETIME_FIELDS:
+                if stored.get(field):
+                    stored[field] = datetime.fromisoformat(stored[field])
+            self.add(direction, doc_id, stored)
+        self.dirty = False
+        logger.info(f"Search index loaded: {len(self)} messages")
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {'messages': len(self._docs), 'terms': len(self._postings), 'searches': self.searches}
+
+
+def _scan(index, direction, since=None, page_size=500):
+    """Index a collection (or the part newer than `since`) with a paged scan."""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    from google.cloud.firestore_v1.field_path import FieldPath
+    collection, time_field, _ = SOURCES[direction]
+    query = get_db().collection(collection)
+    if since is not None:
+        query = query.where(filter=FieldFilter(time_field, '>=', since))
+        query = query.order_by(time_field)
+    query = query.order_by(FieldPath.document_id()).limit(page_size)
+
+    count = 0
+    last = None
+    while True:
+        page = query.start_after(last) if last is not None else query
+        docs = list(page.stream())
+        for doc in docs:
+            index.add(direction, doc.id, doc.to_dict())
+        count += len(docs)
+        if len(docs) < page_size:
+            return count
+        last = {FieldPath.document_id(): docs[-1].id}
+        if since is not None:
+            last = {time_field: docs[-1].get(time_field), **last}
+
+
+class _SearchService:
+    """Owns the index: building/loading, live updates and periodic saves."""
+
+    def __init__(self):
+        self.index = SearchIndex()
+        self.path = _get_index_path()
+        self.persist_interval = float(os.environ.get('SEARCH_PERSIST_INTERVAL', 300))
+        self.ready = False
+        self.error = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Build or load the index in the background (once)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._initialize, name='search-index', daemon=True).start()
+
+    def _initialize(self):
+        started = time.monotonic()
+        try:
+            # Listen first so nothing written during the load is missed (adds are idempotent)
+            get_live_feed().add_listener(self._on_changes)
+
+            with open(f"{self.path}.lock", 'w') as lock_file:
+                # One worker per host builds; the rest wait here and load its copy
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if self.index.load(self.path):
+                    for direction in SOURCES:
+                        latest = self.index.latest(direction)
+                        if latest is not None:
+                            # Small overlap for clock skew between writers
+                            since = datetime.fromtimestamp(latest, timezone.utc) - timedelta(minutes=5)
+                            _scan(self.index, direction, since=since)
+                else:
+                    for direction in SOURCES:
+                        _scan(self.index, direction)
+                if self.index.dirty:
+                    self.index.save(self.path)
+
+            self.ready = True
+            logger.info(f"Search index ready: {len(self.index)} messages in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Search index failed to initialize: {e}")
+            return
+
+        atexit.register(self.persist)
+        while True:
+            time.sleep(self.persist_interval)
+            self.persist()
+
+    def _on_changes(self, collection, changes):
+        """Apply snapshot listener changes."""
+        direction = COLLECTION_DIRECTIONS.get(collection)
+        if direction is None:
+            return
+        for change in changes:
+            if change.type.name != 'REMOVED':
+                self.index.add(direction, change.document.id, change.document.to_dict())
+
+    def persist(self):
+        """Save the index if it changed."""
+        if not self.ready or not self.index.dirty:
+            return
+        try:
+            self.index.save(self.path)
+        except Exception as e:
+            logger.error(f"Failed to save search index: {e}")
+
+
+# Global service
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_search_service():
+    """Get the search service, starting the index build on first use (None if disabled)."""
+    global _service
+
+    if not is_search_enabled():
+        return None
+
+    with _service_lock:
+        if _service is None:
+            _service = _SearchService()
+    _service.start()
+    return _service
+
+
+def index_message(direction, doc_id, data):
+    """Index a message written in this process (no-op until the index is running)."""
+    if _service is None or not _service.ready:
+        return
+    try:
+        _service.index.add(direction, doc_id, data)
+    except Exception as e:
+        logger.error(f"Failed to index message {doc_id}: {e}")
+
+
+def get_search_stats():
+    """Get search index stats, or None if it is not in use."""
+    if _service is None:
+        return None
+    return {**_service.index.stats(), 'ready': _service.ready, 'error': _service.error}
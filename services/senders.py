@@ -0,0 +1,222 @@
+"""Sender-number pool for outbound SMS.
+
+Outbound throughput is capped per sender number, so sends are sharded across
+a pool of numbers (TWILIO_SENDER_NUMBERS, falling back to TWILIO_PHONE_NUMBER).
+Each recipient is mapped to a preferred sender by rendezvous hashing, which
+keeps the same sender for a recipient across sends (conversation continuity)
+and only moves 1/n of recipients when a number is added or removed.
+
+Every number has its own token bucket, so aggregate throughput grows with the
+pool. A saturated number is skipped for the next one in the recipient's order,
+and a number that keeps failing is cooled down for SENDER_COOLDOWN_SECONDS.
+
+When TWILIO_MESSAGING_SERVICE_SID is set, Twilio picks the sender instead and
+the pool is not used. The service spreads sends over all of its numbers and
+queues what it cannot send yet, so it is not paced at one number's rate:
+MESSAGING_SERVICE_RATE_PER_SECOND (default 0, no local pacing) can cap it at
+the service's combined rate.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from twilio.base.exceptions import TwilioRestException
+
+from services.ratelimit import get_rate_limiter, RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+# Twilio error codes that mean the sender (not the recipient) was the problem
+SENDER_ERROR_CODES = frozenset([
+    20429,  # Too many requests
+    21212,  # Invalid 'From' number
+    21606,  # 'From' number is not SMS-capable
+    21611,  # 'From' number has too many queued messages
+])
+
+
+def get_messaging_service_sid():
+    """Get the Twilio Messaging Service SID, if sends go through one."""
+    return os.environ.get('TWILIO_MESSAGING_SERVICE_SID') or None
+
+
+def get_messaging_service_rate():
+    """Get the local pacing for Messaging Service sends.
+
+    Returns:
+        tuple: (sends per second, burst), or None to leave pacing to Twilio.
+    """
+    rate = float(os.environ.get('MESSAGING_SERVICE_RATE_PER_SECOND', 0))
+    if rate <= 0:
+        return None
+    burst = int(os.environ.get('MESSAGING_SERVICE_RATE_BURST', 0)) or max(int(rate), 1)
+    return rate, burst
+
+
+def get_sender_numbers():
+    """Get the configured sender numbers."""
+    numbers = os.environ.get('TWILIO_SENDER_NUMBERS', '')
+    numbers = [n.strip() for n in numbers.split(',') if n.strip()]
+    if not numbers and os.environ.get('TWILIO_PHONE_NUMBER'):
+        numbers = [os.environ['TWILIO_PHONE_NUMBER']]
+    return numbers
+
+
+def is_sender_error(error):
+    """Check if a send error should count against the sender number."""
+    if isinstance(error, TwilioRestException):
+        return error.code in SENDER_ERROR_CODES or (error.status or 0) >= 500
+    return not isinstance(error, RateLimitExceeded)
+
+
+class _SenderHealth:
+    """Throughput and failure counters for one sender number."""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.consecutive_failures = 0
+        self.cooling_until = 0.0
+
+
+class SenderPool:
+    """Sticky, health-aware choice of sender number per recipient."""
+
+    def __init__(self, numbers, failure_threshold=3, cooldown=60.0):
+        self.numbers = list(numbers)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._health = {number: _SenderHealth() for number in self.numbers}
+
+    def candidates(self, recipient):
+        """Sender numbers in the recipient's rendezvous order (preferred first)."""
+        def weight(number):
+            return hashlib.sha256(f"{number}:{recipient}".encode()).digest()
+        return sorted(self.numbers, key=weight, reverse=True)
+
+    def _healthy(self, recipient, exclude=()):
+        """Candidates not cooling down; falls back to the soonest-recovering one."""
+        now = time.monotonic()
+        ordered = [n for n in self.candidates(recipient) if n not in exclude]
+        with self._lock:
+            healthy = [n for n in ordered if self._health[n].cooling_until <= now]
+            if not healthy and ordered:
+                healthy = [min(ordered, key=lambda n: self._health[n].cooling_until)]
+        return healthy
+
+    def reserve(self, recipient, wait=True, timeout=None, exclude=()):
+        """Pick a sender for a recipient and reserve a send token from its bucket.
+
+        The preferred sender is used unless it is saturated, in which case the
+        next healthy sender with a free token is used. If all are saturated,
+        a delayed token is reserved on the preferred sender (when wait is True).
+
+        Args:
+            recipient: Recipient phone number (used in memory only).
+            wait: Accept a delay if every healthy sender is saturated.
+            timeout: Maximum seconds of delay to accept.
+            exclude: Sender numbers not to use (e.g. one that just rejected the send).
+
+        Returns:
+            tuple: (sender number or None if there are no senders, seconds to wait before sending).
+
+        Raises:
+            RateLimitExceeded: If no sender has a token in time.
+        """
+        healthy = self._healthy(recipient, exclude)
+        if not healthy:
+            return None, 0.0
+
+        limiter = get_rate_limiter()
+        if limiter is None:
+            return healthy[0], 0.0
+
+        for index, number in enumerate(healthy):
+            try:
+                limiter.reserve(number, blocking=False)
+            except RateLimitExceeded:
+                continue
+            if index:
+                with self._lock:
+                    self._health[healthy[0]].skipped += 1
+            return number, 0.0
+
+        if not wait:
+            raise RateLimitExceeded('All sender numbers are saturated')
+        delay = limiter.reserve(healthy[0], blocking=True, timeout=timeout)
+        if delay > 0.5:
+            logger.info(f"SMS send waiting {delay:.2f}s for rate limit")
+        return healthy[0], delay
+
+    def acquire(self, recipient, wait=True, timeout=None, exclude=()):
+        """Like reserve(), but sleeps out the delay and returns just the sender number."""
+        number, delay = self.reserve(recipient, wait=wait, timeout=timeout, exclude=exclude)
+        if delay > 0:
+            time.sleep(delay)
+        return number
+
+    def record_success(self, number):
+        """Record a send accepted by Twilio."""
+        with self._lock:
+            health = self._health[number]
+            health.sent += 1
+            health.consecutive_failures = 0
+
+    def record_failure(self, number, error):
+        """Record a failed send; sender-side failures can cool the number down."""
+        if not is_sender_error(error):
+            return
+        with self._lock:
+            health = self._health[number]
+            health.failed += 1
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= self.failure_threshold:
+                health.cooling_until = time.monotonic() + self.cooldown
+                health.consecutive_failures = 0
+                logger.warning(f"Sender {number} cooling down for {self.cooldown:.0f}s after repeated failures")
+
+    def stats(self):
+        """Get per-number throughput and health counters."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                number: {
+                    'sent': health.sent,
+                    'failed': health.failed,
+                    'skipped': health.skipped,
+                    'coolingDown': health.cooling_until > now
+                }
+                for number, health in self._health.items()
+            }
+
+
+# Global pool
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_sender_pool():
+    """Get the sender pool (built on first use)."""
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = SenderPool(
+                get_sender_numbers(),
+                failure_threshold=int(os.environ.get('SENDER_FAILURE_THRESHOLD', 3)),
+                cooldown=float(os.environ.get('SENDER_COOLDOWN_SECONDS', 60))
+            )
+            logger.info(f"Sender pool: {len(_pool.numbers)} number(s)")
+        return _pool
+
+
+def get_sender_stats():
+    """Get sender pool stats, or None if the pool is not in use."""
+    if _pool is None:
+        return None
+    return _pool.stats()
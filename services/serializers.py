@@ -0,0 +1,96 @@
+"""JSON row serializers for message documents.
+
+Shared by the list APIs and the live feed so both emit identical rows. Rows
+carry userId (UUID) and display-safe user info (masked phone), never full
+phone numbers.
+"""
+
+from services.firebase import get_users_display_info
+
+
+def _iso(value):
+    """Format an optional datetime as ISO 8601."""
+    return value.isoformat() if value else None
+
+
+def _unknown_user(user_id):
+    """Display info for a user that could not be resolved."""
+    return {
+        'userId': user_id,
+        'name': '',
+        'maskedPhone': '(unknown)',
+        'status': 'unknown'
+    }
+
+
+def incoming_row(doc_id, data, user_info):
+    """Serialize an incomingMessages document."""
+    user_id = data.get('userId', '')
+    user_info = user_info or _unknown_user(user_id)
+    return {
+        'id': doc_id,
+        'timestamp': _iso(data.get('timestamp')),
+        'userId': user_id,
+        'userName': user_info.get('name', ''),
+        'maskedPhone': user_info.get('maskedPhone', ''),
+        'messageContent': data.get('messageContent', ''),
+        'isRegistered': data.get('isRegistered', False),
+        'responseSent': data.get('responseSent', False),
+        'twilio_SmsMessageSid': data.get('twilio_SmsMessageSid', ''),
+        'simulated': data.get('simulated', False)
+    }
+
+
+def outgoing_row(doc_id, data, user_info):
+    """Serialize an outgoingMessages document."""
+    user_id = data.get('userId', '')
+    user_info = user_info or _unknown_user(user_id)
+    return {
+        'id': doc_id,
+        'queuedAt': _iso(data.get('queuedAt')),
+        'sentAt': _iso(data.get('sentAt')),
+        'userId': user_id,
+        'userName': user_info.get('name', ''),
+        'maskedPhone': user_info.get('maskedPhone', ''),
+        'messageContent': data.get('messageContent', ''),
+        'operatorId': data.get('operatorId', ''),
+        'operatorName': data.get('operatorName', ''),
+        'status': data.get('status', ''),
+        'twilio_SmsMessageSid': data.get('twilio_SmsMessageSid', ''),
+        'twilio_ErrorMessage': data.get('twilio_ErrorMessage', ''),
+        'simulated': data.get('simulated', False)
+    }
+
+
+def conversation_row(doc_id, data, user_info):
+    """Serialize a conversations summary document."""
+    user_id = data.get('userId', '')
+    user_info = user_info or _unknown_user(user_id)
+    return {
+        'userId': user_id,
+        'userName': user_info.get('name', ''),
+        'maskedPhone': user_info.get('maskedPhone', ''),
+        'lastMessageAt': _iso(data.get('lastMessageAt')),
+        'lastIncomingAt': _iso(data.get('lastIncomingAt')),
+        'lastDirection': data.get('lastDirection', ''),
+        'lastMessagePreview': data.get('lastMessagePreview', ''),
+        'incomingCount': data.get('incomingCount', 0),
+        'outgoingCount': data.get('outgoingCount', 0),
+        'simulated': data.get('simulated', False)
+    }
+
+
+def serialize_rows(row_serializer, rows):
+    """Serialize (doc_id, data) rows, resolving every user in one batch.
+
+    Args:
+        row_serializer: incoming_row, outgoing_row or conversation_row.
+        rows: Iterable of (doc_id, data) tuples.
+
+    Returns:
+        list: Serialized rows in the same order.
+    """
+    rows = list(rows)
+    user_infos = get_users_display_info(data.get('userId', '') for _, data in rows)
+    return [row_serializer(doc_id, data, user_infos.get(data.get('userId', '')))
+            for doc_id, data in rows]
@@ -0,0 +1,57 @@
+"""Process startup state.
+
+Web servers run their startup (warm-up reads and requests, health probing,
+metrics sampling) through run_startup(): `python app.py` and
+`python aio_app.py` in the background, so the process answers /health and
+/health/live straight away instead of after its slowest dependency, and
+gunicorn's post_fork in the foreground. Data routes don't wait for it:
+get_db() initializes on first use, so a request that arrives early just pays
+the cold path itself. The queue worker and CLI commands start none of it.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_started_at = time.monotonic()
+_launched = threading.Event()
+_done = threading.Event()
+_state = {'durationMs': None, 'error': None}
+
+
+def run_startup(fn, *args, background=True):
+    """Run the startup function, in a daemon thread unless background is False."""
+    _launched.set()
+
+    def _run():
+        begun = time.monotonic()
+        try:
+            fn(*args)
+        except Exception as e:
+            _state['error'] = str(e)
+            logger.error(f"Startup failed: {e}")
+        _state['durationMs'] = round((time.monotonic() - begun) * 1000, 1)
+        _done.set()
+        logger.info(f"Startup finished in {_state['durationMs']}ms")
+
+    if background:
+        threading.Thread(target=_run, name='startup', daemon=True).start()
+    else:
+        _run()
+
+
+def is_startup_pending():
+    """Check if a startup function is still running."""
+    return _launched.is_set() and not _done.is_set()
+
+
+def get_startup_stats():
+    """Get startup timing for /health."""
+    return {
+        'complete': _done.is_set(),
+        'durationMs': _state['durationMs'],
+        'error': _state['error'],
+        'uptimeSeconds': round(time.monotonic() - _started_at, 1)
+    }
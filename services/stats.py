@@ -0,0 +1,174 @@
+"""Dashboard statistics service.
+
+Message counts are kept in hourly counter documents in the `stats`
+collection, incremented by the write paths with firestore.Increment, so the
+dashboard summary costs one batched read instead of a scan. Firestore
+count() aggregations are used to recompute them.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+
+from services.firebase import get_db, get_user_directory
+from services.writebehind import write, write_async
+
+logger = logging.getLogger(__name__)
+
+STATS_COLLECTION = 'stats'
+COUNTER_FIELDS = ('incoming', 'outgoing', 'unknown')
+
+
+def _hour_start(dt):
+    """Truncate a datetime to the start of its UTC hour."""
+    return dt.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _bucket_id(hour, simulated):
+    """Counter document ID for an hour, e.g. 'live_2026101613'."""
+    prefix = 'sim' if simulated else 'live'
+    return f"{prefix}_{hour.strftime('%Y%m%d%H')}"
+
+
+def _bucket_hours(hours, now=None):
+    """Start times of the hourly buckets covering the last `hours` hours (newest first)."""
+    current = _hour_start(now or datetime.now(timezone.utc))
+    return [current - timedelta(hours=i) for i in range(hours)]
+
+
+def _stats_update(simulated, incoming, outgoing, unknown, at):
+    """Counter bucket ref and Increment update, or (None, None) if nothing to count."""
+    from firebase_admin import firestore
+    counts = {'incoming': incoming, 'outgoing': outgoing, 'unknown': unknown}
+    update = {field: firestore.Increment(n) for field, n in counts.items() if n}
+    if not update:
+        return None, None
+
+    hour = _hour_start(at or datetime.now(timezone.utc))
+    update['hour'] = hour
+    update['simulated'] = simulated
+    return get_db().collection(STATS_COLLECTION).document(_bucket_id(hour, simulated)), update
+
+
+def record_message_stats(simulated, incoming=0, outgoing=0, unknown=0, at=None):
+    """Increment the counters for the current hour.
+
+    Failures are logged, never raised, so stats cannot break message flow.
+
+    Args:
+        simulated: Whether the messages were simulated.
+        incoming: Number of incoming messages logged.
+        outgoing: Number of outgoing messages logged.
+        unknown: Number of incoming messages from unknown numbers.
+        at: Time of the messages (defaults to now).
+    """
+    try:
+        ref, update = _stats_update(simulated, incoming, outgoing, unknown, at)
+        if ref is not None:
+            write(ref, update, merge=True)
+    except Exception as e:
+        logger.error(f"Failed to update message stats: {e}")
+
+
+async def record_message_stats_async(simulated, incoming=0, outgoing=0, unknown=0, at=None):
+    """Async record_message_stats() for the async server."""
+    try:
+        ref, update = _stats_update(simulated, incoming, outgoing, unknown, at)
+        if ref is not None:
+            await write_async(ref, update, merge=True)
+    except Exception as e:
+        logger.error(f"Failed to update message stats: {e}")
+
+
+def _count(query):
+    """Run a count() aggregation query."""
+    result = query.count(alias='count').get()
+    return int(result[0][0].value)
+
+
+def _count_messages(simulated, start, end=None):
+    """Count messages in [start, end) with aggregation queries.
+
+    Returns:
+        dict: incoming, outgoing and unknown counts.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    db = get_db()
+
+    incoming = db.collection('incomingMessages').where(filter=FieldFilter('simulated', '==', simulated))
+    incoming = incoming.where(filter=FieldFilter('timestamp', '>=', start))
+    outgoing = db.collection('outgoingMessages').where(filter=FieldFilter('simulated', '==', simulated))
+    outgoing = outgoing.where(filter=FieldFilter('queuedAt', '>=', start))
+    if end is not None:
+        incoming = incoming.where(filter=FieldFilter('timestamp', '<', end))
+        outgoing = outgoing.where(filter=FieldFilter('queuedAt', '<', end))
+    unknown = incoming.where(filter=FieldFilter('isRegistered', '==', False))
+
+    return {
+        'incoming': _count(incoming),
+        'outgoing': _count(outgoing),
+        'unknown': _count(unknown)
+    }
+
+
+def count_active_users():
+    """Count active users (from the user directory when loaded)."""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+    directory = get_user_directory()
+    if directory is not None:
+        return sum(1 for _, data in directory.all_users() if data.get('status') == 'active')
+
+    query = get_db().collection('users').where(filter=FieldFilter('status', '==', 'active'))
+    return _count(query)
+
+
+def get_message_stats(simulated, hours=24):
+    """Get message counts for the last `hours` hours.
+
+    Reads the hourly counter documents in one batched get. If none exist yet
+    (counters not populated), falls back to count() aggregation queries.
+
+    Returns:
+        dict: incoming, outgoing, unknown counts and the source used.
+    """
+    db = get_db()
+    refs = [db.collection(STATS_COLLECTION).document(_bucket_id(hour, simulated))
+            for hour in _bucket_hours(hours)]
+
+    totals = dict.fromkeys(COUNTER_FIELDS, 0)
+    found = False
+    for snapshot in db.get_all(refs):
+        if not snapshot.exists:
+            continue
+        found = True
+        data = snapshot.to_dict()
+        for field in COUNTER_FIELDS:
+            totals[field] += data.get(field, 0)
+
+    if found:
+        totals['source'] = 'counters'
+        return totals
+
+    start = _bucket_hours(hours)[-1]
+    totals = _count_messages(simulated, start)
+    totals['source'] = 'aggregation'
+    return totals
+
+
+def recompute_message_stats(simulated, hours=24):
+    """Rebuild the hourly counters for the last `hours` hours from count() queries.
+
+    Overwrites each bucket, correcting any drift (e.g. from failed increments).
+
+    Returns:
+        int: Number of buckets rewritten.
+    """
+    db = get_db()
+    batch = db.batch()
+    for hour in _bucket_hours(hours):
+        counts = _count_messages(simulated, hour, hour + timedelta(hours=1))
+        ref = db.collection(STATS_COLLECTION).document(_bucket_id(hour, simulated))
+        batch.set(ref, {**counts, 'hour': hour, 'simulated': simulated})
+    batch.commit()
+
+    logger.info(f"Message stats recomputed: {hours} hourly buckets simulated={simulated}")
+    return hours
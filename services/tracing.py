@@ -0,0 +1,178 @@
+"""Per-request span tracing and profiling.
+
+Service calls in services/firebase.py and services/twilio_sms.py, and every
+Firestore call made through get_db(), record spans into the current
+request's trace. A finished trace becomes a Server-Timing header and one
+structured log line, so a slow webhook shows where its time went.
+
+A trace only exists for requests that asked for one (TRACING_ENABLED=true
+traces every request); otherwise a span is a single context-variable lookup.
+Profiled requests (see routes/tracing.py) are always traced.
+"""
+
+import contextvars
+import cProfile
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Spans of the request being handled: list of (name, seconds), or None when not tracing
+_spans = contextvars.ContextVar('trace_spans', default=None)
+
+# Held while a profile is running (one at a time per process)
+_profile_lock = threading.Lock()
+
+
+def is_tracing_enabled():
+    """Check if every request is traced (TRACING_ENABLED, default false)."""
+    return os.environ.get('TRACING_ENABLED', 'false').lower() == 'true'
+
+
+def start_trace():
+    """Start collecting spans for the current request."""
+    _spans.set([])
+
+
+def end_trace():
+    """Stop collecting spans and return them (None if no trace was started)."""
+    spans = _spans.get()
+    _spans.set(None)
+    return spans
+
+
+def record_span(name, seconds):
+    """Add a span to the current trace, if there is one."""
+    spans = _spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+@contextmanager
+def span(name):
+    """Time a block as a span of the current trace."""
+    if _spans.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+def traced(name):
+    """Decorator recording each call of a (sync or async) function as a span."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _spans.get() is None:
+                    return await fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    record_span(name, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _spans.get() is None:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record_span(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _summarize(spans):
+    """Total milliseconds and call count per span name, in first-call order."""
+    summary = {}
+    for name, seconds in spans:
+        entry = summary.setdefault(name, {'ms': 0.0, 'calls': 0})
+        entry['ms'] += seconds * 1000
+        entry['calls'] += 1
+    for entry in summary.values():
+        entry['ms'] = round(entry['ms'], 1)
+    return summary
+
+
+def server_timing_header(spans, total_seconds):
+    """Format spans as a Server-Timing header value (spans can nest, so they may sum past total)."""
+    parts = []
+    for name, entry in _summarize(spans).items():
+        part = f"{name};dur={entry['ms']}"
+        if entry['calls'] > 1:
+            part += f';desc="{entry["calls"]} calls"'
+        parts.append(part)
+    parts.append(f"total;dur={round(total_seconds * 1000, 1)}")
+    return ', '.join(parts)
+
+
+def log_trace(route, method, status, spans, total_seconds):
+    """Log a finished trace as one JSON line."""
+    logger.info("Trace " + json.dumps({
+        'route': route,
+        'method': method,
+        'status': status,
+        'totalMs': round(total_seconds * 1000, 1),
+        'spans': _summarize(spans)
+    }))
+
+
+def start_profile():
+    """Start profiling the calling thread, unless a profile is already running.
+
+    One profile runs at a time per process: from Python 3.12 a second active
+    cProfile profiler makes enable() raise ValueError.
+
+    Returns:
+        cProfile.Profile or None: The profiler (end it with stop_profile() or
+        dump_profile()), or None if profiling was skipped.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Another profiler (e.g. a debugger's) is active
+        _profile_lock.release()
+        logger.warning(f"Profiling skipped: {e}")
+        return None
+    return profiler
+
+
+def stop_profile(profiler):
+    """Stop a profiler from start_profile() and let the next request profile."""
+    try:
+        profiler.disable()
+    finally:
+        _profile_lock.release()
+
+
+def dump_profile(profiler, label):
+    """Stop a profiler and write its stats to PROFILE_DIR.
+
+    Returns:
+        str: Path of the .prof file (open with pstats or snakeviz).
+    """
+    stop_profile(profiler)
+    directory = os.environ.get('PROFILE_DIR', '/tmp/sms-profiles')
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{label}-{os.getpid()}-{uuid.uuid4().hex[:6]}.prof"
+    path = os.path.join(directory, filename)
+    profiler.dump_stats(path)
+    logger.info(f"Profile written to {path}")
+    return path
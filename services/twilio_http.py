@@ -0,0 +1,126 @@
+"""Pooled, instrumented HTTP transport for the Twilio client.
+
+Twilio's default client gives no say over connection reuse or timeouts. This
+transport keeps a keep-alive requests.Session with a sized connection pool,
+so steady-state sends reuse warm TLS connections, bounds every call with
+connect/read timeouts, and retries only requests that are safe to repeat.
+
+The aiohttp equivalent for the async server lives in twilio_http_async, so
+aiohttp is only imported when that server runs.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from twilio.http.http_client import TwilioHttpClient
+
+logger = logging.getLogger(__name__)
+
+# Methods safe to retry after the request may have reached Twilio.
+# POST (message create) is only retried on connect errors, when nothing was sent.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'DELETE'])
+
+
+def _get_settings():
+    """Read transport settings from the environment."""
+    return {
+        'pool_size': int(os.environ.get('TWILIO_HTTP_POOL_SIZE', 10)),
+        'connect_timeout': float(os.environ.get('TWILIO_HTTP_CONNECT_TIMEOUT', 5)),
+        'read_timeout': float(os.environ.get('TWILIO_HTTP_READ_TIMEOUT', 15)),
+        'retries': int(os.environ.get('TWILIO_HTTP_RETRIES', 2))
+    }
+
+
+class PooledTwilioHttpClient(TwilioHttpClient):
+    """TwilioHttpClient on a pooled keep-alive session with latency and reuse stats."""
+
+    def __init__(self, pool_size=10, connect_timeout=5.0, read_timeout=15.0, retries=2):
+        super().__init__(pool_connections=True)
+        # (connect, read) tuple; the base class only validates a single number
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=IDEMPOTENT_METHODS,
+            backoff_factor=0.3,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self.adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size,
+                                   max_retries=retry, pool_block=False)
+        self.session = Session()
+        self.session.mount('https://', self.adapter)
+
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = None
+
+    def request(self, method, url, params=None, data=None, headers=None, auth=None,
+                timeout=None, allow_redirects=False):
+        """Make a request and record its latency."""
+        start = time.monotonic()
+        failed = False
+        try:
+            response = super().request(method, url, params=params, data=data, headers=headers,
+                                       auth=auth, timeout=timeout, allow_redirects=allow_redirects)
+            failed = response.status_code >= 500
+            return response
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            with self._stats_lock:
+                self.calls += 1
+                self.errors += failed
+                self.total_latency += elapsed
+                self.max_latency = max(self.max_latency, elapsed)
+                self.last_latency = elapsed
+
+    def _pool_counts(self):
+        """Sum connections opened and requests served across the adapter's pools."""
+        opened = served = 0
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                served += pool.num_requests
+        return opened, served
+
+    def stats(self):
+        """Get latency and connection-reuse metrics."""
+        opened, served = self._pool_counts()
+        with self._stats_lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'avgLatencyMs': round(self.total_latency / self.calls * 1000, 1) if self.calls else 0.0,
+                'maxLatencyMs': round(self.max_latency * 1000, 1),
+                'lastLatencyMs': round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+                'connectionsOpened': opened,
+                'requestsServed': served,
+                'connectionReuse': round(1 - opened / served, 3) if served else None
+            }
+
+
+def build_http_client():
+    """Build the pooled transport from TWILIO_HTTP_* settings."""
+    settings = _get_settings()
+    http_client = PooledTwilioHttpClient(**settings)
+    logger.info(
+        f"Twilio HTTP transport: pool={settings['pool_size']} "
+        f"timeouts={settings['connect_timeout']}/{settings['read_timeout']}s retries={settings['retries']}"
+    )
+    return http_client
@@ -0,0 +1,103 @@
+"""Pooled, instrumented aiohttp transport for the async Twilio client.
+
+The async server's counterpart of twilio_http.PooledTwilioHttpClient, with
+the same TWILIO_HTTP_* settings. Kept in its own module so the sync app never
+imports aiohttp.
+"""
+
+import asyncio
+import time
+
+from aiohttp import BasicAuth, ClientConnectorError, ClientSession, ClientTimeout, TCPConnector
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from twilio.http.response import Response
+
+from services.twilio_http import _get_settings
+
+
+class PooledAsyncTwilioHttpClient(AsyncTwilioHttpClient):
+    """AsyncTwilioHttpClient on a sized keep-alive aiohttp session with latency stats.
+
+    Must be created on the event loop that uses it.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=5.0, read_timeout=15.0, retries=2):
+        super().__init__(pool_connections=False)
+        self.retries = retries
+        self.client_timeout = ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.session = ClientSession(connector=TCPConnector(limit=pool_size), timeout=self.client_timeout)
+        self.calls = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = None
+
+    async def request(self, method, url, params=None, data=None, headers=None, auth=None,
+                      timeout=None, allow_redirects=False):
+        """Make a request and record its latency.
+
+        Only connect errors are retried: nothing reached Twilio, so it is safe for any method.
+
+        The Twilio client always passes timeout=None, which aiohttp takes as "no
+        timeout" over the session's, so requests carry the client's own connect
+        and read timeouts; an explicit timeout replaces the read timeout.
+        """
+        if timeout is not None and timeout <= 0:
+            raise ValueError(timeout)
+        kwargs = {
+            'method': method.upper(),
+            'url': url,
+            'params': params,
+            'data': data,
+            'headers': headers,
+            'auth': BasicAuth(login=auth[0], password=auth[1]) if auth is not None else None,
+            'timeout': self.client_timeout if timeout is None else ClientTimeout(
+                sock_connect=self.client_timeout.sock_connect, sock_read=timeout
+            ),
+            'allow_redirects': allow_redirects
+        }
+
+        start = time.monotonic()
+        failed = False
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await self._send(kwargs)
+                    break
+                except ClientConnectorError:
+                    if attempt == self.retries:
+                        raise
+                    await asyncio.sleep(0.3 * 2 ** attempt)
+            failed = response.status_code >= 500
+            return response
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            self.calls += 1
+            self.errors += failed
+            self.total_latency += elapsed
+            self.max_latency = max(self.max_latency, elapsed)
+            self.last_latency = elapsed
+
+    async def _send(self, kwargs):
+        self.log_request(kwargs)
+        async with self.session.request(**kwargs) as raw:
+            self.log_response(raw.status, raw)
+            return Response(raw.status, await raw.text(), raw.headers)
+
+    def stats(self):
+        """Get latency metrics."""
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avgLatencyMs': round(self.total_latency / self.calls * 1000, 1) if self.calls else 0.0,
+            'maxLatencyMs': round(self.max_latency * 1000, 1),
+            'lastLatencyMs': round(self.last_latency * 1000, 1) if self.last_latency is not None else None
+        }
+
+
+def build_async_http_client():
+    """Build the async transport from TWILIO_HTTP_* settings (call on the event loop)."""
+    return PooledAsyncTwilioHttpClient(**_get_settings())
@@ -1,17 +1,31 @@
 """Twilio SMS service."""
 
+import asyncio
 import logging
 import os
+import time
 import uuid
 
-from twilio.rest import Client as TwilioClient
+from twilio.base.exceptions import TwilioRestException
 
 from services.firebase import mask_phone_number
+from services.metrics import instrument_send, observe_token_wait, timed_twilio_create
+from services.tracing import traced
+from services.ratelimit import get_rate_limiter
+from services.delivery_status import get_status_callback_url, remember_sid
+from services.senders import (
+    get_messaging_service_rate, get_messaging_service_sid, get_sender_pool, SENDER_ERROR_CODES
+)
 
 logger = logging.getLogger(__name__)
 
 # Global client instance
 _client = None
+_http_client = None
+
+# Async client for the async server (bound to its event loop)
+_async_client = None
+_async_http_client = None
 
 
 def is_simulation_mode():
@@ -21,7 +35,7 @@ def is_simulation_mode():
 
 def init_twilio():
     """Initialize Twilio client."""
-    global _client
+    global _client, _http_client
 
     if is_simulation_mode():
         logger.info("Simulation mode enabled - Twilio client not initialized")
@@ -31,7 +45,11 @@ def init_twilio():
     auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
 
     if account_sid and auth_token:
-        _client = TwilioClient(account_sid, auth_token)
+        from twilio.rest import Client as TwilioClient  # Heavy; not needed to start serving
+        from services.twilio_http import build_http_client  # Imports requests
+
+        _http_client = build_http_client()
+        _client = TwilioClient(account_sid, auth_token, http_client=_http_client)
         logger.info("Twilio client initialized")
     else:
         logger.warning("Twilio credentials not configured")
@@ -45,6 +63,62 @@ def get_twilio_client():
     return _client
 
 
+def get_async_twilio_client():
+    """Get the async Twilio client, creating it on first use (call on the event loop)."""
+    global _async_client, _async_http_client
+    if _async_client is None and not is_simulation_mode():
+        account_sid = os.environ.get('TWILIO_ACCOUNT_SID')
+        auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
+        if not (account_sid and auth_token):
+            logger.warning("Twilio credentials not configured")
+            return None
+        from twilio.rest import Client as TwilioClient
+        from services.twilio_http_async import build_async_http_client
+
+        _async_http_client = build_async_http_client()
+        _async_client = TwilioClient(account_sid, auth_token, http_client=_async_http_client)
+        logger.info("Async Twilio client initialized")
+    return _async_client
+
+
+def ping_twilio():
+    """Make a cheap authenticated request (account fetch) to Twilio.
+
+    Used to warm the pooled connection and by the health prober.
+
+    Returns:
+        bool: True if Twilio answered, False if there is no client (simulation mode
+              or no credentials).
+
+    Raises:
+        Exception if the request fails.
+    """
+    client = get_twilio_client()
+    if client is None:
+        return False
+    client.api.v2010.accounts(client.account_sid).fetch()
+    return True
+
+
+async def close_async_twilio_client():
+    """Close the async client's HTTP session (on async server shutdown)."""
+    global _async_client, _async_http_client
+    if _async_http_client is not None:
+        await _async_http_client.close()
+    _async_client = None
+    _async_http_client = None
+
+
+def get_twilio_http_stats():
+    """Get Twilio transport latency and connection-reuse stats, or None if not in use."""
+    if _http_client is None and _async_http_client is None:
+        return None
+    stats = _http_client.stats() if _http_client is not None else {}
+    if _async_http_client is not None:
+        stats['async'] = _async_http_client.stats()
+    return stats
+
+
 class SimulatedMessage:
     """Simulated Twilio message object for simulation mode."""
 
@@ -55,44 +129,203 @@ class SimulatedMessage:
         self.status = status
 
 
-def send_sms(to_number, message_body, simulate_status='sent'):
+def _send_simulated(to_number, message_body, simulate_status='sent'):
+    """Log a send instead of making it (simulation mode)."""
+    logger.info(f"[SIMULATION] SMS to {mask_phone_number(to_number)}: {message_body[:50]}...")
+
+    if simulate_status == 'failed':
+        raise SimulatedFailure("Simulated send failure")
+
+    message = SimulatedMessage(to_number, message_body, status=simulate_status)
+    logger.info(f"[SIMULATION] SMS logged with SID: {message.sid}, status: {simulate_status}")
+    return message
+
+
+def _service_delay(messaging_service_sid, wait, timeout):
+    """Reserve a Messaging Service send token; returns the seconds to wait before sending."""
+    # Twilio picks (and keeps) the sender and queues excess sends; only
+    # pace locally when the service's combined rate is configured
+    limiter = get_rate_limiter()
+    service_rate = get_messaging_service_rate()
+    if limiter is None or service_rate is None:
+        return 0.0
+    rate, burst = service_rate
+    delay = limiter.reserve(messaging_service_sid, blocking=wait, timeout=timeout, rate=rate, burst=burst)
+    observe_token_wait('service', delay)
+    return delay
+
+
+def _create_params(to_number, message_body, status_callback, from_number=None, messaging_service_sid=None):
+    """Arguments for messages.create(): from a sender number or through the Messaging Service."""
+    params = {'body': message_body, 'to': to_number, 'status_callback': status_callback}
+    if messaging_service_sid:
+        params['messaging_service_sid'] = messaging_service_sid
+    else:
+        params['from_'] = from_number
+    return params
+
+
+def _fail_over(pool, from_number, tried, error):
+    """Record a failed pool send; returns True if it should be retried from another sender."""
+    pool.record_failure(from_number, error)
+    if not isinstance(error, TwilioRestException):
+        return False
+    tried.append(from_number)
+    # Sender rejected before sending, so another sender can safely retry once
+    if error.code in SENDER_ERROR_CODES and len(tried) < 2 and len(tried) < len(pool.numbers):
+        logger.warning(f"Sender {from_number} rejected send ({error.code}), failing over")
+        return True
+    return False
+
+
+def _reserve_sender(pool, to_number, wait, timeout, tried):
+    """Pick the recipient's sender and reserve its token: (number, seconds to wait)."""
+    from_number, delay = pool.reserve(to_number, wait=wait, timeout=timeout, exclude=tried)
+    if from_number is None:
+        raise ValueError('No sender number configured')
+    observe_token_wait('pool', delay)
+    return from_number, delay
+
+
+def _sent(message, to_number, message_id):
+    """Remember the SID for status callbacks and log the send."""
+    remember_sid(message.sid, message_id)
+    logger.info(f"SMS sent to {mask_phone_number(to_number)}, SID: {message.sid}")
+    return message
+
+
+@traced('twilio.send_sms')
+@instrument_send(is_simulation_mode)
+def send_sms(to_number, message_body, simulate_status='sent', wait=True, message_id=None):
     """
     Send an SMS message.
 
+    Sends are sharded across the sender-number pool (sticky per recipient) and
+    paced by each sender's token bucket, or go through the Messaging Service
+    when TWILIO_MESSAGING_SERVICE_SID is set.
+
     Args:
         to_number: Recipient phone number (E.164 format)
         message_body: Message text
         simulate_status: Status to simulate ('sent', 'failed', 'queued') - only used in simulation mode
+        wait: Block (up to SMS_RATE_LIMIT_TIMEOUT seconds) for a send token; False fails fast
+        message_id: outgoingMessages document ID, used to route delivery-status callbacks
 
     Returns:
         Twilio message object (or SimulatedMessage in simulation mode) with .sid attribute
 
     Raises:
         Exception if sending fails (in production mode)
+        RateLimitExceeded if no send token is available in time (in production mode)
         SimulatedFailure if simulate_status is 'failed' (in simulation mode)
     """
     if is_simulation_mode():
-        logger.info(f"[SIMULATION] SMS to {mask_phone_number(to_number)}: {message_body[:50]}...")
-
-        if simulate_status == 'failed':
-            raise SimulatedFailure("Simulated send failure")
-
-        message = SimulatedMessage(to_number, message_body, status=simulate_status)
-        logger.info(f"[SIMULATION] SMS logged with SID: {message.sid}, status: {simulate_status}")
-        return message
+        return _send_simulated(to_number, message_body, simulate_status)
 
     # Production mode - real Twilio API call
     client = get_twilio_client()
-    from_number = os.environ.get('TWILIO_PHONE_NUMBER')
+    timeout = float(os.environ.get('SMS_RATE_LIMIT_TIMEOUT', 30))
+    status_callback = get_status_callback_url(message_id)
 
-    message = client.messages.create(
-        body=message_body,
-        from_=from_number,
-        to=to_number
-    )
+    messaging_service_sid = get_messaging_service_sid()
+    if messaging_service_sid:
+        delay = _service_delay(messaging_service_sid, wait, timeout)
+        if delay > 0:
+            time.sleep(delay)
+        with timed_twilio_create():
+            message = client.messages.create(**_create_params(
+                to_number, message_body, status_callback, messaging_service_sid=messaging_service_sid
+            ))
+    else:
+        message = _send_from_pool(client, to_number, message_body, wait, timeout, status_callback)
 
-    logger.info(f"SMS sent to {mask_phone_number(to_number)}, SID: {message.sid}")
-    return message
+    return _sent(message, to_number, message_id)
+
+
+@traced('twilio.send_sms')
+@instrument_send(is_simulation_mode)
+async def send_sms_async(to_number, message_body, message_id=None):
+    """Async send_sms() for the async server.
+
+    Rate-limit delays are awaited and the Twilio call goes through the async
+    transport, so a send never holds a thread.
+
+    Args:
+        to_number: Recipient phone number (E.164 format)
+        message_body: Message text
+        message_id: outgoingMessages document ID, used to route delivery-status callbacks
+
+    Returns:
+        Twilio message object (or SimulatedMessage in simulation mode) with .sid attribute
+
+    Raises:
+        Exception if sending fails
+        RateLimitExceeded if no send token is available within SMS_RATE_LIMIT_TIMEOUT
+    """
+    if is_simulation_mode():
+        return _send_simulated(to_number, message_body)
+
+    client = get_async_twilio_client()
+    if client is None:
+        raise ValueError('Twilio credentials not configured')
+    timeout = float(os.environ.get('SMS_RATE_LIMIT_TIMEOUT', 30))
+    status_callback = get_status_callback_url(message_id)
+
+    messaging_service_sid = get_messaging_service_sid()
+    if messaging_service_sid:
+        delay = _service_delay(messaging_service_sid, True, timeout)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        with timed_twilio_create():
+            message = await client.messages.create_async(**_create_params(
+                to_number, message_body, status_callback, messaging_service_sid=messaging_service_sid
+            ))
+    else:
+        message = await _send_from_pool_async(client, to_number, message_body, timeout, status_callback)
+
+    return _sent(message, to_number, message_id)
+
+
+def _send_from_pool(client, to_number, message_body, wait, timeout, status_callback=None):
+    """Send from the recipient's sender, failing over once if Twilio rejects the sender."""
+    pool = get_sender_pool()
+    tried = []
+    while True:
+        from_number, delay = _reserve_sender(pool, to_number, wait, timeout, tried)
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            with timed_twilio_create():
+                message = client.messages.create(**_create_params(
+                    to_number, message_body, status_callback, from_number=from_number
+                ))
+        except Exception as e:
+            if _fail_over(pool, from_number, tried, e):
+                continue
+            raise
+        pool.record_success(from_number)
+        return message
+
+
+async def _send_from_pool_async(client, to_number, message_body, timeout, status_callback=None):
+    """Async _send_from_pool(): delays are awaited and the send goes through create_async()."""
+    pool = get_sender_pool()
+    tried = []
+    while True:
+        from_number, delay = _reserve_sender(pool, to_number, True, timeout, tried)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            with timed_twilio_create():
+                message = await client.messages.create_async(**_create_params(
+                    to_number, message_body, status_callback, from_number=from_number
+                ))
+        except Exception as e:
+            if _fail_over(pool, from_number, tried, e):
+                continue
+            raise
+        pool.record_success(from_number)
+        return message
 
 
 class SimulatedFailure(Exception):
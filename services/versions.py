@@ -0,0 +1,118 @@
+"""Collection version counters and a short-lived API response cache.
+
+Every write path bumps a version counter for the collection it changed. The
+counters live in small flock-protected files under VERSION_DIR, so all
+workers on the host see each other's bumps. The live feed and user directory
+listeners also bump them for changes made elsewhere.
+
+List APIs derive their ETag from these counters (plus the query parameters),
+so an unchanged list answers If-None-Match with 304 without reading or
+serializing anything. Rendered bodies are kept for API_CACHE_TTL seconds,
+keyed by the same ETag, so a bump invalidates them.
+"""
+
+import fcntl
+import logging
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_COUNTER = struct.Struct('Q')
+
+# Collections list APIs depend on; bumps for other collections are ignored
+TRACKED_COLLECTIONS = frozenset(['incomingMessages', 'outgoingMessages', 'users', 'conversations'])
+
+
+def _version_dir():
+    directory = os.environ.get('VERSION_DIR') or os.path.join(tempfile.gettempdir(), 'sms-versions')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _path(collection):
+    return os.path.join(_version_dir(), f"{collection}.version")
+
+
+def bump_version(collection):
+    """Record a change to a collection. Never raises."""
+    if collection not in TRACKED_COLLECTIONS:
+        return
+    try:
+        fd = os.open(_path(collection), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.pread(fd, _COUNTER.size, 0)
+            # New counters start at a random value so a wiped directory doesn't reuse ETags
+            value = _COUNTER.unpack(raw)[0] + 1 if len(raw) == _COUNTER.size else random.getrandbits(32)
+            os.pwrite(fd, _COUNTER.pack(value), 0)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.error(f"Failed to bump {collection} version: {e}")
+        return
+    _response_cache.clear()
+
+
+def get_version(collection):
+    """Get a collection's current version (0 if it has never been bumped)."""
+    try:
+        with open(_path(collection), 'rb') as f:
+            raw = f.read(_COUNTER.size)
+    except OSError:
+        return 0
+    return _COUNTER.unpack(raw)[0] if len(raw) == _COUNTER.size else 0
+
+
+class ResponseCache:
+    """Small TTL cache of rendered response bodies keyed by ETag."""
+
+    def __init__(self, ttl=5.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(etag, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, etag, body):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[etag] = (time.monotonic() + self.ttl, body)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+_response_cache = ResponseCache(
+    ttl=float(os.environ.get('API_CACHE_TTL', 5)),
+    max_entries=int(os.environ.get('API_CACHE_MAX_ENTRIES', 256))
+)
+
+
+def get_response_cache():
+    """Get the process-wide response cache."""
+    return _response_cache
@@ -0,0 +1,245 @@
+"""Write-behind buffer for Firestore.
+
+Queues document writes made on request threads and group-commits them from a
+background thread with WriteBatch. Batches are flushed when they reach
+WRITE_BEHIND_BATCH_SIZE writes, when the oldest write is WRITE_BEHIND_MAX_AGE
+seconds old, and when the worker exits. Callers allocate document IDs up front
+(collection.document()), so they can return the ID before the write lands.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from services.firebase import get_async_db, get_db
+from services.versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+# Firestore limit on writes per batch
+MAX_BATCH_WRITES = 500
+
+# Commit attempts before a batch is dropped
+COMMIT_ATTEMPTS = 3
+
+
+def is_write_behind_enabled():
+    """Check if write-behind buffering is enabled."""
+    return os.environ.get('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+
+
+class WriteBehindBuffer:
+    """Bounded queue of pending writes with a group-committing flusher thread."""
+
+    def __init__(self, batch_size=100, max_age=0.5, queue_size=2000, put_timeout=5.0):
+        self.batch_size = min(batch_size, MAX_BATCH_WRITES)
+        self.max_age = max_age
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self.enqueued = 0
+        self.committed = 0
+        self.failed = 0
+        self.overflow = 0
+        self.batches = 0
+
+    def start(self):
+        """Start the flusher thread."""
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        logger.info(f"Write-behind buffer started: batch={self.batch_size} max_age={self.max_age}s")
+
+    def set(self, ref, data, merge=False):
+        """Queue ref.set(data, merge=merge).
+
+        Blocks for up to put_timeout seconds while the queue is full
+        (backpressure), then writes directly rather than losing the write.
+        """
+        if self._stopped:
+            ref.set(data, merge=merge)
+            bump_version(ref.parent.id)
+            return
+
+        with self._cond:
+            self.enqueued += 1
+        try:
+            self._queue.put((ref, data, merge, time.monotonic()), timeout=self.put_timeout)
+        except queue.Full:
+            logger.warning("Write-behind queue full - writing directly")
+            with self._cond:
+                self.enqueued -= 1
+                self.overflow += 1
+            ref.set(data, merge=merge)
+            bump_version(ref.parent.id)
+
+    def _run(self):
+        """Flusher loop: collect a batch by size or age, then commit it."""
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = first[3] + self.max_age
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                break
+
+    def _commit(self, items):
+        """Commit queued writes in one WriteBatch, retrying with backoff."""
+        for attempt in range(1, COMMIT_ATTEMPTS + 1):
+            try:
+                batch = get_db().batch()
+                for ref, data, merge, _ in items:
+                    batch.set(ref, data, merge=merge)
+                batch.commit()
+                for collection in {ref.parent.id for ref, _, _, _ in items}:
+                    bump_version(collection)
+                with self._cond:
+                    self.committed += len(items)
+                    self.batches += 1
+                    self._cond.notify_all()
+                return
+            except Exception as e:
+                logger.error(f"Write-behind commit failed (attempt {attempt}/{COMMIT_ATTEMPTS}): {e}")
+                if attempt < COMMIT_ATTEMPTS:
+                    time.sleep(0.5 * 2 ** (attempt - 1))
+
+        logger.error(f"Write-behind dropped {len(items)} writes: {[ref.path for ref, _, _, _ in items]}")
+        with self._cond:
+            self.failed += len(items)
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until every write queued so far has been committed (or dropped).
+
+        Returns:
+            bool: True if the buffer drained, False if the timeout expired.
+        """
+        with self._cond:
+            target = self.enqueued
+            return self._cond.wait_for(lambda: self.committed + self.failed >= target, timeout=timeout)
+
+    def stop(self, timeout=None):
+        """Flush pending writes and stop the flusher; later writes go direct."""
+        if self._stopped:
+            return
+        drained = self.flush(timeout=timeout)
+        self._stopped = True
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        if not drained:
+            logger.warning("Write-behind drain timed out with writes still pending")
+        logger.info("Write-behind buffer stopped")
+
+    def stats(self):
+        """Get buffer counters."""
+        with self._cond:
+            return {
+                'pending': self.enqueued - self.committed - self.failed,
+                'committed': self.committed,
+                'failed': self.failed,
+                'overflow': self.overflow,
+                'batches': self.batches
+            }
+
+
+# Global buffer (created on first write so the thread starts in the worker process)
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_buffer():
+    """Get the write-behind buffer, or None if write-behind is disabled."""
+    global _buffer
+
+    if not is_write_behind_enabled():
+        return None
+
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer(
+                batch_size=int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 100)),
+                max_age=float(os.environ.get('WRITE_BEHIND_MAX_AGE', 0.5)),
+                queue_size=int(os.environ.get('WRITE_BEHIND_QUEUE_SIZE', 2000))
+            )
+            _buffer.start()
+        return _buffer
+
+
+def write(ref, data, merge=False):
+    """Write a document through the buffer when enabled, otherwise directly.
+
+    Writes to the same document are applied in the order they were made, and
+    the collection's version is bumped once the write lands.
+
+    Args:
+        ref: DocumentReference (use collection.document() to pre-allocate an ID).
+        data: Document data.
+        merge: Merge into an existing document instead of replacing it.
+    """
+    buffer = get_write_buffer()
+    if buffer is None:
+        ref.set(data, merge=merge)
+        bump_version(ref.parent.id)
+    else:
+        buffer.set(ref, data, merge=merge)
+
+
+async def write_async(ref, data, merge=False):
+    """Async write(): enqueues through the buffer when enabled, otherwise awaits the write.
+
+    Args:
+        ref: DocumentReference from the sync client (only its path is used).
+        data: Document data.
+        merge: Merge into an existing document instead of replacing it.
+    """
+    buffer = get_write_buffer()
+    if buffer is None:
+        collection = ref.parent.id
+        await get_async_db().collection(collection).document(ref.id).set(data, merge=merge)
+        bump_version(collection)
+    else:
+        buffer.set(ref, data, merge=merge)
+
+
+def flush(timeout=None):
+    """Wait for buffered writes to be committed (no-op when disabled)."""
+    if _buffer is None:
+        return True
+    return _buffer.flush(timeout=timeout)
+
+
+def get_write_buffer_stats():
+    """Get write-behind counters, or None if the buffer is not running."""
+    if _buffer is None:
+        return None
+    return _buffer.stats()
+
+
+def shutdown(timeout=None):
+    """Drain the buffer (called on worker exit)."""
+    if _buffer is None:
+        return
+    if timeout is None:
+        timeout = float(os.environ.get('WRITE_BEHIND_DRAIN_TIMEOUT', 10))
+    _buffer.stop(timeout=timeout)
+
+
+atexit.register(shutdown)
@@ -0,0 +1,88 @@
+"""Dispatched acknowledgments, made deterministic with DISPATCH_MODE=sync and flush()."""
+
+import threading
+
+import pytest
+
+from services import dispatch, inbound
+
+
+class FakeRef:
+    def __init__(self, store, doc_id):
+        self.store = store
+        self.id = doc_id
+
+
+class FakeCollection:
+    def __init__(self, store):
+        self.store = store
+
+    def document(self, doc_id=None):
+        return FakeRef(self.store, doc_id or f"doc{len(self.store)}")
+
+
+class FakeDB:
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        return FakeCollection(self.docs)
+
+
+class FakeMessage:
+    sid = 'SM123'
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Route inbound's Firestore writes to a dict and stub out its other side effects."""
+    db = FakeDB()
+
+    def write(ref, data, merge=False):
+        doc = ref.store.setdefault(ref.id, {})
+        if not merge:
+            doc.clear()
+        doc.update(data)
+
+    monkeypatch.setenv('ACK_MODE', 'dispatch')
+    monkeypatch.setattr(inbound, 'get_db', lambda: db)
+    monkeypatch.setattr(inbound, 'write', write)
+    monkeypatch.setattr(inbound, 'record_conversation_message', lambda *args, **kwargs: None)
+    monkeypatch.setattr(inbound, 'record_message_stats', lambda *args, **kwargs: None)
+    monkeypatch.setattr(inbound, 'index_message', lambda *args, **kwargs: None)
+    yield db
+    dispatch.shutdown()
+
+
+def _receive():
+    return inbound.handle_incoming_message('+15555550100', 'user-1', True, 'user-1', 'hello', 'SMin')
+
+
+def test_sync_mode_sets_response_sent_by_flush(db, monkeypatch):
+    monkeypatch.setenv('DISPATCH_MODE', 'sync')
+    monkeypatch.setattr(inbound, 'send_sms', lambda to, body: FakeMessage())
+
+    result = _receive()
+    assert dispatch.flush(timeout=5)
+
+    assert result['responsePending']
+    assert db.docs[result['messageId']]['responseSent'] is True
+
+
+def test_background_ack_sets_response_sent_after_flush(db, monkeypatch):
+    monkeypatch.setenv('DISPATCH_MODE', 'background')
+    release = threading.Event()
+
+    def send_sms(to, body):
+        release.wait(5)
+        return FakeMessage()
+
+    monkeypatch.setattr(inbound, 'send_sms', send_sms)
+
+    result = _receive()
+    assert db.docs[result['messageId']]['responseSent'] is False
+
+    release.set()
+    assert dispatch.flush(timeout=5)
+
+    assert db.docs[result['messageId']]['responseSent'] is True
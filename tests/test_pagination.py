@@ -0,0 +1,130 @@
+"""paginate_merged() over fake Firestore queries, with ties across streams."""
+
+import operator
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from routes.pagination import InvalidCursor, paginate_merged
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+OPS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '==': operator.eq}
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def get(self, field):
+        return self._data.get(field)
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    """The query subset paginate_merged() uses: where, order_by, start_after, limit, stream."""
+
+    def __init__(self, docs, filters=(), orders=(), start=None, count=None):
+        self.docs = docs
+        self.filters = filters
+        self.orders = orders
+        self.start = start
+        self.count = count
+
+    def _with(self, **changes):
+        state = dict(filters=self.filters, orders=self.orders, start=self.start, count=self.count)
+        state.update(changes)
+        return FakeQuery(self.docs, **state)
+
+    def where(self, filter):
+        return self._with(filters=self.filters + (filter,))
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._with(orders=self.orders + ((field, direction),))
+
+    def start_after(self, values):
+        return self._with(start=values)
+
+    def limit(self, count):
+        return self._with(count=count)
+
+    def _key(self, doc):
+        return tuple(doc.id if field == '__name__' else doc.get(field) for field, _ in self.orders)
+
+    def stream(self):
+        docs = [doc for doc in self.docs
+                if all(OPS[f.op_string](doc.get(f.field_path), f.value) for f in self.filters)]
+        reverse = bool(self.orders) and self.orders[0][1] == 'DESCENDING'
+        docs.sort(key=self._key, reverse=reverse)
+        if self.start is not None:
+            boundary = tuple(self.start[field] for field, _ in self.orders)
+            docs = [doc for doc in docs if (self._key(doc) < boundary if reverse else self._key(doc) > boundary)]
+        return iter(docs[:self.count] if self.count is not None else docs)
+
+
+def _streams():
+    """Two streams with several rows at the same times, in and across streams."""
+    incoming = [FakeDoc(f"in{i}", {'timestamp': T0 + timedelta(minutes=i // 2)}) for i in range(6)]
+    outgoing = [FakeDoc(f"out{i}", {'queuedAt': T0 + timedelta(minutes=i // 3)}) for i in range(6)]
+    streams = [('incoming', FakeQuery(incoming), 'timestamp'), ('outgoing', FakeQuery(outgoing), 'queuedAt')]
+    expected = sorted(
+        [((doc.get('timestamp'), 0, doc.id), ('incoming', doc.id)) for doc in incoming]
+        + [((doc.get('queuedAt'), 1, doc.id), ('outgoing', doc.id)) for doc in outgoing]
+    )
+    return streams, [row for _, row in expected]
+
+
+def _ids(rows):
+    return [(kind, doc_id) for kind, doc_id, _ in rows]
+
+
+def _walk_forward(streams, descending, limit):
+    pages = []
+    rows, next_cursor, prev_cursor = paginate_merged(streams, descending, limit)
+    assert prev_cursor is None
+    pages.append(_ids(rows))
+    while next_cursor:
+        rows, next_cursor, prev_cursor = paginate_merged(streams, descending, limit, cursor=next_cursor)
+        assert prev_cursor is not None
+        pages.append(_ids(rows))
+    return pages, prev_cursor
+
+
+@pytest.mark.parametrize('descending', [True, False])
+@pytest.mark.parametrize('limit', [1, 2, 3, 5])
+def test_next_pages_cover_every_row_once_in_order(descending, limit):
+    streams, expected = _streams()
+    if descending:
+        expected.reverse()
+
+    pages, _ = _walk_forward(streams, descending, limit)
+
+    assert [row for page in pages for row in page] == expected
+    assert all(len(page) == limit for page in pages[:-1])
+
+
+@pytest.mark.parametrize('descending', [True, False])
+@pytest.mark.parametrize('limit', [1, 2, 3, 5])
+def test_prev_pages_retrace_next_pages(descending, limit):
+    streams, _ = _streams()
+    pages, prev_cursor = _walk_forward(streams, descending, limit)
+
+    back = []
+    while prev_cursor:
+        rows, next_cursor, prev_cursor = paginate_merged(streams, descending, limit, cursor=prev_cursor)
+        assert next_cursor is not None
+        back.append(_ids(rows))
+
+    assert list(reversed(back)) == pages[:-1]
+
+
+def test_cursor_naming_an_unknown_stream_is_rejected():
+    streams, _ = _streams()
+    rows, next_cursor, _ = paginate_merged(streams, True, 2)
+    assert rows[-1][0] == 'incoming'
+
+    with pytest.raises(InvalidCursor):
+        paginate_merged(streams[1:], True, 2, cursor=next_cursor)
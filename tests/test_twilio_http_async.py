@@ -0,0 +1,50 @@
+"""Timeouts of the pooled async Twilio transport, against a slow local server."""
+
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from services.twilio_http_async import PooledAsyncTwilioHttpClient
+
+
+async def _slow_server(delay):
+    async def handler(request):
+        await asyncio.sleep(delay)
+        return web.json_response({'sid': 'SM123'})
+
+    app = web.Application()
+    app.router.add_route('*', '/{tail:.*}', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/Messages.json"
+
+
+async def _request(delay, read_timeout, timeout=None):
+    runner, url = await _slow_server(delay)
+    client = PooledAsyncTwilioHttpClient(read_timeout=read_timeout, retries=0)
+    try:
+        # The Twilio client always passes timeout=None
+        return await client.request('POST', url, data={'Body': 'hi'}, timeout=timeout)
+    finally:
+        await client.session.close()
+        await runner.cleanup()
+
+
+def test_read_timeout_applies_when_twilio_passes_none():
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(_request(delay=3.0, read_timeout=0.5))
+
+
+def test_explicit_timeout_replaces_read_timeout():
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(_request(delay=3.0, read_timeout=30.0, timeout=0.5))
+
+
+def test_fast_response_completes():
+    response = asyncio.run(_request(delay=0.0, read_timeout=0.5))
+    assert response.status_code == 200
+    assert 'SM123' in response.text
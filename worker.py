@@ -0,0 +1,31 @@
+"""
+SMS Messaging UX - Outbound Queue Worker
+
+Delivers messages from the outGoingMessageQueue collection. Run one or more
+alongside the web process: `python worker.py`
+"""
+
+import logging
+import signal
+
+from app import app
+from services.message_queue import run_worker
+
+logger = logging.getLogger(__name__)
+
+_stopping = False
+
+
+def _handle_stop(signum, frame):
+    """Finish the current message, then exit."""
+    global _stopping
+    logger.info(f"Queue worker received signal {signum}, stopping")
+    _stopping = True
+
+
+if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+
+    with app.app_context():
+        run_worker(should_stop=lambda: _stopping)